@@ -24,6 +24,9 @@ from app.models.endpoint import Endpoint
 from app.models.snapshot import Snapshot, DiskPhysical, DiskVolume, NetworkInterface, LoggedInUser
 from app.models.setting import Setting
 from app.models.alert import AlertEvent, AlertDedup
+from app.models.sighting import EndpointUserSighting
+from app.models.group import EndpointGroup, EndpointGroupMember, GroupRollup
+from app.models.volume import EndpointVolume
 
 
 config = context.config
@@ -33,6 +36,11 @@ if config.config_file_name is not None:
 
 target_metadata = Base.metadata
 
+# `alembic -x db_url=... upgrade head` migrates another database (e.g. a snapshot shard)
+_db_url = context.get_x_argument(as_dictionary=True).get("db_url")
+if _db_url:
+    config.set_main_option("sqlalchemy.url", _db_url)
+
 
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
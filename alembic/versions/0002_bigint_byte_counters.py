@@ -0,0 +1,37 @@
+"""widen byte counters to bigint
+
+Revision ID: 0002_bigint_byte_counters
+Revises: 0001_initial
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_bigint_byte_counters"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+# Memory and volume sizes routinely exceed 2 GiB (int4 max).
+COLUMNS = [
+    ("snapshots", "mem_total_bytes", True),
+    ("snapshots", "mem_used_bytes", True),
+    ("snapshots", "mem_free_bytes", True),
+    ("disk_volumes", "total_bytes", False),
+    ("disk_volumes", "free_bytes", False),
+    ("network_interfaces", "packets_in_errors", False),
+    ("network_interfaces", "packets_out_errors", False),
+]
+
+
+def upgrade() -> None:
+    for table, column, nullable in COLUMNS:
+        op.alter_column(table, column, type_=sa.BigInteger(), existing_type=sa.Integer(), existing_nullable=nullable)
+
+
+def downgrade() -> None:
+    for table, column, nullable in COLUMNS:
+        op.alter_column(table, column, type_=sa.Integer(), existing_type=sa.BigInteger(), existing_nullable=nullable)
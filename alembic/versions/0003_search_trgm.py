@@ -0,0 +1,59 @@
+"""trigram search indexes + endpoint_user_sightings
+
+Revision ID: 0003_search_trgm
+Revises: 0002_bigint_byte_counters
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003_search_trgm"
+down_revision = "0002_bigint_byte_counters"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    op.create_index("ix_endpoints_hostname_trgm", "endpoints", ["hostname"], postgresql_using="gin", postgresql_ops={"hostname": "gin_trgm_ops"})
+    op.create_index("ix_endpoints_machine_id_trgm", "endpoints", ["machine_id"], postgresql_using="gin", postgresql_ops={"machine_id": "gin_trgm_ops"})
+
+    op.create_table(
+        "endpoint_user_sightings",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(length=255), nullable=False),
+        sa.Column("endpoint_id", sa.Integer(), sa.ForeignKey("endpoints.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("first_seen", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_seen", sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint("username", "endpoint_id", name="uq_endpoint_user_sightings_username_endpoint"),
+    )
+    op.create_index("ix_endpoint_user_sightings_endpoint_id", "endpoint_user_sightings", ["endpoint_id"], unique=False)
+    op.create_index(
+        "ix_endpoint_user_sightings_username_trgm",
+        "endpoint_user_sightings",
+        ["username"],
+        postgresql_using="gin",
+        postgresql_ops={"username": "gin_trgm_ops"},
+    )
+
+    op.execute(
+        """
+        INSERT INTO endpoint_user_sightings (username, endpoint_id, first_seen, last_seen)
+        SELECT lu.username, s.endpoint_id, min(s.timestamp_utc), max(s.timestamp_utc)
+        FROM logged_in_users lu
+        JOIN snapshots s ON s.id = lu.snapshot_id
+        GROUP BY lu.username, s.endpoint_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_endpoint_user_sightings_username_trgm", table_name="endpoint_user_sightings")
+    op.drop_index("ix_endpoint_user_sightings_endpoint_id", table_name="endpoint_user_sightings")
+    op.drop_table("endpoint_user_sightings")
+    op.drop_index("ix_endpoints_machine_id_trgm", table_name="endpoints")
+    op.drop_index("ix_endpoints_hostname_trgm", table_name="endpoints")
@@ -0,0 +1,49 @@
+"""denormalized latest cpu/mem on endpoints for paginated dashboards
+
+Revision ID: 0004_endpoint_latest_metrics
+Revises: 0003_search_trgm
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004_endpoint_latest_metrics"
+down_revision = "0003_search_trgm"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("endpoints", sa.Column("last_cpu_pct", sa.Float(), nullable=True))
+    op.add_column("endpoints", sa.Column("last_mem_pct", sa.Float(), nullable=True))
+
+    op.execute(
+        """
+        UPDATE endpoints e
+        SET last_cpu_pct = s.cpu_utilization_pct, last_mem_pct = s.mem_used_pct
+        FROM (
+            SELECT DISTINCT ON (endpoint_id) endpoint_id, cpu_utilization_pct, mem_used_pct
+            FROM snapshots
+            ORDER BY endpoint_id, timestamp_utc DESC
+        ) s
+        WHERE s.endpoint_id = e.id
+        """
+    )
+
+    # Keyset sort keys used by the dashboard host cards (see routes._CARD_SORTS).
+    op.execute("CREATE INDEX ix_endpoints_card_cpu ON endpoints ((coalesce(last_cpu_pct, -1.0)) DESC, id DESC) WHERE is_active")
+    op.execute("CREATE INDEX ix_endpoints_card_mem ON endpoints ((coalesce(last_mem_pct, -1.0)) DESC, id DESC) WHERE is_active")
+    op.execute("CREATE INDEX ix_endpoints_card_stale ON endpoints ((coalesce(last_seen, 'epoch'::timestamptz)), id) WHERE is_active")
+    op.execute("CREATE INDEX ix_endpoints_card_hostname ON endpoints (hostname, id) WHERE is_active")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_endpoints_card_hostname", table_name="endpoints")
+    op.drop_index("ix_endpoints_card_stale", table_name="endpoints")
+    op.drop_index("ix_endpoints_card_mem", table_name="endpoints")
+    op.drop_index("ix_endpoints_card_cpu", table_name="endpoints")
+    op.drop_column("endpoints", "last_mem_pct")
+    op.drop_column("endpoints", "last_cpu_pct")
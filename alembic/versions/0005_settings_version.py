@@ -0,0 +1,24 @@
+"""version counter on settings for cache invalidation
+
+Revision ID: 0005_settings_version
+Revises: 0004_endpoint_latest_metrics
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005_settings_version"
+down_revision = "0004_endpoint_latest_metrics"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("settings", sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+
+
+def downgrade() -> None:
+    op.drop_column("settings", "version")
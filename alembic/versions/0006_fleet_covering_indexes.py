@@ -0,0 +1,28 @@
+"""covering indexes for fleet-wide aggregate queries
+
+Revision ID: 0006_fleet_covering_indexes
+Revises: 0005_settings_version
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0006_fleet_covering_indexes"
+down_revision = "0005_settings_version"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Time-range scans in app.services.fleet read only these columns, so they can be index-only.
+    op.execute("CREATE INDEX ix_snapshots_fleet ON snapshots (timestamp_utc) INCLUDE (endpoint_id, cpu_utilization_pct, mem_used_pct)")
+    op.execute("CREATE INDEX ix_disk_physical_fleet ON disk_physical (snapshot_id) INCLUDE (read_latency_ms, write_latency_ms)")
+    op.execute("CREATE INDEX ix_network_interfaces_fleet ON network_interfaces (snapshot_id) INCLUDE (packets_in_errors, packets_out_errors)")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_network_interfaces_fleet", table_name="network_interfaces")
+    op.drop_index("ix_disk_physical_fleet", table_name="disk_physical")
+    op.drop_index("ix_snapshots_fleet", table_name="snapshots")
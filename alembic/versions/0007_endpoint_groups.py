@@ -0,0 +1,53 @@
+"""endpoint groups/tags and incrementally maintained group rollups
+
+Revision ID: 0007_endpoint_groups
+Revises: 0006_fleet_covering_indexes
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007_endpoint_groups"
+down_revision = "0006_fleet_covering_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "endpoint_groups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(length=64), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+    op.create_index("ix_endpoint_groups_name", "endpoint_groups", ["name"], unique=True)
+
+    op.create_table(
+        "endpoint_group_members",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("endpoint_groups.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("endpoint_id", sa.Integer(), sa.ForeignKey("endpoints.id", ondelete="CASCADE"), primary_key=True),
+    )
+    op.create_index("ix_endpoint_group_members_endpoint_id", "endpoint_group_members", ["endpoint_id"], unique=False)
+
+    op.create_table(
+        "group_rollups",
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("endpoint_groups.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), primary_key=True),
+        sa.Column("samples", sa.Integer(), nullable=False),
+        sa.Column("cpu_samples", sa.Integer(), nullable=False),
+        sa.Column("cpu_sum", sa.Float(), nullable=False),
+        sa.Column("cpu_max", sa.Float(), nullable=True),
+        sa.Column("nic_bits", sa.Float(), nullable=False),
+        sa.Column("vol_free_min_pct", sa.Float(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("group_rollups")
+    op.drop_index("ix_endpoint_group_members_endpoint_id", table_name="endpoint_group_members")
+    op.drop_table("endpoint_group_members")
+    op.drop_index("ix_endpoint_groups_name", table_name="endpoint_groups")
+    op.drop_table("endpoint_groups")
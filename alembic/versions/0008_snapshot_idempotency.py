@@ -0,0 +1,34 @@
+"""unique (endpoint_id, timestamp_utc) on snapshots for idempotent ingest
+
+Revision ID: 0008_snapshot_idempotency
+Revises: 0007_endpoint_groups
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0008_snapshot_idempotency"
+down_revision = "0007_endpoint_groups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Drop rows duplicated by past agent retries, keeping the first copy.
+    # Child rows go with them via ON DELETE CASCADE.
+    op.execute(
+        """
+        DELETE FROM snapshots s
+        USING snapshots keep
+        WHERE s.endpoint_id = keep.endpoint_id
+          AND s.timestamp_utc = keep.timestamp_utc
+          AND s.id > keep.id
+        """
+    )
+    op.create_unique_constraint("uq_snapshots_endpoint_ts", "snapshots", ["endpoint_id", "timestamp_utc"])
+
+
+def downgrade() -> None:
+    op.drop_constraint("uq_snapshots_endpoint_ts", "snapshots", type_="unique")
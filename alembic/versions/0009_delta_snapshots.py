@@ -0,0 +1,67 @@
+"""current volume state per endpoint and carried-forward user count (schema 1.1 deltas)
+
+Revision ID: 0009_delta_snapshots
+Revises: 0008_snapshot_idempotency
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0009_delta_snapshots"
+down_revision = "0008_snapshot_idempotency"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "endpoint_volumes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("endpoint_id", sa.Integer(), sa.ForeignKey("endpoints.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("mount", sa.String(length=64), nullable=False),
+        sa.Column("filesystem", sa.String(length=32), nullable=True),
+        sa.Column("total_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("free_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("free_pct", sa.Float(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False),
+        sa.UniqueConstraint("endpoint_id", "mount", name="uq_endpoint_volumes_endpoint_mount"),
+    )
+    op.create_index("ix_endpoint_volumes_free_pct", "endpoint_volumes", ["free_pct"], unique=False)
+
+    op.add_column("endpoints", sa.Column("last_users_count", sa.Integer(), nullable=True))
+
+    # Seed both from each endpoint's latest snapshot.
+    op.execute(
+        """
+        WITH latest AS (
+            SELECT DISTINCT ON (endpoint_id) id, endpoint_id, timestamp_utc, users_count
+            FROM snapshots
+            ORDER BY endpoint_id, timestamp_utc DESC
+        )
+        INSERT INTO endpoint_volumes (endpoint_id, mount, filesystem, total_bytes, free_bytes, free_pct, updated_at)
+        SELECT latest.endpoint_id, v.mount, v.filesystem, v.total_bytes, v.free_bytes, v.free_pct, latest.timestamp_utc
+        FROM latest JOIN disk_volumes v ON v.snapshot_id = latest.id
+        ON CONFLICT (endpoint_id, mount) DO NOTHING
+        """
+    )
+    op.execute(
+        """
+        UPDATE endpoints e
+        SET last_users_count = s.users_count
+        FROM (
+            SELECT DISTINCT ON (endpoint_id) endpoint_id, users_count
+            FROM snapshots
+            ORDER BY endpoint_id, timestamp_utc DESC
+        ) s
+        WHERE s.endpoint_id = e.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("endpoints", "last_users_count")
+    op.drop_index("ix_endpoint_volumes_free_pct", table_name="endpoint_volumes")
+    op.drop_table("endpoint_volumes")
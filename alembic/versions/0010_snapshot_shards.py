@@ -0,0 +1,34 @@
+"""snapshot shards: no endpoints FK on shard databases
+
+Revision ID: 0010_snapshot_shards
+Revises: 0009_delta_snapshots
+Create Date: 2026-10-19
+
+Shard databases are migrated with `alembic -x db_url=<shard url> -x role=shard
+upgrade head`. They hold snapshot rows for endpoints that only exist in the
+main database, so the snapshots -> endpoints foreign key is dropped there.
+The main database keeps it.
+"""
+
+from alembic import context, op
+
+
+# revision identifiers, used by Alembic.
+revision = "0010_snapshot_shards"
+down_revision = "0009_delta_snapshots"
+branch_labels = None
+depends_on = None
+
+
+def _is_shard() -> bool:
+    return context.get_x_argument(as_dictionary=True).get("role") == "shard"
+
+
+def upgrade() -> None:
+    if _is_shard():
+        op.drop_constraint("snapshots_endpoint_id_fkey", "snapshots", type_="foreignkey")
+
+
+def downgrade() -> None:
+    if _is_shard():
+        op.create_foreign_key("snapshots_endpoint_id_fkey", "snapshots", "endpoints", ["endpoint_id"], ["id"], ondelete="CASCADE")
@@ -0,0 +1,24 @@
+"""endpoints.directed_interval_seconds: longest wait the last directives allowed
+
+Revision ID: 0011_directed_interval
+Revises: 0010_snapshot_shards
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0011_directed_interval"
+down_revision = "0010_snapshot_shards"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("endpoints", sa.Column("directed_interval_seconds", sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("endpoints", "directed_interval_seconds")
@@ -0,0 +1,25 @@
+"""drop ix_snapshots_fleet: duplicates ix_snapshots_timestamp_utc
+
+Revision ID: 0012_drop_snapshots_fleet_index
+Revises: 0011_directed_interval
+Create Date: 2026-10-19
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0012_drop_snapshots_fleet_index"
+down_revision = "0011_directed_interval"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Fleet range scans use ix_snapshots_timestamp_utc just as well; the INCLUDE
+    # copy only added a second index write to every snapshot insert.
+    op.execute("DROP INDEX IF EXISTS ix_snapshots_fleet")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX ix_snapshots_fleet ON snapshots (timestamp_utc) INCLUDE (endpoint_id, cpu_utilization_pct, mem_used_pct)")
@@ -1,29 +1,152 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+import asyncio
+import json
+import logging
+import time
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.session import get_db
-from app.services.ingest import get_endpoint_by_token, ingest_snapshot
+from app.core.config import settings
+from app.core.metrics import INGEST_STAGE_SECONDS, INGEST_REQUEST_SECONDS, INGEST_PAYLOAD_BYTES, INGEST_SHED, INGEST_STREAMS
+from app.db.session import get_ingest_db, IngestSessionLocal
+from app.models.endpoint import Endpoint
+from app.services.directives import directives_for, alert_directives, directed_wait_seconds, record_directed_interval
+from app.services.events import bus
+from app.services.ingest import get_endpoint_by_token, cached_endpoint_id, ingest_snapshot
+from app.services.ratelimit import limiter, retry_after_header
+from app.services.spool import spool, is_db_unavailable
+from app.services.validation import validate_snapshot
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
 @router.post("/v1/ingest")
-async def ingest(request: Request, db: AsyncSession = Depends(get_db)):
-        # Accept either X-API-Key header (recommended for agents) or Authorization: Bearer <token>
-    token = (request.headers.get("x-api-key") or "").strip()
+async def ingest(request: Request, db: AsyncSession = Depends(get_ingest_db)):
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        result = await _ingest(request, db)
+        outcome = "spooled" if isinstance(result, JSONResponse) else "ok"
+        return result
+    except HTTPException as e:
+        if e.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+            outcome = "shed"
+        raise
+    finally:
+        INGEST_REQUEST_SECONDS.observe(time.perf_counter() - started, outcome)
+
+
+def _shed(scope: str, wait_seconds: float) -> HTTPException:
+    INGEST_SHED.inc(1.0, scope)
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=f"Rate limit exceeded ({scope})", headers=retry_after_header(wait_seconds))
+
+
+def _db_unavailable() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database unavailable, retry later", headers=retry_after_header(30))
+
+
+def _with_directives(body: dict, directives: dict | None) -> dict:
+    if directives is not None:
+        body["directives"] = directives
+    return body
+
+
+async def _spool(endpoint_id: int, payload: dict) -> dict:
+    try:
+        await spool.append(endpoint_id, payload)
+    except OSError as e:
+        raise _db_unavailable() from e
+    return _with_directives({"ok": True, "snapshot_id": None, "spooled": True}, directives_for(None, spooled=True))
+
+
+def _token_from_headers(headers) -> str:
+    # Accept either X-API-Key header (recommended for agents) or Authorization: Bearer <token>
+    token = (headers.get("x-api-key") or "").strip()
     if not token:
-        auth = request.headers.get("authorization") or ""
+        auth = headers.get("authorization") or ""
         if auth.lower().startswith("bearer "):
             token = auth.split(" ", 1)[1].strip()
-    if not token:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing API token")
-    endpoint = await get_endpoint_by_token(db, token)
+    return token
+
+
+async def _authenticate(db: AsyncSession, token: str) -> tuple[Endpoint | None, int]:
+    """(endpoint, endpoint id); endpoint is None when the DB is down but the token is known."""
+    with INGEST_STAGE_SECONDS.time("auth"):
+        try:
+            endpoint = await get_endpoint_by_token(db, token)
+        except Exception as e:
+            if not is_db_unavailable(e):
+                raise
+            # DB down: a token this worker verified earlier is good enough to spool under.
+            endpoint_id = cached_endpoint_id(token) if settings.spool_enabled else None
+            if endpoint_id is None:
+                raise _db_unavailable() from e
+            return None, endpoint_id
     if not endpoint:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    return endpoint, endpoint.id
+
+
+def _check_endpoint_limit(endpoint: Endpoint | None, endpoint_id: int) -> None:
+    wait = limiter.check_endpoint(endpoint_id, endpoint.last_interval_seconds if endpoint else None)
+    if wait:
+        raise _shed("endpoint", wait)
+
+
+async def _ingest_payload(db: AsyncSession, endpoint: Endpoint | None, endpoint_id: int, payload: dict) -> dict:
+    """Store (or spool) one decoded snapshot; the response body. Shared by HTTP and streaming ingest."""
+    if endpoint is None:
+        with INGEST_STAGE_SECONDS.time("validate"):
+            try:
+                validate_snapshot(payload)
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=str(e)) from e
+        return await _spool(endpoint_id, payload)
+
+    prev_cpu, prev_mem = endpoint.last_cpu_pct, endpoint.last_mem_pct
+    try:
+        snap_id, created = await ingest_snapshot(db, endpoint, payload)
+    except Exception as e:
+        if is_db_unavailable(e):
+            if settings.spool_enabled:
+                return await _spool(endpoint_id, payload)
+            raise _db_unavailable() from e
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    directives = directives_for(endpoint, prev_cpu, prev_mem)
+    try:
+        await record_directed_interval(db, endpoint, directed_wait_seconds(directives))
+    except Exception:
+        # The snapshot is stored; a lost update only risks an early heartbeat re-check.
+        logger.warning("could not record directed interval for endpoint %s", endpoint_id, exc_info=True)
+        await db.rollback()
+    return _with_directives({"ok": True, "snapshot_id": snap_id, "duplicate": not created}, directives)
+
+
+async def _ingest(request: Request, db: AsyncSession) -> dict | JSONResponse:
+    # Admission control runs before any body parsing, validation or writes.
+    wait = limiter.check_global()
+    if wait:
+        raise _shed("global", wait)
+
+    token = _token_from_headers(request.headers)
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing API token")
+    endpoint, endpoint_id = await _authenticate(db, token)
+    _check_endpoint_limit(endpoint, endpoint_id)
 
-    body = await request.json()
+    raw = await request.body()
+    INGEST_PAYLOAD_BYTES.observe(len(raw))
+    with INGEST_STAGE_SECONDS.time("decode"):
+        try:
+            body = json.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Invalid JSON") from e
     # Accept either a single object or a one-element list.
     if isinstance(body, list):
         if len(body) != 1 or not isinstance(body[0], dict):
@@ -34,9 +157,173 @@ async def ingest(request: Request, db: AsyncSession = Depends(get_db)):
     else:
         raise HTTPException(status_code=400, detail="Invalid JSON")
 
+    result = await _ingest_payload(db, endpoint, endpoint_id, payload)
+    if result.get("spooled"):
+        return JSONResponse(result, status_code=status.HTTP_202_ACCEPTED)
+    return result
+
+
+# -- streaming ingest ----------------------------------------------------------
+#
+# One long-lived WebSocket per agent: authenticate once, then send
+# {"id": ..., "snapshot": {...}} frames and get an ack/nack per id, in order.
+# Each frame goes through the same admission control and `_ingest_payload` as
+# POST /v1/ingest, on its own short-lived session, so a connection never holds
+# a pool connection while idle. The token is re-checked per frame through the
+# in-process token cache (a primary-key lookup), so rotating or deactivating
+# an endpoint cuts its stream off at the next frame.
+
+# Close codes (4000-4999 are application-defined)
+WS_UNAUTHORIZED = 4401
+WS_AUTH_TIMEOUT = 4408
+WS_TRY_AGAIN_LATER = 1013
+WS_MESSAGE_TOO_BIG = 1009
+WS_POLICY_VIOLATION = 1008
+
+OUTBOX_SIZE = 64
+
+# endpoint id -> outboxes of its open streams (normally one)
+_streams: dict[int, set[asyncio.Queue]] = {}
+
+INGEST_STREAMS.set_function(lambda: sum(len(s) for s in _streams.values()))
+
+
+def _push_directives(event: dict) -> None:
+    # The agent hears about an alert on its host now, not on its next report.
+    if event.get("type") != "alert" or event.get("endpoint_id") is None:
+        return
+    outboxes = _streams.get(int(event["endpoint_id"]))
+    if not outboxes:
+        return
+    directives = alert_directives()
+    if directives is None:
+        return
+    for outbox in outboxes:
+        if not outbox.full():
+            outbox.put_nowait({"type": "directives", "directives": directives})
+
+
+bus.add_handler(_push_directives)
+
+
+def _nack(message_id, e: HTTPException) -> dict:
+    reply = {"type": "nack", "id": message_id, "status": e.status_code, "error": e.detail}
+    if e.headers and "Retry-After" in e.headers:
+        reply["retry_after"] = int(e.headers["Retry-After"])
+    return reply
+
+
+async def _ws_token(ws: WebSocket) -> str:
+    """Token from the upgrade request's headers, else from a first {"type": "auth", "token": ...} frame."""
+    token = _token_from_headers(ws.headers)
+    if token:
+        return token
     try:
-        snap_id = await ingest_snapshot(db, endpoint, payload)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e)) from e
+        first = await asyncio.wait_for(ws.receive_json(), timeout=settings.ingest_ws_auth_timeout_seconds)
+    except asyncio.TimeoutError:
+        await ws.close(code=WS_AUTH_TIMEOUT, reason="Authentication timed out")
+        return ""
+    except WebSocketDisconnect:
+        return ""
+    except (ValueError, KeyError):
+        first = None
+    if isinstance(first, dict) and first.get("type") == "auth" and isinstance(first.get("token"), str):
+        token = first["token"].strip()
+    if not token:
+        await ws.close(code=WS_UNAUTHORIZED, reason="Missing API token")
+    return token
+
+
+def _decode_frame(raw: str | bytes) -> tuple[object, dict]:
+    INGEST_PAYLOAD_BYTES.observe(len(raw))
+    with INGEST_STAGE_SECONDS.time("decode"):
+        try:
+            frame = json.loads(raw)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail="Invalid JSON") from e
+    if not isinstance(frame, dict) or not isinstance(frame.get("snapshot"), dict):
+        raise HTTPException(status_code=400, detail='Expected {"id": ..., "snapshot": {...}}')
+    return frame.get("id"), frame["snapshot"]
+
+
+async def _ingest_frame(token: str, payload: dict) -> dict:
+    wait = limiter.check_global()
+    if wait:
+        raise _shed("global", wait)
+    async with IngestSessionLocal() as db:
+        endpoint, endpoint_id = await _authenticate(db, token)
+        _check_endpoint_limit(endpoint, endpoint_id)
+        return await _ingest_payload(db, endpoint, endpoint_id, payload)
+
+
+async def _send_outbox(ws: WebSocket, outbox: asyncio.Queue) -> None:
+    while True:
+        await ws.send_json(await outbox.get())
+        outbox.task_done()
+
+
+@router.websocket("/v1/ingest/ws")
+async def ingest_stream(ws: WebSocket):
+    if not settings.ingest_ws_enabled:
+        await ws.close(code=WS_POLICY_VIOLATION)
+        return
+    await ws.accept()
+
+    token = await _ws_token(ws)
+    if not token:
+        return
+    try:
+        async with IngestSessionLocal() as db:
+            endpoint, endpoint_id = await _authenticate(db, token)
+    except HTTPException as e:
+        code = WS_UNAUTHORIZED if e.status_code == status.HTTP_401_UNAUTHORIZED else WS_TRY_AGAIN_LATER
+        await ws.close(code=code, reason=str(e.detail))
+        return
+
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=OUTBOX_SIZE)
+    _streams.setdefault(endpoint_id, set()).add(outbox)
+    sender = asyncio.create_task(_send_outbox(ws, outbox))
+    try:
+        await outbox.put(_with_directives({"type": "hello", "endpoint_id": endpoint_id}, directives_for(endpoint) if endpoint else None))
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect" or sender.done():
+                break
+            raw = message["text"] if message.get("text") is not None else message.get("bytes") or b""
+            if len(raw) > settings.ingest_ws_max_message_bytes:
+                await ws.close(code=WS_MESSAGE_TOO_BIG, reason="Message too big")
+                break
+
+            started = time.perf_counter()
+            outcome = "error"
+            message_id = None
+            try:
+                # Decoded before admission control (unlike HTTP) so even a shed frame is nacked by id.
+                message_id, payload = _decode_frame(raw)
+                body = await _ingest_frame(token, payload)
+                outcome = "spooled" if body.get("spooled") else "ok"
+                reply = {"type": "ack", "id": message_id, **body}
+            except HTTPException as e:
+                if e.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
+                    outcome = "shed"
+                reply = _nack(message_id, e)
+            except Exception:
+                logger.exception("streaming ingest failed for endpoint %s", endpoint_id)
+                reply = {"type": "nack", "id": message_id, "status": 500, "error": "Internal error"}
+            finally:
+                INGEST_REQUEST_SECONDS.observe(time.perf_counter() - started, outcome)
 
-    return {"ok": True, "snapshot_id": snap_id}
+            await outbox.put(reply)
+            if reply.get("status") == status.HTTP_401_UNAUTHORIZED:
+                # Token rotated or endpoint deactivated: deliver the nack, then hang up.
+                try:
+                    await asyncio.wait_for(outbox.join(), timeout=settings.ingest_ws_auth_timeout_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                await ws.close(code=WS_UNAUTHORIZED, reason="Invalid token")
+                break
+    finally:
+        _streams[endpoint_id].discard(outbox)
+        if not _streams[endpoint_id]:
+            del _streams[endpoint_id]
+        sender.cancel()
@@ -0,0 +1,123 @@
+"""Startup warm-up and the `/readyz` probe.
+
+A worker accepts connections as soon as it is imported, but its first
+requests would otherwise pay for everything that is done lazily: the admin
+bootstrap, opening DB connections, compiling the agent JSON schemas and
+Jinja templates, loading the global settings cache. `readiness.start()` does
+all of that in the background right after startup; `/readyz` answers 503
+until it has finished (and again once shutdown begins), so a load balancer
+only sends traffic to warm workers. Steps that fail (DB not up yet) are
+retried with backoff.
+
+Readiness is not re-checked afterwards: a worker whose DB goes away keeps
+passing, since ingest can still spool and the UI reports the error itself.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.api.templating import templates
+from app.core.config import settings
+from app.core.metrics import READY, WARMUP_SECONDS
+from app.db import shards
+from app.db.session import AsyncSessionLocal, IngestSessionLocal, ReplicaSessionLocal, prewarm
+from app.services import validation
+from app.services.bootstrap import bootstrap_admin
+from app.services.settings_store import get_global_config
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+RETRY_MAX_SECONDS = 30.0
+
+
+async def _warm_pools() -> None:
+    jobs = [
+        prewarm(AsyncSessionLocal, min(settings.db_pool_prewarm, settings.db_pool_size)),
+        prewarm(IngestSessionLocal, min(settings.db_pool_prewarm, settings.ingest_db_pool_size)),
+    ]
+    if ReplicaSessionLocal is not None:
+        jobs.append(prewarm(ReplicaSessionLocal, min(settings.db_pool_prewarm, settings.db_pool_size)))
+    if shards.is_sharded():
+        for shard in shards.SHARDS:
+            jobs.append(prewarm(shard.ingest, min(settings.db_pool_prewarm, settings.ingest_db_pool_size)))
+            jobs.append(prewarm(shard.ui, min(settings.db_pool_prewarm, settings.db_pool_size)))
+    await asyncio.gather(*jobs)
+
+
+async def _warm_settings() -> None:
+    async with AsyncSessionLocal() as db:
+        await get_global_config(db)
+
+
+def _compile_templates() -> None:
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.env.get_template(name)
+
+
+class Readiness:
+    def __init__(self) -> None:
+        self.ready = False
+        self.warm_seconds: float | None = None
+        self.pending: list[str] = []
+        self._task: asyncio.Task | None = None
+
+    def _steps(self) -> list[tuple[str, object]]:
+        # CPU-only steps first: they finish even while the DB is still coming up.
+        return [
+            ("schemas", lambda: asyncio.to_thread(validation.warm)),
+            ("templates", lambda: asyncio.to_thread(_compile_templates)),
+            ("bootstrap", bootstrap_admin),
+            ("pools", _warm_pools),
+            ("settings", _warm_settings),
+        ]
+
+    async def _run(self) -> None:
+        started = time.monotonic()
+        steps = self._steps()
+        self.pending = [name for name, _ in steps]
+        for name, step in steps:
+            delay = 1.0
+            while True:
+                try:
+                    await step()
+                    break
+                except Exception:
+                    # Full traceback once; after that the DB is most likely just not up yet.
+                    logger.warning("warm-up step %r failed, retrying in %.0fs", name, delay, exc_info=delay == 1.0)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RETRY_MAX_SECONDS)
+            self.pending.remove(name)
+        self.warm_seconds = time.monotonic() - started
+        self.ready = True
+        logger.info("warm-up finished in %.2fs", self.warm_seconds)
+
+    async def start(self) -> None:
+        if self._task is None:
+            READY.set_function(lambda: 1.0 if self.ready else 0.0)
+            WARMUP_SECONDS.set_function(lambda: self.warm_seconds if self.warm_seconds is not None else -1.0)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        # Fail the probe first so the load balancer drains this worker.
+        self.ready = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+readiness = Readiness()
+
+
+@router.get("/readyz", include_in_schema=False)
+async def readyz():
+    if not readiness.ready:
+        return JSONResponse({"ready": False, "pending": readiness.pending}, status_code=503)
+    return {"ready": True, "warm_seconds": round(readiness.warm_seconds, 3)}
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.metrics import render_latest
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if settings.metrics_token:
+        auth = request.headers.get("authorization") or ""
+        if not hmac.compare_digest(auth, f"Bearer {settings.metrics_token}"):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(render_latest(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,65 @@
+"""Opaque keyset-pagination cursors.
+
+A cursor is the sort key of the last row on the previous page, JSON-encoded
+and base64'd so it round-trips through a query string untouched. Decoding
+checks every value against the sort key's type, so a hand-edited cursor is
+a 400 rather than a type error from the database.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _invalid() -> HTTPException:
+    return HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _check(value, expected: type):
+    # JSON has no datetime (sent as ISO strings) and bool is an int subclass.
+    if isinstance(value, bool):
+        raise _invalid()
+    if expected is datetime:
+        if not isinstance(value, str):
+            raise _invalid()
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError as e:
+            raise _invalid() from e
+        if parsed.tzinfo is None:
+            raise _invalid()
+        return parsed
+    if expected is float and isinstance(value, int):
+        return float(value)
+    if not isinstance(value, expected):
+        raise _invalid()
+    return value
+
+
+def decode_cursor(cursor: str | None, *types: type) -> list | None:
+    """The sort key in `cursor`, one value per type in `types` (str, int, float or datetime)."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError as e:
+        raise _invalid() from e
+    if not isinstance(values, list) or len(values) != len(types):
+        raise _invalid()
+    return [_check(v, t) for v, t in zip(values, types)]
+
+
+def like_pattern(q: str) -> str:
+    """Substring ILIKE pattern for `q`, with LIKE wildcards escaped by backslash."""
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
+import asyncio
 import json
 from datetime import datetime, timezone, timedelta
 
-from fastapi import APIRouter, Depends, Request, Form, HTTPException
-from fastapi.responses import RedirectResponse, Response
+from fastapi import APIRouter, Depends, Request, Form, HTTPException, Query
+from fastapi.responses import RedirectResponse, Response, StreamingResponse
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, and_
+from sqlalchemy import select, func, or_, and_, tuple_, true, literal_column, DateTime, Float
 
+from app.api.pagination import encode_cursor, decode_cursor, like_pattern
 from app.api.templating import templates
-from app.core.auth import get_current_user, require_admin
-from app.core.security import verify_password, hash_password, generate_token, hash_token
-from app.db.session import get_db
+from app.core.config import settings
+from app.core.auth import get_current_user, require_admin, invalidate_user_cache
+from app.core.security import verify_password_async, hash_password_async, generate_token, hash_token_async
+from app.db import shards
+from app.db.session import get_db, get_read_db
 from app.models.user import User, UserRole
 from app.models.endpoint import Endpoint
 from app.models.snapshot import Snapshot, DiskPhysical, DiskVolume, NetworkInterface, LoggedInUser
-from app.models.setting import Setting
+from app.models.sighting import EndpointUserSighting
+from app.models.volume import EndpointVolume
+from app.services.events import bus
+from app.services.export import FORMATS, ExportError, check_format, dataset_columns, stream_export
+from app.services import fleet
+from app.services.archive import host_history
+from app.services.groups import GroupError, parse_tags, member_filter, list_groups, get_group_by_name, group_names_by_endpoint, set_endpoint_groups, group_timeseries
+from app.services.settings_store import get_global_config, get_raw_global_settings, save_global_config
 
 router = APIRouter()
 
@@ -34,7 +46,7 @@ async def login_page(request: Request):
 async def login(request: Request, db: AsyncSession = Depends(get_db), email: str = Form(...), password: str = Form(...)):
     q = await db.execute(select(User).where(User.email == email.lower(), User.is_active.is_(True)))
     user = q.scalars().first()
-    if not user or not verify_password(password, user.password_hash):
+    if not user or not await verify_password_async(password, user.password_hash):
         return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"}, status_code=401)
 
     request.session["user_id"] = user.id
@@ -43,64 +55,131 @@ async def login(request: Request, db: AsyncSession = Depends(get_db), email: str
 
 @router.post("/logout")
 async def logout(request: Request):
+    if request.session.get("user_id"):
+        invalidate_user_cache(int(request.session["user_id"]))
     request.session.clear()
     return RedirectResponse(url="/login", status_code=302)
 
 
-async def _get_global_settings(db: AsyncSession) -> dict:
-    q = await db.execute(select(Setting).where(Setting.key == "global"))
-    row = q.scalars().first()
-    return row.value if row else {}
+CARD_PAGE_SIZE = 60
+HOSTS_PAGE_SIZE = 100
+# Defaults are SQL literals, not bound parameters, so the expressions match
+# the ones migration 0004 indexed even under generic (prepared) plans.
+_EPOCH = literal_column("'epoch'::timestamptz", DateTime(timezone=True))
+_NO_PCT = literal_column("-1.0", Float)
+_LAST_SEEN_OR_EPOCH = func.coalesce(Endpoint.last_seen, _EPOCH)
+
+# sort name -> (keyset sort expression, descending). Each has a matching
+# partial index (migration 0004), and Endpoint.id breaks ties.
+_CARD_SORTS = {
+    "hostname": (Endpoint.hostname, False, str),
+    "stale": (_LAST_SEEN_OR_EPOCH, False, datetime),
+    "cpu": (func.coalesce(Endpoint.last_cpu_pct, _NO_PCT), True, float),
+    "mem": (func.coalesce(Endpoint.last_mem_pct, _NO_PCT), True, float),
+}
+
+
+def _parse_stale_minutes(value: str | None) -> int | None:
+    # The filter <select> submits "" for "all hosts".
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail="Invalid stale_minutes") from e
+
+
+async def _resolve_group(db: AsyncSession, group: str | None):
+    if not group:
+        return None
+    g = await get_group_by_name(db, group)
+    if not g:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return g
+
+
+async def _host_cards_page(db: AsyncSession, sort: str, q: str | None, stale_minutes: int | None, cursor: str | None, group_id: int | None = None) -> tuple[list[dict], str | None]:
+    key, desc, key_type = _CARD_SORTS.get(sort) or _CARD_SORTS["hostname"]
+    now = datetime.now(timezone.utc)
+
+    stmt = select(Endpoint.id, Endpoint.hostname, Endpoint.machine_id, Endpoint.last_seen, Endpoint.last_cpu_pct, Endpoint.last_mem_pct, key.label("sort_key")).where(Endpoint.is_active.is_(True))
+    if q:
+        like = like_pattern(q)
+        stmt = stmt.where(or_(Endpoint.hostname.ilike(like), Endpoint.machine_id.ilike(like)))
+    if stale_minutes:
+        stmt = stmt.where(_LAST_SEEN_OR_EPOCH < now - timedelta(minutes=stale_minutes))
+    if group_id is not None:
+        stmt = stmt.where(member_filter(group_id))
+
+    after = decode_cursor(cursor, key_type, int)
+    if after:
+        after_key, after_id = after
+        if desc:
+            stmt = stmt.where(tuple_(key, Endpoint.id) < tuple_(after_key, after_id))
+        else:
+            stmt = stmt.where(tuple_(key, Endpoint.id) > tuple_(after_key, after_id))
+    stmt = stmt.order_by(key.desc() if desc else key.asc(), Endpoint.id.desc() if desc else Endpoint.id.asc()).limit(CARD_PAGE_SIZE + 1)
+
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(rows) > CARD_PAGE_SIZE:
+        rows = rows[:CARD_PAGE_SIZE]
+        last_key = rows[-1].sort_key
+        next_cursor = encode_cursor(last_key.isoformat() if isinstance(last_key, datetime) else last_key, rows[-1].id)
+
+    cards = []
+    for r in rows:
+        cards.append({
+            "hostname": r.hostname,
+            "machine_id": r.machine_id,
+            "endpoint_id": r.id,
+            "last_seen": r.last_seen,
+            "seconds_ago": int((now - r.last_seen).total_seconds()) if r.last_seen else None,
+            "cpu": r.last_cpu_pct,
+            "mem": r.last_mem_pct,
+        })
+    return cards, next_cursor
 
 
 @router.get("/dashboard")
-async def dashboard(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
-    # Summary across all hosts using latest snapshot per endpoint
-    subq = select(Snapshot.endpoint_id, func.max(Snapshot.timestamp_utc).label("max_ts")).group_by(Snapshot.endpoint_id).subquery()
-
-    q = await db.execute(
-        select(Endpoint, Snapshot)
-        .join(subq, Endpoint.id == subq.c.endpoint_id)
-        .join(Snapshot, and_(Snapshot.endpoint_id == subq.c.endpoint_id, Snapshot.timestamp_utc == subq.c.max_ts))
-        .where(Endpoint.is_active.is_(True))
-        .order_by(Endpoint.hostname.asc())
-    )
-    rows = q.all()
-
-    # Top offenders
-    top_cpu = sorted([r for r in rows if r[1].cpu_utilization_pct is not None], key=lambda x: x[1].cpu_utilization_pct, reverse=True)[:5]
-    top_mem = sorted([r for r in rows if r[1].mem_used_pct is not None], key=lambda x: x[1].mem_used_pct, reverse=True)[:5]
-
-    # Low disk table (free_pct < X) across latest snapshots
-    cfg = await _get_global_settings(db)
-    low_disk_threshold = float(((cfg.get("alerts") or {}).get("low_disk_free_pct_threshold", 10.0)))
-
-    q = await db.execute(
-        select(Endpoint.hostname, Endpoint.machine_id, DiskVolume.mount, DiskVolume.free_pct, DiskVolume.free_bytes, DiskVolume.total_bytes)
-        .join(Snapshot, Snapshot.endpoint_id == Endpoint.id)
-        .join(DiskVolume, DiskVolume.snapshot_id == Snapshot.id)
-        .join(subq, and_(Snapshot.endpoint_id == subq.c.endpoint_id, Snapshot.timestamp_utc == subq.c.max_ts))
-        .where(DiskVolume.free_pct < low_disk_threshold)
-        .order_by(DiskVolume.free_pct.asc())
+async def dashboard(
+    request: Request,
+    sort: str = "hostname",
+    q: str | None = None,
+    stale_minutes: str | None = None,
+    group: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    stale = _parse_stale_minutes(stale_minutes)
+    grp = await _resolve_group(db, group)
+
+    # Top offenders, straight from the denormalized latest values on endpoints
+    in_group = member_filter(grp.id) if grp is not None else true()
+    active = and_(Endpoint.is_active.is_(True), in_group)
+    top_cpu = (await db.execute(
+        select(Endpoint.id, Endpoint.hostname, Endpoint.last_cpu_pct).where(active, Endpoint.last_cpu_pct.is_not(None)).order_by(Endpoint.last_cpu_pct.desc()).limit(5)
+    )).all()
+    top_mem = (await db.execute(
+        select(Endpoint.id, Endpoint.hostname, Endpoint.last_mem_pct).where(active, Endpoint.last_mem_pct.is_not(None)).order_by(Endpoint.last_mem_pct.desc()).limit(5)
+    )).all()
+
+    # Low disk table (free_pct < X) across each endpoint's current volumes
+    cfg = await get_global_config(db)
+    low_disk_threshold = cfg.alerts.low_disk_free_pct_threshold
+
+    q_low = await db.execute(
+        select(Endpoint.hostname, Endpoint.machine_id, EndpointVolume.mount, EndpointVolume.free_pct, EndpointVolume.free_bytes, EndpointVolume.total_bytes)
+        .join(Endpoint, Endpoint.id == EndpointVolume.endpoint_id)
+        .where(EndpointVolume.free_pct < low_disk_threshold, in_group)
+        .order_by(EndpointVolume.free_pct.asc())
         .limit(50)
     )
-    low_disk_rows = q.all()
+    low_disk_rows = q_low.all()
 
-    now = datetime.now(timezone.utc)
-    host_cards = []
-    for ep, snap in rows:
-        last_seen = ep.last_seen
-        seconds_ago = int((now - last_seen).total_seconds()) if last_seen else None
-        host_cards.append({
-            "hostname": ep.hostname,
-            "machine_id": ep.machine_id,
-            "endpoint_id": ep.id,
-            "last_seen": last_seen,
-            "seconds_ago": seconds_ago,
-            "cpu": snap.cpu_utilization_pct,
-            "mem": snap.mem_used_pct,
-            "ts": snap.timestamp_utc,
-        })
+    # Only the first page of host cards is rendered; the rest load lazily.
+    host_cards, next_cursor = await _host_cards_page(db, sort, q, stale, None, grp.id if grp else None)
+    host_count = (await db.execute(select(func.count()).select_from(Endpoint).where(active))).scalar_one()
 
     return templates.TemplateResponse(
         "dashboard.html",
@@ -108,6 +187,14 @@ async def dashboard(request: Request, db: AsyncSession = Depends(get_db), user:
             "request": request,
             "user": user,
             "host_cards": host_cards,
+            "next_cursor": next_cursor,
+            "host_count": host_count,
+            "sort": sort if sort in _CARD_SORTS else "hostname",
+            "sorts": list(_CARD_SORTS),
+            "q": q or "",
+            "stale_minutes": stale,
+            "groups": await list_groups(db),
+            "group": grp,
             "top_cpu": top_cpu,
             "top_mem": top_mem,
             "low_disk_threshold": low_disk_threshold,
@@ -116,20 +203,46 @@ async def dashboard(request: Request, db: AsyncSession = Depends(get_db), user:
     )
 
 
+@router.get("/dashboard/cards")
+async def dashboard_cards(
+    request: Request,
+    sort: str = "hostname",
+    q: str | None = None,
+    stale_minutes: str | None = None,
+    group: str | None = None,
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """Next batch of host cards as an HTML fragment; the cursor for the batch after is in X-Next-Cursor."""
+    grp = await _resolve_group(db, group)
+    host_cards, next_cursor = await _host_cards_page(db, sort, q, _parse_stale_minutes(stale_minutes), cursor, grp.id if grp else None)
+    resp = templates.TemplateResponse("_host_cards.html", {"request": request, "host_cards": host_cards})
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    return resp
+
+
 @router.get("/hosts")
-async def hosts(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user), q: str | None = None):
-    stmt = select(Endpoint).where(Endpoint.is_active.is_(True))
+async def hosts(request: Request, db: AsyncSession = Depends(get_read_db), user: User = Depends(get_current_user), q: str | None = None, after: str | None = None):
+    stmt = select(Endpoint.id, Endpoint.hostname, Endpoint.machine_id, Endpoint.last_seen).where(Endpoint.is_active.is_(True))
     if q:
-        like = f"%{q}%"
+        like = like_pattern(q)
         stmt = stmt.where(or_(Endpoint.hostname.ilike(like), Endpoint.machine_id.ilike(like)))
-    stmt = stmt.order_by(Endpoint.hostname.asc())
-    res = await db.execute(stmt)
-    endpoints = res.scalars().all()
-    return templates.TemplateResponse("hosts.html", {"request": request, "user": user, "endpoints": endpoints, "q": q or ""})
+    cursor = decode_cursor(after, str, int)
+    if cursor:
+        stmt = stmt.where(tuple_(Endpoint.hostname, Endpoint.id) > tuple_(*cursor))
+    stmt = stmt.order_by(Endpoint.hostname.asc(), Endpoint.id.asc()).limit(HOSTS_PAGE_SIZE + 1)
+    endpoints = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(endpoints) > HOSTS_PAGE_SIZE:
+        endpoints = endpoints[:HOSTS_PAGE_SIZE]
+        next_cursor = encode_cursor(endpoints[-1].hostname, endpoints[-1].id)
+    return templates.TemplateResponse("hosts.html", {"request": request, "user": user, "endpoints": endpoints, "q": q or "", "next_cursor": next_cursor})
 
 
 @router.get("/hosts/{endpoint_id}")
-async def host_detail(request: Request, endpoint_id: int, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+async def host_detail(request: Request, endpoint_id: int, db: AsyncSession = Depends(get_read_db), user: User = Depends(get_current_user)):
     q = await db.execute(select(Endpoint).where(Endpoint.id == endpoint_id))
     ep = q.scalars().first()
     if not ep:
@@ -137,8 +250,8 @@ async def host_detail(request: Request, endpoint_id: int, db: AsyncSession = Dep
 
     # last 24h snapshot count
     since = datetime.now(timezone.utc) - timedelta(hours=24)
-    q = await db.execute(select(func.count()).select_from(Snapshot).where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since))
-    count_24h = q.scalar_one()
+    async with shards.reader(endpoint_id, db) as sdb:
+        count_24h = (await sdb.execute(select(func.count()).select_from(Snapshot).where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since))).scalar_one()
 
     return templates.TemplateResponse(
         "host_detail.html",
@@ -147,29 +260,40 @@ async def host_detail(request: Request, endpoint_id: int, db: AsyncSession = Dep
 
 
 @router.get("/api/ui/host/{endpoint_id}/timeseries")
-async def host_timeseries(endpoint_id: int, metric: str, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+async def host_timeseries(
+    endpoint_id: int,
+    metric: str,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    # Default: last 24h. Ranges reaching past the hot window are read from the Parquet archive.
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    async with shards.reader(endpoint_id, db) as sdb:
+        return await _host_timeseries(sdb, endpoint_id, metric, start, end)
+
+
+async def _host_timeseries(db: AsyncSession, endpoint_id: int, metric: str, start: datetime, end: datetime) -> dict:
     # metric: cpu, mem, disk_queue, disk_read_lat, disk_write_lat, vol_free, nic_bps, nic_err
-    since_hours = 24
-    since = datetime.now(timezone.utc) - timedelta(hours=since_hours)
 
     if metric == "cpu":
-        q = await db.execute(select(Snapshot.timestamp_utc, Snapshot.cpu_utilization_pct).where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since).order_by(Snapshot.timestamp_utc.asc()))
-        rows = q.all()
+        rows = await host_history(db, endpoint_id, "snapshots", (Snapshot.timestamp_utc, Snapshot.cpu_utilization_pct), start, end)
         return {"labels": [r[0].isoformat() for r in rows], "series": [{"name": "CPU Util %", "data": [r[1] for r in rows]}]}
 
     if metric == "mem":
-        q = await db.execute(select(Snapshot.timestamp_utc, Snapshot.mem_used_pct).where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since).order_by(Snapshot.timestamp_utc.asc()))
-        rows = q.all()
+        rows = await host_history(db, endpoint_id, "snapshots", (Snapshot.timestamp_utc, Snapshot.mem_used_pct), start, end)
         return {"labels": [r[0].isoformat() for r in rows], "series": [{"name": "Memory Used %", "data": [r[1] for r in rows]}]}
 
     if metric in ("disk_queue", "disk_read_lat", "disk_write_lat"):
-        q = await db.execute(
-            select(Snapshot.timestamp_utc, DiskPhysical.instance, DiskPhysical.avg_queue_length, DiskPhysical.read_latency_ms, DiskPhysical.write_latency_ms)
-            .join(DiskPhysical, DiskPhysical.snapshot_id == Snapshot.id)
-            .where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since)
-            .order_by(Snapshot.timestamp_utc.asc())
+        rows = await host_history(
+            db, endpoint_id, "disk_physical",
+            (Snapshot.timestamp_utc, DiskPhysical.instance, DiskPhysical.avg_queue_length, DiskPhysical.read_latency_ms, DiskPhysical.write_latency_ms),
+            start, end,
         )
-        rows = q.all()
         # group by instance
         labels = sorted({r[0] for r in rows})
         label_str = [t.isoformat() for t in labels]
@@ -193,13 +317,7 @@ async def host_timeseries(endpoint_id: int, metric: str, db: AsyncSession = Depe
         return {"labels": label_str, "series": [{"name": f"{title} - {s['name']}", "data": s["data"]} for s in series]}
 
     if metric == "vol_free":
-        q = await db.execute(
-            select(Snapshot.timestamp_utc, DiskVolume.mount, DiskVolume.free_pct)
-            .join(DiskVolume, DiskVolume.snapshot_id == Snapshot.id)
-            .where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since)
-            .order_by(Snapshot.timestamp_utc.asc())
-        )
-        rows = q.all()
+        rows = await host_history(db, endpoint_id, "disk_volumes", (Snapshot.timestamp_utc, DiskVolume.mount, DiskVolume.free_pct), start, end)
         labels = sorted({r[0] for r in rows})
         label_str = [t.isoformat() for t in labels]
         by_mount = {}
@@ -211,13 +329,11 @@ async def host_timeseries(endpoint_id: int, metric: str, db: AsyncSession = Depe
         return {"labels": label_str, "series": series}
 
     if metric in ("nic_bps", "nic_err"):
-        q = await db.execute(
-            select(Snapshot.timestamp_utc, NetworkInterface.name, NetworkInterface.bits_total_per_sec, NetworkInterface.packets_in_errors, NetworkInterface.packets_out_errors)
-            .join(NetworkInterface, NetworkInterface.snapshot_id == Snapshot.id)
-            .where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= since)
-            .order_by(Snapshot.timestamp_utc.asc())
+        rows = await host_history(
+            db, endpoint_id, "network_interfaces",
+            (Snapshot.timestamp_utc, NetworkInterface.name, NetworkInterface.bits_total_per_sec, NetworkInterface.packets_in_errors, NetworkInterface.packets_out_errors),
+            start, end,
         )
-        rows = q.all()
         labels = sorted({r[0] for r in rows})
         label_str = [t.isoformat() for t in labels]
         by_name = {}
@@ -235,26 +351,208 @@ async def host_timeseries(endpoint_id: int, metric: str, db: AsyncSession = Depe
     raise HTTPException(status_code=400, detail="Unknown metric")
 
 
+@router.get("/api/ui/group/{group_id}/timeseries")
+async def group_timeseries_api(group_id: int, metric: str, db: AsyncSession = Depends(get_read_db), user: User = Depends(get_current_user)):
+    # metric: cpu (avg + max), nic_bps (total), vol_free (min); read from group_rollups
+    try:
+        return await group_timeseries(db, group_id, metric)
+    except GroupError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/api/ui/export")
+async def export_data(
+    dataset: str = "snapshots",
+    format: str = "csv",
+    endpoint_id: list[int] = Query(default=[]),
+    start: datetime | None = None,
+    end: datetime | None = None,
+    user: User = Depends(get_current_user),
+):
+    """Stream snapshots or a child table for any hosts/time range (default: all hosts, last 24h)."""
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=24)
+    try:
+        check_format(format)
+        dataset_columns(dataset)
+    except ExportError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+    media_type, ext = FORMATS[format]
+    filename = f"{dataset}-{start:%Y%m%dT%H%M}-{end:%Y%m%dT%H%M}.{ext}"
+    return StreamingResponse(
+        stream_export(dataset, format, endpoint_id or None, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+def _fleet_range(start: datetime | None, end: datetime | None) -> tuple[datetime, datetime]:
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    return start, end
+
+
+async def _fleet_call(coro):
+    try:
+        return await coro
+    except fleet.FleetQueryTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e)) from e
+    except fleet.FleetQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@router.get("/api/ui/fleet/percentiles")
+async def fleet_percentiles(
+    metric: str = "cpu",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bucket_seconds: int | None = Query(default=None, ge=60),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """p50/p95/p99 of cpu or mem across all hosts, per time bucket."""
+    start, end = _fleet_range(start, end)
+    return await _fleet_call(fleet.percentiles(db, metric, start, end, bucket_seconds))
+
+
+@router.get("/api/ui/fleet/over-threshold")
+async def fleet_over_threshold(
+    metric: str = "cpu",
+    threshold: float = 90.0,
+    start: datetime | None = None,
+    end: datetime | None = None,
+    bucket_seconds: int | None = Query(default=None, ge=60),
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """Number of distinct hosts with cpu or mem above `threshold`, per time bucket."""
+    start, end = _fleet_range(start, end)
+    return await _fleet_call(fleet.over_threshold(db, metric, threshold, start, end, bucket_seconds))
+
+
+@router.get("/api/ui/fleet/top")
+async def fleet_top(
+    metric: str = "disk_latency",
+    k: int = Query(default=10, ge=1, le=100),
+    start: datetime | None = None,
+    end: datetime | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """Top-K hosts by average disk latency or total NIC errors over the range."""
+    start, end = _fleet_range(start, end)
+    return await _fleet_call(fleet.top_k(db, metric, start, end, k))
+
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+@router.get("/api/ui/stream")
+async def ui_stream(request: Request, endpoint_id: int | None = None, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
+    """Server-Sent Events feed of ingest and alert events for live pages.
+
+    Pass `endpoint_id` to receive only that host's snapshots (alerts are always sent).
+    """
+    # Don't pin a pooled connection for the lifetime of the stream.
+    await db.close()
+
+    async def events():
+        q = bus.subscribe()
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if endpoint_id is not None and event.get("type") == "snapshot" and event.get("endpoint_id") != endpoint_id:
+                    continue
+                yield f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            bus.unsubscribe(q)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+SEARCH_PAGE_SIZE = 25
+
+
 @router.get("/search")
-async def global_search(request: Request, q: str, db: AsyncSession = Depends(get_db), user: User = Depends(get_current_user)):
-    like = f"%{q}%"
-    endpoints = (await db.execute(select(Endpoint).where(or_(Endpoint.hostname.ilike(like), Endpoint.machine_id.ilike(like))).limit(25))).scalars().all()
-    users = (await db.execute(select(LoggedInUser.username, Snapshot.endpoint_id).join(Snapshot, LoggedInUser.snapshot_id == Snapshot.id).where(LoggedInUser.username.ilike(like)).order_by(LoggedInUser.username.asc()).limit(25))).all()
-    return templates.TemplateResponse("search.html", {"request": request, "user": user, "q": q, "endpoints": endpoints, "user_hits": users})
+async def global_search(
+    request: Request,
+    q: str,
+    ep_after: str | None = None,
+    user_after: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    # Substring matches are served by the pg_trgm GIN indexes; pages are keyset
+    # cursors on the sort key so deep pages cost the same as the first.
+    like = like_pattern(q)
+
+    stmt = select(Endpoint.id, Endpoint.hostname, Endpoint.machine_id).where(or_(Endpoint.hostname.ilike(like), Endpoint.machine_id.ilike(like)))
+    after = decode_cursor(ep_after, str, int)
+    if after:
+        stmt = stmt.where(tuple_(Endpoint.hostname, Endpoint.id) > tuple_(*after))
+    endpoints = (await db.execute(stmt.order_by(Endpoint.hostname.asc(), Endpoint.id.asc()).limit(SEARCH_PAGE_SIZE + 1))).all()
+    ep_next = None
+    if len(endpoints) > SEARCH_PAGE_SIZE:
+        endpoints = endpoints[:SEARCH_PAGE_SIZE]
+        ep_next = encode_cursor(endpoints[-1].hostname, endpoints[-1].id)
+
+    stmt = (
+        select(EndpointUserSighting.username, EndpointUserSighting.endpoint_id, Endpoint.hostname, EndpointUserSighting.last_seen)
+        .join(Endpoint, Endpoint.id == EndpointUserSighting.endpoint_id)
+        .where(EndpointUserSighting.username.ilike(like))
+    )
+    after = decode_cursor(user_after, str, int)
+    if after:
+        stmt = stmt.where(tuple_(EndpointUserSighting.username, EndpointUserSighting.endpoint_id) > tuple_(*after))
+    users = (await db.execute(stmt.order_by(EndpointUserSighting.username.asc(), EndpointUserSighting.endpoint_id.asc()).limit(SEARCH_PAGE_SIZE + 1))).all()
+    user_next = None
+    if len(users) > SEARCH_PAGE_SIZE:
+        users = users[:SEARCH_PAGE_SIZE]
+        user_next = encode_cursor(users[-1][0], users[-1][1])
+
+    return templates.TemplateResponse(
+        "search.html",
+        {
+            "request": request, "user": user, "q": q, "endpoints": endpoints, "user_hits": users,
+            "ep_after": ep_after, "user_after": user_after, "ep_next": ep_next, "user_next": user_next,
+        },
+    )
 
 
 @router.get("/admin/endpoints")
 async def admin_endpoints(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(require_admin)):
     eps = (await db.execute(select(Endpoint).order_by(Endpoint.created_at.desc()))).scalars().all()
+    ep_groups = await group_names_by_endpoint(db, [ep.id for ep in eps])
     # show newly created token exactly once
     new_token = request.session.pop("new_endpoint_token", None)
-    return templates.TemplateResponse("admin_endpoints.html", {"request": request, "user": user, "endpoints": eps, "new_token": new_token})
+    error = request.session.pop("endpoint_error", None)
+    return templates.TemplateResponse("admin_endpoints.html", {"request": request, "user": user, "endpoints": eps, "ep_groups": ep_groups, "new_token": new_token, "error": error})
+
+
+@router.post("/admin/endpoints/{endpoint_id}/groups")
+async def admin_endpoint_groups(endpoint_id: int, request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(require_admin), groups: str = Form("")):
+    if not await db.get(Endpoint, endpoint_id):
+        raise HTTPException(status_code=404)
+    try:
+        await set_endpoint_groups(db, endpoint_id, parse_tags(groups))
+        await db.commit()
+    except GroupError as e:
+        request.session["endpoint_error"] = str(e)
+    return RedirectResponse(url="/admin/endpoints", status_code=303)
 
 
 @router.post("/admin/endpoints/new")
 async def admin_endpoints_new(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(require_admin), hostname: str = Form(...), machine_id: str = Form(...)):
     token = generate_token(32)
-    ep = Endpoint(hostname=hostname, machine_id=machine_id, token_hash=hash_token(token), is_active=True)
+    ep = Endpoint(hostname=hostname, machine_id=machine_id, token_hash=await hash_token_async(token), is_active=True)
     db.add(ep)
     await db.commit()
     # Show token once
@@ -273,13 +571,13 @@ async def download_endpoint_config(endpoint_id: int, request: Request, db: Async
     # If we don't have the plaintext token (i.e., old endpoint), generate a new one and replace.
     if not token:
         token = generate_token(32)
-        ep.token_hash = hash_token(token)
+        ep.token_hash = await hash_token_async(token)
         await db.commit()
 
     cfg = {
         "server_url": str(request.base_url).rstrip('/') + '/api/v1/ingest',
         "bearer_token": token,
-        "interval_seconds": 30,
+        "interval_seconds": settings.agent_interval_seconds,
         "enable": {
             "cpu": True,
             "memory": True,
@@ -302,14 +600,15 @@ async def admin_users(request: Request, db: AsyncSession = Depends(get_db), user
 
 @router.post("/admin/users/new")
 async def admin_users_new(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(require_admin), email: str = Form(...), password: str = Form(...), role: str = Form(...)):
-    db.add(User(email=email.lower(), password_hash=hash_password(password), role=UserRole(role)))
+    db.add(User(email=email.lower(), password_hash=await hash_password_async(password), role=UserRole(role)))
     await db.commit()
+    invalidate_user_cache()
     return RedirectResponse(url="/admin/users", status_code=302)
 
 
 @router.get("/admin/settings")
 async def admin_settings(request: Request, db: AsyncSession = Depends(get_db), user: User = Depends(require_admin)):
-    cfg = await _get_global_settings(db)
+    cfg = await get_raw_global_settings(db)
     return templates.TemplateResponse("admin_settings.html", {"request": request, "user": user, "cfg": json.dumps(cfg, indent=2)})
 
 
@@ -320,12 +619,8 @@ async def admin_settings_save(request: Request, db: AsyncSession = Depends(get_d
     except Exception:
         return templates.TemplateResponse("admin_settings.html", {"request": request, "user": user, "cfg": cfg_json, "error": "Invalid JSON"}, status_code=400)
 
-    q = await db.execute(select(Setting).where(Setting.key == "global"))
-    row = q.scalars().first()
-    if not row:
-        row = Setting(key="global", value=cfg)
-        db.add(row)
-    else:
-        row.value = cfg
-    await db.commit()
-    return RedirectResponse(url="/admin/settings", status_code=302)
\ No newline at end of file
+    try:
+        await save_global_config(db, cfg)
+    except ValidationError as e:
+        return templates.TemplateResponse("admin_settings.html", {"request": request, "user": user, "cfg": cfg_json, "error": f"Invalid settings: {e}"}, status_code=400)
+    return RedirectResponse(url="/admin/settings", status_code=302)
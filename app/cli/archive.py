@@ -0,0 +1,42 @@
+"""Move snapshot history older than HOT_RETENTION_DAYS to Parquet cold storage now.
+
+    python -m app.cli.archive
+
+Does what the scheduled archive job does (see app/services/archive.py);
+takes the same advisory lock, so it is safe to run next to the app.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+
+from app.services.archive import ArchiveError, archive_once, archived_until
+from app.services.scheduler import ARCHIVE_LOCK_KEY, run_locked
+
+
+async def run() -> int:
+    days = []
+
+    async def job() -> None:
+        days.append(await archive_once())
+
+    await run_locked(ARCHIVE_LOCK_KEY, job)
+    if not days:
+        print("archive job already running elsewhere", file=sys.stderr)
+        return 1
+    print(f"archived {days[0]} day(s); Postgres holds data from {archived_until() or 'the beginning'}", file=sys.stderr)
+    return 0
+
+
+def main() -> None:
+    argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter).parse_args()
+    try:
+        sys.exit(asyncio.run(run()))
+    except ArchiveError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Export snapshot data to a file.
+
+    python -m app.cli.export --dataset disk_volumes --format parquet \\
+        --start 2026-01-01 --end 2026-02-01 --hostname sql01 --hostname sql02 --out volumes.parquet
+
+Without --endpoint-id/--hostname every host is exported.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app.db.session import AsyncSessionLocal
+from app.models.endpoint import Endpoint
+from app.services.export import DATASETS, FORMATS, ExportError, stream_export
+
+
+def _parse_dt(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+async def _resolve_endpoint_ids(ids: list[int], hostnames: list[str]) -> list[int] | None:
+    if not hostnames:
+        return ids or None
+    async with AsyncSessionLocal() as db:
+        found = (await db.execute(select(Endpoint.id).where(Endpoint.hostname.in_(hostnames)))).scalars().all()
+    return sorted(set(ids) | set(found))
+
+
+async def run(args) -> int:
+    end = _parse_dt(args.end) if args.end else datetime.now(timezone.utc)
+    start = _parse_dt(args.start) if args.start else end - timedelta(hours=24)
+    endpoint_ids = await _resolve_endpoint_ids(args.endpoint_id, args.hostname)
+    if args.hostname and not endpoint_ids:
+        print("no matching hosts", file=sys.stderr)
+        return 1
+
+    written = 0
+    out = open(args.out, "wb") if args.out != "-" else sys.stdout.buffer
+    try:
+        async for chunk in stream_export(args.dataset, args.format, endpoint_ids, start, end, args.batch_size):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"wrote {written} bytes", file=sys.stderr)
+    return 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dataset", choices=list(DATASETS), default="snapshots")
+    ap.add_argument("--format", choices=list(FORMATS), default="csv")
+    ap.add_argument("--endpoint-id", type=int, action="append", default=[])
+    ap.add_argument("--hostname", action="append", default=[])
+    ap.add_argument("--start", help="ISO date/time (UTC if no offset); default end - 24h")
+    ap.add_argument("--end", help="ISO date/time (UTC if no offset); default now")
+    ap.add_argument("--batch-size", type=int, default=5000)
+    ap.add_argument("--out", default="-", help="output file, '-' for stdout")
+    args = ap.parse_args()
+    try:
+        sys.exit(asyncio.run(run(args)))
+    except ExportError as e:
+        sys.exit(str(e))
+
+
+if __name__ == "__main__":
+    main()
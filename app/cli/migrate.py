@@ -0,0 +1,88 @@
+"""Bring the main database and every snapshot shard to the Alembic head, skipping those already there.
+
+    python -m app.cli.migrate            # what the container runs before starting
+    python -m app.cli.migrate --check    # exit 1 if any database is behind; change nothing
+
+`alembic upgrade head` starts a process, imports every model and runs a
+migration transaction per database even when there is nothing to do. This
+reads `alembic_version` from all databases concurrently over plain
+connections and only hands the ones that are behind to Alembic, with the
+same URL and `-x` arguments the shell loop used to pass.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+
+
+def _config(db_url: str | None = None, role: str | None = None) -> Config:
+    x = [f"db_url={db_url}"] if db_url else []
+    if role:
+        x.append(f"role={role}")
+    cfg = Config(str(ALEMBIC_INI), cmd_opts=argparse.Namespace(x=x))
+    cfg.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    return cfg
+
+
+def _targets() -> list[tuple[str, str | None, str | None]]:
+    """(name, db_url override, role) per database; the main one uses alembic.ini's URL like `alembic upgrade head`."""
+    shard_urls = [u.strip() for u in settings.shard_database_urls.split(",") if u.strip()]
+    return [("main", None, None)] + [(f"shard{i}", url, "shard") for i, url in enumerate(shard_urls)]
+
+
+async def _current(url: str) -> set[str]:
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with engine.connect() as conn:
+            if not await conn.scalar(text("SELECT to_regclass('alembic_version') IS NOT NULL")):
+                return set()
+            return set((await conn.execute(text("SELECT version_num FROM alembic_version"))).scalars())
+    finally:
+        await engine.dispose()
+
+
+async def _all_current(urls: list[str]) -> list[set[str]]:
+    return list(await asyncio.gather(*(_current(u) for u in urls)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="only report; exit 1 if any database is behind")
+    args = parser.parse_args()
+
+    heads = set(ScriptDirectory.from_config(_config()).get_heads())
+    targets = _targets()
+    main_url = _config().get_main_option("sqlalchemy.url")
+    current = asyncio.run(_all_current([url or main_url for _, url, _ in targets]))
+
+    behind = []
+    for (name, url, role), revs in zip(targets, current):
+        if revs == heads:
+            print(f"{name}: at head ({', '.join(sorted(revs))}), skipping", file=sys.stderr)
+        else:
+            print(f"{name}: at {', '.join(sorted(revs)) or 'nothing'}, head is {', '.join(sorted(heads))}", file=sys.stderr)
+            behind.append((name, url, role))
+
+    if args.check:
+        sys.exit(1 if behind else 0)
+    for name, url, role in behind:
+        print(f"{name}: upgrading", file=sys.stderr)
+        command.upgrade(_config(url, role), "head")
+
+
+if __name__ == "__main__":
+    main()
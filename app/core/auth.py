@@ -1,22 +1,51 @@
 from __future__ import annotations
 
+import time
+
 from fastapi import Depends, Request, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
 from app.db.session import get_db
 from app.models.user import User, UserRole
 
+# user id -> (expires_at monotonic, detached User). Bounded by the number of
+# active users; stale for at most USER_CACHE_TTL_SECONDS in other processes.
+_USER_CACHE: dict[int, tuple[float, User]] = {}
+
+
+def invalidate_user_cache(user_id: int | None = None) -> None:
+    if user_id is None:
+        _USER_CACHE.clear()
+    else:
+        _USER_CACHE.pop(user_id, None)
+
 
 async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)) -> User:
     user_id = request.session.get("user_id")
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    user_id = int(user_id)
+
+    now = time.monotonic()
+    cached = _USER_CACHE.get(user_id)
+    if cached and cached[0] > now:
+        CACHE_REQUESTS.inc(1, "user", "hit")
+        return cached[1]
+    CACHE_REQUESTS.inc(1, "user", "miss")
 
-    q = await db.execute(select(User).where(User.id == int(user_id), User.is_active.is_(True)))
+    q = await db.execute(select(User).where(User.id == user_id, User.is_active.is_(True)))
     user = q.scalars().first()
     if not user:
+        invalidate_user_cache(user_id)
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+    if settings.user_cache_ttl_seconds > 0:
+        # Detach so the instance can be shared read-only across requests.
+        db.expunge(user)
+        _USER_CACHE[user_id] = (now + settings.user_cache_ttl_seconds, user)
     return user
 
 
@@ -12,6 +12,36 @@ class Settings(BaseSettings):
     # DB
     database_url: str = "postgresql+asyncpg://metrics:metrics@db:5432/metrics"
 
+    # Snapshot shards: comma-separated database URLs. Each endpoint's snapshots
+    # live on shard endpoint_id % N; empty keeps them in DATABASE_URL. Never
+    # change the list once data has been written (there is no rebalancing).
+    shard_database_urls: str = ""
+
+    # Optional streaming replica for dashboard, host, search, fleet and export
+    # reads. Reads fall back to the primary while the replica lags more than
+    # READ_REPLICA_MAX_LAG_SECONDS (checked at most every
+    # READ_REPLICA_LAG_CHECK_SECONDS) and, for that long, after a browser
+    # submits a write. Admin pages always read the primary.
+    read_replica_url: str | None = None
+    read_replica_max_lag_seconds: float = 10.0
+    read_replica_lag_check_seconds: float = 5.0
+
+    # DB pools (per worker process). The UI and ingest get separate pools so
+    # slow dashboard queries can't exhaust the connections ingest needs.
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    ingest_db_pool_size: int = 10
+    ingest_db_max_overflow: int = 10
+    db_pool_timeout_seconds: int = 10
+    db_pool_recycle_seconds: int = 1800
+    db_pool_pre_ping: bool = False
+    # Connections each pool opens during startup warm-up, before /readyz passes
+    # (capped at the pool size; 0 = connect lazily)
+    db_pool_prewarm: int = 2
+    # Set when connecting through PgBouncer in transaction pooling mode:
+    # disables asyncpg's prepared statement cache.
+    db_pgbouncer_mode: bool = False
+
     # Bootstrap admin
     bootstrap_admin_email: str = "admin@example.com"
     bootstrap_admin_password: str = "admin123!"
@@ -23,6 +53,94 @@ class Settings(BaseSettings):
     smtp_password: str | None = None
     smtp_from: str | None = None
 
+    # Ingest admission control (token buckets, per worker process). Each endpoint
+    # may send INGEST_ENDPOINT_RATE_MULTIPLIER snapshots per declared interval
+    # (never shorter than INGEST_MIN_INTERVAL_SECONDS), plus a burst for catch-up.
+    ingest_rate_limit_enabled: bool = True
+    ingest_endpoint_rate_multiplier: float = 2.0
+    ingest_endpoint_burst: int = 10
+    ingest_min_interval_seconds: int = 5
+    # Across all endpoints (0 = unlimited)
+    ingest_global_rate_per_sec: float = 500.0
+    ingest_global_burst: int = 1000
+
+    # Durable ingest spool (opt-in): when Postgres is down or the ingest pool
+    # times out, validated snapshots are fsynced to local segment files,
+    # acknowledged with 202, and replayed once the DB is back. SPOOL_DIR should
+    # be a persistent volume shared by all workers on the host.
+    spool_enabled: bool = False
+    spool_dir: str = "/var/lib/metrics-receiver/spool"
+    spool_segment_max_bytes: int = 16 * 1024 * 1024
+    # Appends within this window share one write + fsync
+    spool_fsync_interval_ms: int = 10
+    spool_replay_batch: int = 200
+    spool_replay_interval_seconds: int = 5
+
+    # Streaming ingest: agents may hold one WebSocket open at /api/v1/ingest/ws
+    # and send snapshots as frames, authenticating once per connection.
+    ingest_ws_enabled: bool = True
+    ingest_ws_auth_timeout_seconds: int = 10
+    ingest_ws_max_message_bytes: int = 1024 * 1024
+
+    # Adaptive agent intervals: ingest responses carry "directives" telling the
+    # agent when to report next. AGENT_INTERVAL_SECONDS is the normal interval
+    # (also written into downloaded agent configs); quiet hosts stretch to
+    # AGENT_QUIET_MULTIPLIER x that, hosts with a recent alert drop to the
+    # minimum, and everyone slows down while the receiver is under pressure.
+    agent_directives_enabled: bool = True
+    agent_interval_seconds: int = 30
+    agent_interval_min_seconds: int = 10
+    agent_interval_max_seconds: int = 300
+    # "Quiet": CPU and memory % both at most AGENT_QUIET_PCT and each moved
+    # by at most AGENT_QUIET_DELTA_PCT since the previous report
+    agent_quiet_pct: float = 20.0
+    agent_quiet_delta_pct: float = 5.0
+    agent_quiet_multiplier: float = 4.0
+    agent_alert_boost_minutes: int = 15
+    # Ingest pool use (checked out / pool size + overflow) counted as pressure
+    agent_pressure_pool_ratio: float = 0.75
+
+    # Cold storage (opt-in, needs pyarrow): whole UTC days of snapshot history
+    # older than HOT_RETENTION_DAYS are moved to Parquet under ARCHIVE_DIR by a
+    # scheduled job, then deleted from Postgres. Host charts and exports read
+    # archived days transparently. ARCHIVE_DIR must be shared by every app
+    # instance (a volume, or network storage across hosts).
+    archive_enabled: bool = False
+    archive_dir: str = "/var/lib/metrics-receiver/archive"
+    hot_retention_days: int = 30
+    archive_interval_minutes: int = 60
+
+    # Threads per worker for PBKDF2 password/token hashing (keeps it off the event loop)
+    hash_workers: int = 2
+
+    # Global (UI) settings are cached per process; the stored version is
+    # re-checked at most this often (0 = rely on event bus notifications only)
+    global_settings_poll_seconds: int = 10
+
+    # Session user lookups are cached per process for this long (0 = off)
+    user_cache_ttl_seconds: int = 30
+
+    # Self-instrumentation: if set, /metrics requires "Authorization: Bearer <token>"
+    metrics_token: str | None = None
+
+    # Per-request profiling (opt-in): query counts + Server-Timing headers, and
+    # admin-only "?__profile=1" pyinstrument reports.
+    profiling_enabled: bool = False
+    # Log statements slower than this with their bound parameters (0 = off)
+    slow_query_ms: int = 0
+
+    # Full-entity SELECTs of snapshot tables: "raise", "warn" or "off"
+    # (default: raise outside production, warn in production)
+    entity_load_guard: str | None = None
+
+    # Fleet aggregate queries (/api/ui/fleet/*) are cancelled after this long
+    fleet_query_timeout_ms: int = 2000
+
+    # Event bus (live UI updates, heartbeat deadlines, directive pushes):
+    # "postgres" (LISTEN/NOTIFY, reaches every worker and replica) or "memory"
+    # (this process only; fine for a single uvicorn process)
+    event_bus_backend: str = "postgres"
+
     # Heartbeat / worker
     scheduler_enabled: bool = True
     scheduler_interval_seconds: int = 30
@@ -0,0 +1,176 @@
+"""Minimal Prometheus text-format instrumentation.
+
+Metrics are only updated from the event loop thread, so plain attribute and
+list updates are atomic enough and no locks are taken on the hot path. Each
+worker process keeps its own values; Prometheus should scrape every worker
+(or sum them) the same way it does for any pre-fork server.
+"""
+
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Seconds. Covers sub-millisecond stages up to slow DB commits.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Bytes.
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_REGISTRY: list["_Metric"] = []
+
+
+def _fmt_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        _REGISTRY.append(self)
+
+    def _samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labelvalues: str) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        for labels, v in self._values.items():
+            yield f"{self.name}{_fmt_labels(self.labelnames, labels)} {v}"
+
+
+class Gauge(_Metric):
+    """Gauge whose value is read from a callback at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callbacks: dict[tuple[str, ...], Callable[[], float]] = {}
+
+    def set_function(self, fn: Callable[[], float], *labelvalues: str) -> None:
+        self._callbacks[labelvalues] = fn
+
+    def _samples(self) -> Iterator[str]:
+        for labels, fn in self._callbacks.items():
+            try:
+                v = float(fn())
+            except Exception:
+                continue
+            yield f"{self.name}{_fmt_labels(self.labelnames, labels)} {v}"
+
+
+class _HistogramChild:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, n_buckets: int):
+        # Last slot is the +Inf bucket.
+        self.counts = [0] * (n_buckets + 1)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self._children: dict[tuple[str, ...], _HistogramChild] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        child = self._children.get(labelvalues)
+        if child is None:
+            child = self._children[labelvalues] = _HistogramChild(len(self.buckets))
+        # Non-cumulative counts; cumulated at render time.
+        child.counts[bisect_left(self.buckets, value)] += 1
+        child.sum += value
+
+    @contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def _samples(self) -> Iterator[str]:
+        for labels, child in self._children.items():
+            acc = 0
+            for bound, c in zip(self.buckets, child.counts):
+                acc += c
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le)} {acc}"
+            acc += child.counts[-1]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_fmt_labels(self.labelnames, labels, le)} {acc}"
+            yield f"{self.name}_sum{_fmt_labels(self.labelnames, labels)} {child.sum}"
+            yield f"{self.name}_count{_fmt_labels(self.labelnames, labels)} {acc}"
+
+
+def render_latest() -> str:
+    return "\n".join(m.render() for m in _REGISTRY) + "\n"
+
+
+# ---------------------------------------------------------------------------
+# Receiver metrics
+# ---------------------------------------------------------------------------
+
+INGEST_STAGE_SECONDS = Histogram(
+    "receiver_ingest_stage_seconds",
+    "Ingest latency by stage (auth, decode, validate, insert, commit).",
+    ("stage",),
+)
+INGEST_REQUEST_SECONDS = Histogram("receiver_ingest_request_seconds", "End-to-end ingest request latency.", ("outcome",))
+INGEST_DUPLICATES = Counter("receiver_ingest_duplicates_total", "Snapshots already stored (agent retries), acknowledged without writing.")
+INGEST_SHED = Counter("receiver_ingest_shed_total", "Ingest requests rejected with 429 by the rate limiter.", ("scope",))
+SPOOL_RECORDS = Counter("receiver_spool_records_total", "Snapshots spooled to disk during DB outages, and later replayed or dropped.", ("event",))
+SPOOL_BACKLOG_BYTES = Gauge("receiver_spool_backlog_bytes", "Bytes in spool segments not yet replayed.")
+AGENT_DIRECTIVES = Counter("receiver_agent_directives_total", "Interval directives returned to agents, by reason.", ("reason",))
+INGEST_STREAMS = Gauge("receiver_ingest_streams", "Open streaming (WebSocket) ingest connections in this worker.")
+INGEST_PAYLOAD_BYTES = Histogram("receiver_ingest_payload_bytes", "Ingest request body size.", buckets=SIZE_BUCKETS)
+
+DB_POOL_CONNECTIONS = Gauge("receiver_db_pool_connections", "DB pool connections by pool and state.", ("pool", "state"))
+
+REPLICA_LAG_SECONDS = Gauge("receiver_db_replica_lag_seconds", "Read replica replay lag at the last check (-1 = unreachable or not configured).")
+DB_READS = Counter("receiver_db_reads_total", "Read-only UI sessions by target database.", ("target",))
+ARCHIVE_ROWS = Counter("receiver_archive_rows_total", "Rows moved from Postgres to Parquet cold storage, by dataset.", ("dataset",))
+HEARTBEAT_TRACKED = Gauge("receiver_heartbeat_tracked_endpoints", "Endpoints with a pending missed-heartbeat deadline in this worker.")
+READY = Gauge("receiver_ready", "1 once this worker has finished startup warm-up and /readyz passes.")
+WARMUP_SECONDS = Gauge("receiver_warmup_seconds", "How long this worker's startup warm-up took (-1 while still warming).")
+SCHEDULER_TICK_SECONDS = Histogram("receiver_scheduler_tick_seconds", "Duration of check_alerts_once.")
+
+NOTIFY_SECONDS = Histogram("receiver_notification_seconds", "Alert notification delivery latency.", ("channel",))
+NOTIFY_FAILURES = Counter("receiver_notification_failures_total", "Alert notification delivery failures.", ("channel",))
+
+HASH_QUEUE_DEPTH = Gauge("receiver_hash_queue_depth", "PBKDF2 hash/verify jobs queued or running on the hashing pool.")
+
+CACHE_REQUESTS = Counter("receiver_cache_requests_total", "In-process cache lookups by cache and result (hit/miss).", ("cache", "result"))
+
+
+def register_pool(name: str, pool) -> None:
+    """Expose a SQLAlchemy QueuePool's usage as gauges."""
+    DB_POOL_CONNECTIONS.set_function(pool.checkedout, name, "checked_out")
+    DB_POOL_CONNECTIONS.set_function(pool.checkedin, name, "idle")
+    DB_POOL_CONNECTIONS.set_function(pool.size, name, "size")
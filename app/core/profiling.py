@@ -0,0 +1,155 @@
+"""Opt-in per-request profiling for the web UI.
+
+- SQLAlchemy cursor hooks count queries and DB time for the current request
+  and log slow statements with their bound parameters.
+- `ProfilingMiddleware` reports the breakdown in a `Server-Timing` header.
+- Admins can append `?__profile=1` to a URL to get a pyinstrument report
+  instead of the normal response (requires `pyinstrument` to be installed).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger("app.slow_query")
+
+PROFILE_PARAM = "__profile"
+
+
+class RequestStats:
+    __slots__ = ("path", "queries", "db_seconds")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def install_query_hooks(sync_engine: Engine) -> None:
+    if not (settings.profiling_enabled or settings.slow_query_ms):
+        return
+
+    slow_s = settings.slow_query_ms / 1000.0 if settings.slow_query_ms else None
+
+    # One statement runs at a time per connection, so a single start time is
+    # enough; it is cleared on error too, so a failed statement can't leave a
+    # stale value behind on a pooled connection.
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info["_query_start"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        if exception_context.connection is not None:
+            exception_context.connection.info.pop("_query_start", None)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop("_query_start", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        stats = _current.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_seconds += elapsed
+        if slow_s is not None and elapsed >= slow_s:
+            logger.warning(
+                "slow query %.1fms path=%s params=%r sql=%s",
+                elapsed * 1000,
+                stats.path if stats else None,
+                parameters,
+                " ".join(statement.split()),
+            )
+
+
+async def _is_admin(scope) -> bool:
+    from app.db.session import AsyncSessionLocal
+    from app.models.user import User, UserRole
+
+    user_id = (scope.get("session") or {}).get("user_id")
+    if not user_id:
+        return False
+    async with AsyncSessionLocal() as db:
+        role = await db.scalar(select(User.role).where(User.id == int(user_id), User.is_active.is_(True)))
+    return role == UserRole.admin
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware so streaming responses are passed through untouched.
+
+    Must be installed inside SessionMiddleware (i.e. added before it) so the
+    admin check can read the session.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        qs = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if PROFILE_PARAM in qs and await _is_admin(scope):
+            await self._profile(scope, receive, send)
+            return
+
+        stats = RequestStats(scope.get("path", ""))
+        token = _current.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - started) * 1000
+                db_ms = stats.db_seconds * 1000
+                value = f'db;dur={db_ms:.1f};desc="{stats.queries} queries", app;dur={max(total_ms - db_ms, 0.0):.1f}, total;dur={total_ms:.1f}'
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+
+    async def _profile(self, scope, receive, send):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            await self.app(scope, receive, send)
+            return
+
+        async def discard(message):
+            pass
+
+        profiler = Profiler(async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            profiler.stop()
+
+        body = profiler.output_html().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/html; charset=utf-8"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
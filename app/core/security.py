@@ -8,13 +8,38 @@ Why:
   package changes its internals.
 
 PBKDF2-SHA256 avoids both issues and is widely supported.
+
+Each hash/verify costs tens of milliseconds of CPU, so request handlers must
+use the `*_async` variants. They run on a small bounded thread pool; hashlib's
+PBKDF2 releases the GIL, so hashing doesn't block the event loop or other
+requests on the same worker.
 """
 
+import asyncio
 import secrets
+from concurrent.futures import ThreadPoolExecutor
+
 from passlib.context import CryptContext
 
+from app.core.config import settings
+from app.core.metrics import HASH_QUEUE_DEPTH
+
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 
+_executor = ThreadPoolExecutor(max_workers=max(settings.hash_workers, 1), thread_name_prefix="pwhash")
+# Hash jobs submitted and not yet finished (queued + running).
+_pending = 0
+HASH_QUEUE_DEPTH.set_function(lambda: _pending)
+
+
+async def _offload(fn, *args):
+    global _pending
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -35,3 +60,19 @@ def hash_token(token: str) -> str:
 
 def verify_token(token: str, token_hash: str) -> bool:
     return pwd_context.verify(token, token_hash)
+
+
+async def hash_password_async(password: str) -> str:
+    return await _offload(hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    return await _offload(verify_password, password, password_hash)
+
+
+async def hash_token_async(token: str) -> str:
+    return await _offload(hash_token, token)
+
+
+async def verify_token_async(token: str, token_hash: str) -> bool:
+    return await _offload(verify_token, token, token_hash)
@@ -0,0 +1,60 @@
+"""Catch accidental full-entity loads of the high-volume snapshot tables.
+
+Snapshots and their child rows are only ever read through column
+projections (`select(Snapshot.timestamp_utc, Snapshot.cpu_utilization_pct)`):
+a full entity builds an ORM object per row and, for `Snapshot`, would drag
+the raw_payload JSONB along if it weren't deferred. A `do_orm_execute` hook
+checks every ORM SELECT, including `session.get` and relationship lazy
+loads, and raises `FullEntityLoadError` (ENTITY_LOAD_GUARD=raise) or logs
+the offending statement (warn).
+
+Pass `.execution_options(allow_full_entity=True)` where a full load is
+really wanted.
+"""
+
+from __future__ import annotations
+
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from app.core.config import settings
+from app.models.snapshot import Snapshot, DiskPhysical, DiskVolume, NetworkInterface, LoggedInUser
+
+logger = logging.getLogger(__name__)
+
+GUARDED_ENTITIES = (Snapshot, DiskPhysical, DiskVolume, NetworkInterface, LoggedInUser)
+
+
+class FullEntityLoadError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def guard_mode() -> str:
+    if settings.entity_load_guard:
+        return settings.entity_load_guard.lower()
+    return "warn" if settings.environment.lower() == "production" else "raise"
+
+
+def _loaded_entities(state: ORMExecuteState) -> list[str]:
+    # Column projections describe each column's SQL type; entities describe their class.
+    return [d["type"].__name__ for d in state.statement.column_descriptions if any(d.get("type") is e for e in GUARDED_ENTITIES)]
+
+
+def _check(state: ORMExecuteState) -> None:
+    if not state.is_select or state.execution_options.get("allow_full_entity"):
+        return
+    entities = _loaded_entities(state)
+    if not entities:
+        return
+    message = f"full-entity load of {', '.join(entities)}; select the needed columns instead (or pass allow_full_entity=True): {state.statement}"
+    if guard_mode() == "raise":
+        raise FullEntityLoadError(message)
+    logger.warning(message)
+
+
+def install_entity_guard() -> None:
+    if guard_mode() != "off" and not event.contains(Session, "do_orm_execute", _check):
+        event.listen(Session, "do_orm_execute", _check)
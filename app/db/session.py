@@ -1,10 +1,145 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+from uuid import uuid4
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from app.core.config import settings
+from app.core.metrics import register_pool, REPLICA_LAG_SECONDS, DB_READS
+from app.core.profiling import install_query_hooks
+from app.db.guards import install_entity_guard
+
+
+def make_engine(pool_size: int, max_overflow: int, url: str | None = None) -> AsyncEngine:
+    connect_args = {}
+    if settings.db_pgbouncer_mode:
+        # PgBouncer (transaction mode) can hand each statement a different
+        # server connection, so named prepared statements must not be reused.
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+
+    return create_async_engine(
+        url or settings.database_url,
+        echo=False,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.db_pool_timeout_seconds,
+        pool_recycle=settings.db_pool_recycle_seconds,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        connect_args=connect_args,
+    )
 
-engine = create_async_engine(settings.database_url, echo=False, pool_pre_ping=True)
+
+# UI / admin / scheduler traffic
+engine = make_engine(settings.db_pool_size, settings.db_max_overflow)
 AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+# Agent ingest traffic
+ingest_engine = make_engine(settings.ingest_db_pool_size, settings.ingest_db_max_overflow)
+IngestSessionLocal = async_sessionmaker(ingest_engine, expire_on_commit=False, class_=AsyncSession)
+
+
+# Read-only UI/reporting traffic, when a streaming replica is configured
+replica_engine = make_engine(settings.db_pool_size, settings.db_max_overflow, settings.read_replica_url) if settings.read_replica_url else None
+ReplicaSessionLocal = async_sessionmaker(replica_engine, expire_on_commit=False, class_=AsyncSession) if replica_engine is not None else None
+
+
+register_pool("ui", engine.pool)
+register_pool("ingest", ingest_engine.pool)
+install_query_hooks(engine.sync_engine)
+install_query_hooks(ingest_engine.sync_engine)
+if replica_engine is not None:
+    register_pool("replica", replica_engine.pool)
+    install_query_hooks(replica_engine.sync_engine)
+
+install_entity_guard()
+
+logger = logging.getLogger(__name__)
+
+# Seconds of WAL the replica has yet to replay. 0 when it is streaming and has
+# replayed all it received (an idle primary doesn't make it look stale). A
+# replica whose WAL receiver is down also has receive = replay, so then the
+# lag is the age of the last replayed transaction, or NULL if there is none.
+# `status` is NULL without pg_read_all_stats; a running receiver counts then.
+_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE coalesce(status, 'streaming') = 'streaming') "
+    "AND pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+# Session key: until this epoch time, this browser reads from the primary.
+_READ_PRIMARY_UNTIL = "read_primary_until"
+
+
+class _ReplicaState:
+    usable: bool = False
+    lag: float | None = None
+    checked_at: float = float("-inf")
+
 
-async def get_db() -> AsyncSession:
+_replica = _ReplicaState()
+REPLICA_LAG_SECONDS.set_function(lambda: _replica.lag if _replica.lag is not None else -1.0)
+
+
+async def replica_usable() -> bool:
+    """True if the replica answered with a known lag within READ_REPLICA_MAX_LAG_SECONDS at the last check."""
+    if replica_engine is None:
+        return False
+    now = time.monotonic()
+    if now - _replica.checked_at < settings.read_replica_lag_check_seconds:
+        return _replica.usable
+    _replica.checked_at = now
+    try:
+        async with replica_engine.connect() as conn:
+            lag = await conn.scalar(_LAG_SQL)
+        _replica.lag = float(lag) if lag is not None else None
+        _replica.usable = _replica.lag is not None and _replica.lag <= settings.read_replica_max_lag_seconds
+    except Exception:
+        logger.warning("read replica unavailable, reading from the primary", exc_info=True)
+        _replica.lag, _replica.usable = None, False
+    return _replica.usable
+
+
+async def read_sessionmaker() -> async_sessionmaker:
+    if await replica_usable():
+        DB_READS.inc(1, "replica")
+        return ReplicaSessionLocal
+    DB_READS.inc(1, "primary")
+    return AsyncSessionLocal
+
+
+async def get_db(request: Request) -> AsyncSession:
+    """Primary session. Writes through it send this browser's reads to the primary for a while."""
+    if replica_engine is not None and request.method not in ("GET", "HEAD", "OPTIONS") and "session" in request.scope:
+        request.session[_READ_PRIMARY_UNTIL] = time.time() + settings.read_replica_max_lag_seconds
     async with AsyncSessionLocal() as session:
         yield session
+
+
+async def get_read_db(request: Request) -> AsyncSession:
+    """Session for read-only UI queries: the replica, unless it lags or this browser just wrote."""
+    if "session" in request.scope and request.session.get(_READ_PRIMARY_UNTIL, 0) > time.time():
+        DB_READS.inc(1, "primary")
+        factory = AsyncSessionLocal
+    else:
+        factory = await read_sessionmaker()
+    async with factory() as session:
+        yield session
+
+
+async def prewarm(factory: async_sessionmaker, connections: int) -> None:
+    """Open `connections` pool connections at once and hand them back idle, so first requests don't connect."""
+    async with AsyncExitStack() as stack:
+        sessions = [await stack.enter_async_context(factory()) for _ in range(connections)]
+        await asyncio.gather(*(s.connection() for s in sessions))
+
+
+async def get_ingest_db() -> AsyncSession:
+    async with IngestSessionLocal() as session:
+        yield session
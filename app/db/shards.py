@@ -0,0 +1,106 @@
+"""Snapshot storage sharded across Postgres databases by endpoint id.
+
+`snapshots` and its child tables (disk_physical, disk_volumes,
+network_interfaces, logged_in_users) live on shard `endpoint_id % N`, where
+the N shards are the databases in SHARD_DATABASE_URLS. Everything else
+(endpoints, users, settings, alerts, groups, endpoint_volumes, sightings)
+stays in DATABASE_URL. Every shard gets its own ingest and UI pools, sized
+like the main ones.
+
+With SHARD_DATABASE_URLS empty there is a single shard backed by the main
+engines, and `writer`/`reader` hand back the caller's own session, so
+unsharded deployments keep one transaction per ingest exactly as before.
+
+N must not change once data is written: there is no rebalancing.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.metrics import register_pool
+from app.core.profiling import install_query_hooks
+from app.db.session import AsyncSessionLocal, IngestSessionLocal, make_engine
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class Shard:
+    index: int
+    ingest: async_sessionmaker
+    ui: async_sessionmaker
+
+
+_URLS = [u.strip() for u in settings.shard_database_urls.split(",") if u.strip()]
+
+
+def _build(urls: list[str]) -> list[Shard]:
+    if not urls:
+        return [Shard(0, IngestSessionLocal, AsyncSessionLocal)]
+
+    shards = []
+    for i, url in enumerate(urls):
+        ingest_engine = make_engine(settings.ingest_db_pool_size, settings.ingest_db_max_overflow, url)
+        ui_engine = make_engine(settings.db_pool_size, settings.db_max_overflow, url)
+        for name, eng in ((f"shard{i}_ingest", ingest_engine), (f"shard{i}_ui", ui_engine)):
+            register_pool(name, eng.pool)
+            install_query_hooks(eng.sync_engine)
+        shards.append(Shard(
+            i,
+            async_sessionmaker(ingest_engine, expire_on_commit=False, class_=AsyncSession),
+            async_sessionmaker(ui_engine, expire_on_commit=False, class_=AsyncSession),
+        ))
+    return shards
+
+
+SHARDS = _build(_URLS)
+
+
+def is_sharded() -> bool:
+    return bool(_URLS)
+
+
+def shard_for(endpoint_id: int) -> Shard:
+    return SHARDS[endpoint_id % len(SHARDS)]
+
+
+@asynccontextmanager
+async def writer(endpoint_id: int, db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """Ingest session for `endpoint_id`'s snapshots (`db` itself when unsharded)."""
+    if not is_sharded():
+        yield db
+        return
+    async with shard_for(endpoint_id).ingest() as session:
+        yield session
+
+
+@asynccontextmanager
+async def reader(endpoint_id: int, db: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """UI session for reading `endpoint_id`'s snapshots (`db` itself when unsharded)."""
+    if not is_sharded():
+        yield db
+        return
+    async with shard_for(endpoint_id).ui() as session:
+        yield session
+
+
+async def scatter(db: AsyncSession, fn: Callable[[AsyncSession], Awaitable[T]]) -> list[T]:
+    """Run `fn(session)` on every shard concurrently; results in shard order.
+
+    Unsharded, this is just `[await fn(db)]`.
+    """
+    if not is_sharded():
+        return [await fn(db)]
+
+    async def one(shard: Shard) -> T:
+        async with shard.ui() as session:
+            return await fn(session)
+
+    return list(await asyncio.gather(*(one(s) for s in SHARDS)))
@@ -5,15 +5,25 @@ from starlette.middleware.sessions import SessionMiddleware
 from starlette.staticfiles import StaticFiles
 
 from app.core.config import settings
+from app.core.profiling import ProfilingMiddleware
 from app.api.routes import router as web_router
 from app.api.api import router as api_router
-from app.services.bootstrap import bootstrap_admin
+from app.api.metrics import router as metrics_router
+from app.api.health import router as health_router, readiness
+from app.db.session import engine, ingest_engine, replica_engine
+from app.services.events import bus
+from app.services.heartbeats import tracker as heartbeat_tracker
 from app.services.scheduler import start_scheduler
+from app.services.spool import spool
 
 
 def create_app() -> FastAPI:
     app = FastAPI(title=settings.app_name)
 
+    # Added first so it sits inside SessionMiddleware and can read the session.
+    if settings.profiling_enabled:
+        app.add_middleware(ProfilingMiddleware)
+
     app.add_middleware(
         SessionMiddleware,
         secret_key=settings.secret_key,
@@ -26,11 +36,29 @@ def create_app() -> FastAPI:
 
     app.include_router(web_router)
     app.include_router(api_router, prefix="/api")
+    app.include_router(metrics_router)
+    app.include_router(health_router)
 
     @app.on_event("startup")
     async def _startup() -> None:
-        await bootstrap_admin()
+        # Bootstrap, pool and cache warm-up run in the background; /readyz passes once they're done.
+        await readiness.start()
+        await bus.start()
+        await spool.start()
         start_scheduler(app)
+        if settings.scheduler_enabled:
+            await heartbeat_tracker.start()
+
+    @app.on_event("shutdown")
+    async def _shutdown() -> None:
+        await readiness.stop()
+        await bus.stop()
+        await spool.stop()
+        await heartbeat_tracker.stop()
+        await engine.dispose()
+        await ingest_engine.dispose()
+        if replica_engine is not None:
+            await replica_engine.dispose()
 
     return app
 
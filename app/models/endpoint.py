@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
-from sqlalchemy import String, DateTime, Boolean, Integer
+from sqlalchemy import String, DateTime, Boolean, Integer, Float
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.models.base import Base
@@ -21,5 +21,13 @@ class Endpoint(Base):
 
     last_seen: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     last_interval_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # interval + backoff from the last directives sent to the agent; heartbeat
+    # grace covers the larger of this and the reported interval
+    directed_interval_seconds: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    # Copied from the latest snapshot so the dashboard can sort/page endpoints alone.
+    last_cpu_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
+    last_mem_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # users.count from the last snapshot that reported users (carried forward by 1.1 deltas)
+    last_users_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
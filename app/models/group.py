@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from sqlalchemy import String, DateTime, Integer, Float, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class EndpointGroup(Base):
+    """A named tag ("sql-servers", "site-a") that endpoints can belong to."""
+
+    __tablename__ = "endpoint_groups"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class EndpointGroupMember(Base):
+    __tablename__ = "endpoint_group_members"
+
+    group_id: Mapped[int] = mapped_column(ForeignKey("endpoint_groups.id", ondelete="CASCADE"), primary_key=True)
+    endpoint_id: Mapped[int] = mapped_column(ForeignKey("endpoints.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class GroupRollup(Base):
+    """Per-group, per-bucket aggregates, upserted by every ingest of a member endpoint."""
+
+    __tablename__ = "group_rollups"
+
+    group_id: Mapped[int] = mapped_column(ForeignKey("endpoint_groups.id", ondelete="CASCADE"), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+
+    samples: Mapped[int] = mapped_column(Integer, nullable=False)
+    cpu_samples: Mapped[int] = mapped_column(Integer, nullable=False)
+    cpu_sum: Mapped[float] = mapped_column(Float, nullable=False)
+    cpu_max: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # Sum of bits_total_per_sec * interval_seconds; divided by the bucket length for throughput.
+    nic_bits: Mapped[float] = mapped_column(Float, nullable=False)
+    vol_free_min_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
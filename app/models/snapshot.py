@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 
-from sqlalchemy import DateTime, Integer, Float, ForeignKey, String
+from sqlalchemy import BigInteger, DateTime, Integer, Float, ForeignKey, String, UniqueConstraint
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -11,6 +11,8 @@ from app.models.base import Base
 
 class Snapshot(Base):
     __tablename__ = "snapshots"
+    # One row per agent sample; lets ingest treat retries as no-ops.
+    __table_args__ = (UniqueConstraint("endpoint_id", "timestamp_utc", name="uq_snapshots_endpoint_ts"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -23,14 +25,15 @@ class Snapshot(Base):
     cpu_utilization_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
     cpu_idle_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
 
-    mem_total_bytes: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    mem_used_bytes: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    mem_free_bytes: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    mem_total_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    mem_used_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    mem_free_bytes: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
     mem_used_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
 
     users_count: Mapped[int | None] = mapped_column(Integer, nullable=True)
 
-    raw_payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # Never needed on read paths; deferred so an entity load doesn't de-TOAST it.
+    raw_payload: Mapped[dict] = mapped_column(JSONB, nullable=False, deferred=True)
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
 
@@ -60,8 +63,8 @@ class DiskVolume(Base):
 
     mount: Mapped[str] = mapped_column(String(64), index=True, nullable=False)
     filesystem: Mapped[str | None] = mapped_column(String(32), nullable=True)
-    total_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
-    free_bytes: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    free_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
     free_pct: Mapped[float] = mapped_column(Float, nullable=False)
 
 
@@ -75,8 +78,8 @@ class NetworkInterface(Base):
     bytes_total_per_sec: Mapped[float] = mapped_column(Float, nullable=False)
     bits_total_per_sec: Mapped[float] = mapped_column(Float, nullable=False)
     utilization_pct: Mapped[float | None] = mapped_column(Float, nullable=True)
-    packets_in_errors: Mapped[int] = mapped_column(Integer, nullable=False)
-    packets_out_errors: Mapped[int] = mapped_column(Integer, nullable=False)
+    packets_in_errors: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    packets_out_errors: Mapped[int] = mapped_column(BigInteger, nullable=False)
 
 
 class LoggedInUser(Base):
@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from sqlalchemy import BigInteger, DateTime, Float, ForeignKey, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+class EndpointVolume(Base):
+    """Current state of each volume per endpoint, carried forward between snapshots.
+
+    Upserted whenever an agent reports its volumes; schema 1.1 agents can mark
+    volumes as unchanged and this row stays as-is. Readers that need "latest
+    volumes" (low-disk table and alerts) use this instead of the newest snapshot.
+    """
+
+    __tablename__ = "endpoint_volumes"
+    __table_args__ = (UniqueConstraint("endpoint_id", "mount", name="uq_endpoint_volumes_endpoint_mount"),)
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    endpoint_id: Mapped[int] = mapped_column(ForeignKey("endpoints.id", ondelete="CASCADE"), nullable=False)
+
+    mount: Mapped[str] = mapped_column(String(64), nullable=False)
+    filesystem: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    total_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    free_bytes: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    free_pct: Mapped[float] = mapped_column(Float, index=True, nullable=False)
+
+    # timestamp_utc of the snapshot that last reported this volume
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
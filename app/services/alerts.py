@@ -1,67 +1,43 @@
 from __future__ import annotations
 
 import json
+import time
 from datetime import datetime, timezone, timedelta
 
-import httpx
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
 from app.core.config import settings as app_settings
+from app.core.metrics import NOTIFY_SECONDS, NOTIFY_FAILURES, SCHEDULER_TICK_SECONDS
 from app.db.session import AsyncSessionLocal
 from app.models.endpoint import Endpoint
 from app.models.alert import AlertEvent, AlertType, AlertDedup
-from app.models.setting import Setting
-from app.models.snapshot import Snapshot, DiskVolume
-
-
-DEFAULTS = {
-    "alerts": {
-        "enabled": True,
-        "dedup_minutes": 15,
-        "low_disk_free_pct_threshold": 10.0,
-        "heartbeat_grace_multiplier": 3,
-        "heartbeat_min_grace_seconds": 120,
-        "notify": {
-            "email": {"enabled": False, "to": []},
-            "webhook": {"enabled": False, "url": None},
-            "discord": {"enabled": False, "webhook_url": None},
-        },
-    }
-}
-
-
-async def _get_settings(db: AsyncSession) -> dict:
-    q = await db.execute(select(Setting).where(Setting.key == "global"))
-    row = q.scalars().first()
-    merged = json.loads(json.dumps(DEFAULTS))
-    if row:
-        # shallow merge
-        merged.update(row.value or {})
-    return merged
+from app.models.volume import EndpointVolume
+from app.services.events import publish_safely
+from app.services.settings_store import GlobalConfig, get_global_config
 
 
 async def _should_fire(db: AsyncSession, key: str, dedup_minutes: int) -> bool:
-    q = await db.execute(select(AlertDedup).where(AlertDedup.key == key))
-    state = q.scalars().first()
+    # One atomic upsert, so concurrent workers can't both claim the same alert.
     now = datetime.now(timezone.utc)
-    if not state:
-        db.add(AlertDedup(key=key, last_fired_at=now, is_active=True))
-        await db.commit()
-        return True
+    stmt = pg_insert(AlertDedup).values(key=key, last_fired_at=now, is_active=True)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"last_fired_at": now, "is_active": True},
+        where=AlertDedup.last_fired_at <= now - timedelta(minutes=dedup_minutes),
+    ).returning(AlertDedup.key)
+    fired = (await db.scalar(stmt)) is not None
+    await db.commit()
+    return fired
 
-    if now - state.last_fired_at >= timedelta(minutes=dedup_minutes):
-        state.last_fired_at = now
-        await db.commit()
-        return True
-    return False
 
-
-async def _send_notifications(cfg: dict, subject: str, message: str) -> None:
-    notify = cfg["alerts"]["notify"]
+async def _send_notifications(cfg: GlobalConfig, subject: str, message: str) -> None:
+    notify = cfg.alerts.notify
 
     # Email
-    if notify.get("email", {}).get("enabled") and notify["email"].get("to"):
+    if notify.email.enabled and notify.email.to:
+        started = time.perf_counter()
         try:
             import smtplib
             from email.message import EmailMessage
@@ -69,7 +45,7 @@ async def _send_notifications(cfg: dict, subject: str, message: str) -> None:
             msg = EmailMessage()
             msg["Subject"] = subject
             msg["From"] = app_settings.smtp_from or app_settings.smtp_user or "metrics@localhost"
-            msg["To"] = ", ".join(notify["email"]["to"])
+            msg["To"] = ", ".join(notify.email.to)
             msg.set_content(message)
 
             host = app_settings.smtp_host
@@ -79,85 +55,89 @@ async def _send_notifications(cfg: dict, subject: str, message: str) -> None:
                     if app_settings.smtp_user and app_settings.smtp_password:
                         smtp.login(app_settings.smtp_user, app_settings.smtp_password)
                     smtp.send_message(msg)
+            NOTIFY_SECONDS.observe(time.perf_counter() - started, "email")
         except Exception:
             # Avoid crashing scheduler for bad mail config
-            pass
+            NOTIFY_FAILURES.inc(1, "email")
 
     # Generic webhook
-    if notify.get("webhook", {}).get("enabled") and notify["webhook"].get("url"):
+    if notify.webhook.enabled and notify.webhook.url:
+        started = time.perf_counter()
         try:
+            import httpx
+
             async with httpx.AsyncClient(timeout=10.0) as client:
-                await client.post(notify["webhook"]["url"], json={"subject": subject, "message": message})
+                await client.post(notify.webhook.url, json={"subject": subject, "message": message})
+            NOTIFY_SECONDS.observe(time.perf_counter() - started, "webhook")
         except Exception:
-            pass
+            NOTIFY_FAILURES.inc(1, "webhook")
 
     # Discord webhook
-    if notify.get("discord", {}).get("enabled") and notify["discord"].get("webhook_url"):
+    if notify.discord.enabled and notify.discord.webhook_url:
+        started = time.perf_counter()
         try:
+            import httpx
+
             async with httpx.AsyncClient(timeout=10.0) as client:
-                await client.post(notify["discord"]["webhook_url"], json={"content": f"**{subject}**\n{message}"})
+                await client.post(notify.discord.webhook_url, json={"content": f"**{subject}**\n{message}"})
+            NOTIFY_SECONDS.observe(time.perf_counter() - started, "discord")
         except Exception:
-            pass
+            NOTIFY_FAILURES.inc(1, "discord")
+
+
+async def fire_heartbeat_alert(db: AsyncSession, cfg: GlobalConfig, ep, grace: float) -> None:
+    """`ep` is any row/object with id, hostname, machine_id and last_seen."""
+    key = f"heartbeat:{ep.id}"
+    if not await _should_fire(db, key, cfg.alerts.dedup_minutes):
+        return
+    details = {"endpoint_id": ep.id, "hostname": ep.hostname, "machine_id": ep.machine_id, "last_seen": ep.last_seen.isoformat(), "grace_seconds": grace}
+    db.add(AlertEvent(alert_type=AlertType.heartbeat, endpoint_id=ep.id, details=details))
+    await db.commit()
+    await publish_safely({"type": "alert", "alert_type": AlertType.heartbeat.value, "endpoint_id": ep.id, "subject": f"Heartbeat missing: {ep.hostname}"})
+    await _send_notifications(cfg, f"Heartbeat missing: {ep.hostname}", json.dumps(details, indent=2))
 
 
 async def check_alerts_once() -> None:
+    with SCHEDULER_TICK_SECONDS.time():
+        await _check_alerts()
+
+
+async def _check_alerts() -> None:
     async with AsyncSessionLocal() as db:
-        cfg = await _get_settings(db)
-        if not cfg["alerts"].get("enabled", True):
+        cfg = await get_global_config(db)
+        if not cfg.alerts.enabled:
             return
 
-        dedup_minutes = int(cfg["alerts"].get("dedup_minutes", 15))
-
-        # 1) Heartbeats
-        grace_mult = int(cfg["alerts"].get("heartbeat_grace_multiplier", 3))
-        min_grace = int(cfg["alerts"].get("heartbeat_min_grace_seconds", 120))
-        now = datetime.now(timezone.utc)
-
-        q = await db.execute(select(Endpoint).where(Endpoint.is_active.is_(True)))
-        endpoints = q.scalars().all()
-        for ep in endpoints:
-            if not ep.last_seen or not ep.last_interval_seconds:
-                continue
-            grace = max(min_grace, grace_mult * int(ep.last_interval_seconds))
-            if (now - ep.last_seen) > timedelta(seconds=grace):
-                key = f"heartbeat:{ep.id}"
-                if await _should_fire(db, key, dedup_minutes):
-                    details = {"endpoint_id": ep.id, "hostname": ep.hostname, "machine_id": ep.machine_id, "last_seen": ep.last_seen.isoformat(), "grace_seconds": grace}
-                    db.add(AlertEvent(alert_type=AlertType.heartbeat, endpoint_id=ep.id, details=details))
-                    await db.commit()
-                    await _send_notifications(cfg, f"Heartbeat missing: {ep.hostname}", json.dumps(details, indent=2))
-
-        # 2) Low disk across all volumes/hosts (latest snapshot per endpoint)
-        threshold = float(cfg["alerts"].get("low_disk_free_pct_threshold", 10.0))
-
-        # Latest snapshot per endpoint via subquery
-        subq = select(Snapshot.endpoint_id, func.max(Snapshot.timestamp_utc).label("max_ts")).group_by(Snapshot.endpoint_id).subquery()
+        dedup_minutes = cfg.alerts.dedup_minutes
+
+        # Heartbeats are handled at their deadlines by app.services.heartbeats.
+
+        # Low disk across all volumes/hosts (current volume state per endpoint)
+        threshold = cfg.alerts.low_disk_free_pct_threshold
 
         q = await db.execute(
-            select(DiskVolume, Snapshot.endpoint_id)
-            .join(Snapshot, DiskVolume.snapshot_id == Snapshot.id)
-            .join(subq, and_(Snapshot.endpoint_id == subq.c.endpoint_id, Snapshot.timestamp_utc == subq.c.max_ts))
-            .where(DiskVolume.free_pct < threshold)
+            select(EndpointVolume.endpoint_id, Endpoint.hostname, Endpoint.machine_id, EndpointVolume.mount, EndpointVolume.free_pct, EndpointVolume.free_bytes, EndpointVolume.total_bytes)
+            .join(Endpoint, Endpoint.id == EndpointVolume.endpoint_id)
+            .where(EndpointVolume.free_pct < threshold)
         )
         rows = q.all()
         if rows:
             key = f"lowdisk:global:{int(threshold*10)}"
             if await _should_fire(db, key, dedup_minutes):
-                items = []
-                for vol, endpoint_id in rows:
-                    ep = next((e for e in endpoints if e.id == endpoint_id), None)
-                    items.append(
-                        {
-                            "endpoint_id": endpoint_id,
-                            "hostname": ep.hostname if ep else None,
-                            "machine_id": ep.machine_id if ep else None,
-                            "mount": vol.mount,
-                            "free_pct": vol.free_pct,
-                            "free_bytes": vol.free_bytes,
-                            "total_bytes": vol.total_bytes,
-                        }
-                    )
+                items = [
+                    {
+                        "endpoint_id": r.endpoint_id,
+                        "hostname": r.hostname,
+                        "machine_id": r.machine_id,
+                        "mount": r.mount,
+                        "free_pct": r.free_pct,
+                        "free_bytes": r.free_bytes,
+                        "total_bytes": r.total_bytes,
+                    }
+                    for r in rows
+                ]
                 details = {"threshold_free_pct": threshold, "volumes": items}
                 db.add(AlertEvent(alert_type=AlertType.low_disk, endpoint_id=None, details=details))
                 await db.commit()
+                await publish_safely({"type": "alert", "alert_type": AlertType.low_disk.value, "endpoint_id": None, "subject": "Low disk space detected"})
                 await _send_notifications(cfg, "Low disk space detected", json.dumps(details, indent=2))
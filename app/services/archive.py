@@ -0,0 +1,353 @@
+"""Cold storage: snapshot history past the hot window moves to Parquet files.
+
+Layout under ARCHIVE_DIR, one directory per archived UTC day:
+
+    day=2026-01-31/snapshots/endpoint=12.parquet
+    day=2026-01-31/disk_physical/endpoint=12.parquet
+    ...
+
+The archive job works oldest day first. For each day older than
+HOT_RETENTION_DAYS, every export dataset is streamed out of Postgres (every
+shard), ordered by endpoint, into one zstd Parquet file per endpoint, in a
+`.day=...tmp` staging directory. Ingest refuses the day as soon as that
+directory exists. Once all files are written and fsynced, the directory is
+renamed into place, which is the commit point. Only then are the day's
+snapshots deleted (child rows cascade), and only those the Parquet copy
+holds, matched by (endpoint_id, timestamp_utc): a snapshot that committed
+after the export read its shard stays in Postgres and is logged. A day
+that already exists is never rewritten. A crash before the rename leaves
+only the staging directory, which is discarded. A crash after the rename
+just means the delete is repeated on the next run.
+
+Archived days are contiguous from the oldest, so `archived_until()` (the end
+of the newest archived day) splits any time range into a Parquet part and
+a Postgres part. `host_history` and `iter_archived_batches` use it to serve
+old data transparently. Ingest refuses snapshots that fall before it.
+
+Requires pyarrow (in requirements.txt; imported lazily like Arrow/Parquet export).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import AsyncIterator
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import ARCHIVE_ROWS
+from app.db import shards
+from app.models.snapshot import Snapshot
+from app.services.export import DATASETS, DEFAULT_BATCH_SIZE, arrow_schema, build_query, iter_row_batches, query_columns, rows_to_record_batch
+
+logger = logging.getLogger(__name__)
+
+DAY_PREFIX = "day="
+DELETE_BATCH = 5000
+
+
+class ArchiveError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def _root() -> Path:
+    return Path(settings.archive_dir)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def _day_dir(day: date) -> Path:
+    return _root() / f"{DAY_PREFIX}{day.isoformat()}"
+
+
+def _staging_dir(day: date) -> Path:
+    return _root() / f".{DAY_PREFIX}{day.isoformat()}.tmp"
+
+
+def _endpoint_file(day: date, dataset: str, endpoint_id: int) -> Path:
+    return _day_dir(day) / dataset / f"endpoint={endpoint_id}.parquet"
+
+
+def archived_days() -> list[date]:
+    try:
+        names = os.listdir(_root())
+    except FileNotFoundError:
+        return []
+    days = []
+    for name in names:
+        if name.startswith(DAY_PREFIX):
+            try:
+                days.append(date.fromisoformat(name[len(DAY_PREFIX):]))
+            except ValueError:
+                continue
+    return sorted(days)
+
+
+def archived_until() -> datetime | None:
+    """Everything before this is in Parquet, nothing after it is; None if nothing is archived."""
+    days = archived_days()
+    return _day_start(days[-1] + timedelta(days=1)) if days else None
+
+
+def is_archived(ts: datetime) -> bool:
+    """True if `ts` falls on a day that is archived or being archived."""
+    # Cheap check first: only timestamps past the hot window can be archived.
+    if ts >= datetime.now(timezone.utc) - timedelta(days=settings.hot_retention_days):
+        return False
+    boundary = archived_until()
+    if boundary is not None and ts < boundary:
+        return True
+    return _staging_dir(ts.astimezone(timezone.utc).date()).exists()
+
+
+# -- writing -----------------------------------------------------------------
+
+
+def _fsync_dir(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class _EndpointFileWriter:
+    """One Parquet file per endpoint, for rows arriving ordered by endpoint."""
+
+    def __init__(self, directory: Path, schema):
+        self.dir = directory
+        self.schema = schema
+        self._writer = None
+        self._path: Path | None = None
+        self._endpoint_id: int | None = None
+
+    def write(self, endpoint_id: int, rows: list[tuple]) -> None:
+        import pyarrow.parquet as pq
+
+        if endpoint_id != self._endpoint_id:
+            self.close()
+            self.dir.mkdir(parents=True, exist_ok=True)
+            self._path = self.dir / f"endpoint={endpoint_id}.parquet"
+            self._writer = pq.ParquetWriter(self._path, self.schema, compression="zstd")
+            self._endpoint_id = endpoint_id
+        self._writer.write_batch(rows_to_record_batch(self.schema, rows))
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            with open(self._path, "rb") as f:
+                os.fsync(f.fileno())
+            self._writer, self._path, self._endpoint_id = None, None, None
+
+
+async def _write_dataset(db: AsyncSession, dataset: str, start: datetime, end: datetime, directory: Path) -> int:
+    schema = arrow_schema(query_columns(dataset))
+    out = _EndpointFileWriter(directory, schema)
+    written = 0
+    try:
+        async for rows in iter_row_batches(db, build_query(dataset, None, start, end), DEFAULT_BATCH_SIZE):
+            for endpoint_id, group in itertools.groupby(rows, key=lambda r: r[0]):
+                group = list(group)
+                await asyncio.to_thread(out.write, endpoint_id, group)
+                written += len(group)
+    finally:
+        await asyncio.to_thread(out.close)
+    return written
+
+
+def _archived_timestamps(day: date) -> dict[int, list[datetime]]:
+    """endpoint_id -> timestamp_utc of every snapshot in the day's Parquet copy. Blocking."""
+    import pyarrow.parquet as pq
+
+    out = {}
+    for path in (_day_dir(day) / "snapshots").glob("endpoint=*.parquet"):
+        endpoint_id = int(path.stem.split("=", 1)[1])
+        out[endpoint_id] = pq.read_table(path, columns=["timestamp_utc"]).column("timestamp_utc").to_pylist()
+    return out
+
+
+async def _delete_archived(db: AsyncSession, timestamps: dict[int, list[datetime]]) -> int:
+    # Batched so no single transaction holds a day's worth of row locks.
+    deleted = pending = 0
+    for endpoint_id, stamps in timestamps.items():
+        for i in range(0, len(stamps), DELETE_BATCH):
+            result = await db.execute(
+                delete(Snapshot)
+                .where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc.in_(stamps[i:i + DELETE_BATCH]))
+                .execution_options(synchronize_session=False)
+            )
+            deleted += result.rowcount or 0
+            pending += result.rowcount or 0
+            if pending >= DELETE_BATCH:
+                await db.commit()
+                pending = 0
+    await db.commit()
+    return deleted
+
+
+async def _hot_days_before(db: AsyncSession, end: datetime) -> set[date]:
+    day = func.date(func.timezone("UTC", Snapshot.timestamp_utc))
+    return set((await db.execute(select(day).where(Snapshot.timestamp_utc < end).distinct())).scalars())
+
+
+async def _drop_archived_day(day: date) -> None:
+    """Delete the day's snapshots that its Parquet copy holds, on every shard."""
+    timestamps = await asyncio.to_thread(_archived_timestamps, day)
+    start, end = _day_start(day), _day_start(day + timedelta(days=1))
+    for shard in shards.SHARDS:
+        async with shard.ui() as db:
+            await _delete_archived(db, {e: ts for e, ts in timestamps.items() if shards.shard_for(e) is shard})
+            left = await db.scalar(select(func.count()).select_from(Snapshot).where(Snapshot.timestamp_utc >= start, Snapshot.timestamp_utc < end))
+        if left:
+            # Committed after the export read this shard; there is no Parquet copy, so keep it.
+            logger.warning("%d snapshot(s) on %s arrived after the day was archived and were kept in Postgres (shard %d)", left, day.isoformat(), shard.index)
+
+
+async def archive_day(day: date) -> None:
+    final = _day_dir(day)
+    if final.exists():
+        return
+    staging = _staging_dir(day)
+    if staging.exists():
+        await asyncio.to_thread(shutil.rmtree, staging)
+    # From here on ingest refuses this day (see is_archived).
+    staging.mkdir(parents=True)
+    await asyncio.to_thread(_fsync_dir, _root())
+
+    start, end = _day_start(day), _day_start(day + timedelta(days=1))
+    for dataset in DATASETS:
+        for shard in shards.SHARDS:
+            async with shard.ui() as db:
+                n = await _write_dataset(db, dataset, start, end, staging / dataset)
+            ARCHIVE_ROWS.inc(n, dataset)
+
+    for sub in staging.iterdir():
+        await asyncio.to_thread(_fsync_dir, sub)
+    os.rename(staging, final)
+    await asyncio.to_thread(_fsync_dir, _root())
+    logger.info("archived %s", day.isoformat())
+
+
+async def _oldest_hot_snapshot() -> datetime | None:
+    found = []
+    for shard in shards.SHARDS:
+        async with shard.ui() as db:
+            ts = await db.scalar(select(func.min(Snapshot.timestamp_utc)))
+        if ts is not None:
+            found.append(ts)
+    return min(found) if found else None
+
+
+async def archive_once() -> int:
+    """Archive every complete day past the hot window, then drop it from Postgres. Returns days archived."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as e:
+        raise ArchiveError("ARCHIVE_ENABLED requires pyarrow to be installed") from e
+
+    _root().mkdir(parents=True, exist_ok=True)
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=settings.hot_retention_days)).date()
+
+    archived = 0
+    oldest = await _oldest_hot_snapshot()
+    boundary = archived_until()
+    day = oldest.astimezone(timezone.utc).date() if oldest else cutoff
+    if boundary is not None:
+        day = max(day, boundary.date())
+    while day < cutoff:
+        await archive_day(day)
+        archived += 1
+        day += timedelta(days=1)
+
+    # Drop what Parquet now covers (including leftovers of an interrupted delete).
+    boundary = archived_until()
+    if boundary is not None:
+        days: set[date] = set()
+        for shard in shards.SHARDS:
+            async with shard.ui() as db:
+                days |= await _hot_days_before(db, boundary)
+        for day in sorted(days):
+            await _drop_archived_day(day)
+    return archived
+
+
+# -- reading -----------------------------------------------------------------
+
+
+def _days_between(start: datetime, end: datetime) -> list[date]:
+    first, last = start.astimezone(timezone.utc).date(), (end - timedelta(microseconds=1)).astimezone(timezone.utc).date()
+    archived = set(archived_days())
+    return [first + timedelta(days=i) for i in range((last - first).days + 1) if first + timedelta(days=i) in archived]
+
+
+def _read_file(path: Path, columns: list[str], start: datetime, end: datetime) -> list[tuple]:
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(path, columns=columns, filters=[("timestamp_utc", ">=", start), ("timestamp_utc", "<", end)])
+    return list(zip(*(table.column(c).to_pylist() for c in columns)))
+
+
+def read_archived(dataset: str, endpoint_id: int, columns: list[str], start: datetime, end: datetime) -> list[tuple]:
+    """`columns` of one endpoint's archived rows in [start, end), in time order. Blocking."""
+    rows: list[tuple] = []
+    for day in _days_between(start, end):
+        path = _endpoint_file(day, dataset, endpoint_id)
+        if path.exists():
+            rows.extend(_read_file(path, columns, start, end))
+    return rows
+
+
+async def host_history(db: AsyncSession, endpoint_id: int, dataset: str, columns: tuple, start: datetime, end: datetime) -> list[tuple]:
+    """`columns` (ORM attributes of `dataset`, timestamp first) for one host, archive + hot rows."""
+    rows: list = []
+    boundary = archived_until()
+    if boundary is not None and start < boundary:
+        rows = await asyncio.to_thread(read_archived, dataset, endpoint_id, [c.key for c in columns], start, min(end, boundary))
+        start = max(start, boundary)
+    if start < end:
+        child = DATASETS[dataset][0]
+        stmt = select(*columns).select_from(Snapshot)
+        if child is not None:
+            stmt = stmt.join(child, child.snapshot_id == Snapshot.id)
+        stmt = stmt.where(Snapshot.endpoint_id == endpoint_id, Snapshot.timestamp_utc >= start, Snapshot.timestamp_utc < end).order_by(Snapshot.timestamp_utc.asc())
+        rows.extend((await db.execute(stmt)).all())
+    return rows
+
+
+async def iter_archived_batches(dataset: str, endpoint_ids: list[int] | None, start: datetime, end: datetime, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[list[tuple]]:
+    """Archived rows of `query_columns(dataset)` in [start, end), ordered by (endpoint_id, timestamp)."""
+    boundary = archived_until()
+    if boundary is None or start >= boundary:
+        return
+    end = min(end, boundary)
+    columns = [c.key for c in query_columns(dataset)]
+
+    def files_by_endpoint() -> dict[int, list[Path]]:
+        out: dict[int, list[Path]] = {}
+        wanted = set(endpoint_ids) if endpoint_ids else None
+        for day in _days_between(start, end):
+            directory = _day_dir(day) / dataset
+            if not directory.exists():
+                continue
+            for path in sorted(directory.glob("endpoint=*.parquet")):
+                endpoint_id = int(path.stem.split("=", 1)[1])
+                if wanted is None or endpoint_id in wanted:
+                    out.setdefault(endpoint_id, []).append(path)
+        return out
+
+    files = await asyncio.to_thread(files_by_endpoint)
+    for endpoint_id in sorted(files):
+        for path in files[endpoint_id]:
+            rows = await asyncio.to_thread(_read_file, path, columns, start, end)
+            for i in range(0, len(rows), batch_size):
+                yield rows[i:i + batch_size]
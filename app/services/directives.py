@@ -0,0 +1,145 @@
+"""Server-driven agent sampling: directives returned with each ingest response.
+
+The interval in an agent's config file is only where it starts. Every
+ingest response tells the agent when to report next:
+
+- a host with an alert raised in the last AGENT_ALERT_BOOST_MINUTES reports
+  at AGENT_INTERVAL_MIN_SECONDS;
+- a quiet host (CPU and memory low and steady) stretches to
+  AGENT_QUIET_MULTIPLIER x AGENT_INTERVAL_SECONDS;
+- while this worker is under pressure (ingest pool nearly exhausted, global
+  rate bucket nearly drained, or the DB down and snapshots being spooled)
+  every host is slowed down and told to drop optional sections.
+
+Intervals are always derived from AGENT_INTERVAL_SECONDS, never from what
+the agent last reported, so directives can't compound. Agents that ignore
+`directives` keep working as before.
+
+The longest wait a response allowed (interval + backoff) is stored on the
+endpoint, and missed-heartbeat grace is computed from the larger of that and
+the reported interval, so a host that was told to slow down is not reported
+missing for doing so.
+"""
+
+from __future__ import annotations
+
+import time
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import AGENT_DIRECTIVES
+from app.db.session import ingest_engine
+from app.models.endpoint import Endpoint
+from app.services.events import bus
+from app.services.ratelimit import limiter
+
+SECTIONS = ("cpu", "memory", "disk", "network", "users")
+# Dropped first under pressure (schema 1.1 agents can send `unchanged` instead).
+OPTIONAL_SECTIONS = ("users",)
+
+# endpoint id -> monotonic time until which it reports at the minimum interval
+_boosted: dict[int, float] = {}
+
+
+def _on_event(event: dict) -> None:
+    if event.get("type") == "alert" and event.get("endpoint_id") is not None:
+        _boosted[int(event["endpoint_id"])] = time.monotonic() + settings.agent_alert_boost_minutes * 60
+
+
+bus.add_handler(_on_event)
+
+
+def _is_boosted(endpoint_id: int) -> bool:
+    until = _boosted.get(endpoint_id)
+    if until is None:
+        return False
+    if until < time.monotonic():
+        del _boosted[endpoint_id]
+        return False
+    return True
+
+
+def _is_quiet(cpu: float | None, mem: float | None, prev_cpu: float | None, prev_mem: float | None) -> bool:
+    for cur, prev in ((cpu, prev_cpu), (mem, prev_mem)):
+        if cur is None or prev is None:
+            return False
+        if cur > settings.agent_quiet_pct or abs(cur - prev) > settings.agent_quiet_delta_pct:
+            return False
+    return True
+
+
+def under_pressure() -> bool:
+    pool = ingest_engine.pool
+    capacity = pool.size() + settings.ingest_db_max_overflow
+    if capacity and pool.checkedout() / capacity >= settings.agent_pressure_pool_ratio:
+        return True
+    return limiter.global_headroom() < 0.25
+
+
+def _clamp(interval: float) -> int:
+    low = max(settings.agent_interval_min_seconds, settings.ingest_min_interval_seconds)
+    return int(min(max(interval, low), settings.agent_interval_max_seconds))
+
+
+def directives_for(endpoint: Endpoint | None, prev_cpu: float | None = None, prev_mem: float | None = None, spooled: bool = False) -> dict | None:
+    """Directives for the agent that just reported; None when disabled.
+
+    `endpoint` carries the values just ingested; `prev_cpu`/`prev_mem` are
+    the ones it had before. `endpoint` is None when the DB was unreachable.
+    """
+    if not settings.agent_directives_enabled:
+        return None
+
+    base = settings.agent_interval_seconds
+    if spooled:
+        reason, interval = "db_unavailable", settings.agent_interval_max_seconds
+    elif endpoint is not None and _is_boosted(endpoint.id):
+        reason, interval = "alert", settings.agent_interval_min_seconds
+    elif endpoint is not None and _is_quiet(endpoint.last_cpu_pct, endpoint.last_mem_pct, prev_cpu, prev_mem):
+        reason, interval = "quiet", base * settings.agent_quiet_multiplier
+    else:
+        reason, interval = "normal", base
+
+    pressure = spooled or under_pressure()
+    if pressure and reason != "db_unavailable":
+        reason, interval = "pressure", interval * 2
+    return _directives(reason, interval, pressure, backoff=settings.agent_interval_seconds if spooled else 0)
+
+
+def spooled_wait_seconds() -> int | None:
+    """The wait `directives_for(None, spooled=True)` hands out, for snapshots replayed from the spool."""
+    if not settings.agent_directives_enabled:
+        return None
+    return _clamp(settings.agent_interval_max_seconds) + settings.agent_interval_seconds
+
+
+def directed_wait_seconds(directives: dict | None) -> int | None:
+    return directives["interval_seconds"] + directives["backoff_seconds"] if directives else None
+
+
+async def record_directed_interval(db: AsyncSession, endpoint: Endpoint, seconds: int | None) -> None:
+    """Remember how long the agent may now wait; only writes when it changed."""
+    if endpoint.directed_interval_seconds != seconds:
+        endpoint.directed_interval_seconds = seconds
+        await db.commit()
+
+
+def alert_directives() -> dict | None:
+    """Directives pushed to a streaming agent as soon as its host raises an alert."""
+    if not settings.agent_directives_enabled:
+        return None
+    if under_pressure():
+        return _directives("pressure", settings.agent_interval_min_seconds * 2, True)
+    return _directives("alert", settings.agent_interval_min_seconds, False)
+
+
+def _directives(reason: str, interval: float, pressure: bool, backoff: int = 0) -> dict:
+    AGENT_DIRECTIVES.inc(1, reason)
+    return {
+        "interval_seconds": _clamp(interval),
+        "enable": {s: not (pressure and s in OPTIONAL_SECTIONS) for s in SECTIONS},
+        # Extra delay before the next report (on top of the interval).
+        "backoff_seconds": backoff,
+        "reason": reason,
+    }
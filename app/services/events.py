@@ -0,0 +1,119 @@
+"""In-process pub/sub for live UI updates.
+
+`ingest_snapshot` and the alert checker publish small JSON events; SSE
+streams subscribe and fan them out to browsers, so open dashboards update
+without re-running their queries.
+
+With EVENT_BUS_BACKEND=postgres, events are sent through NOTIFY on a
+single channel and every worker/replica LISTENs on it, so a browser
+connected to any process sees every ingest. The default "memory" backend
+only reaches subscribers in the same process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+from app.db.session import ingest_engine
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "metrics_events"
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class EventBus:
+    def __init__(self) -> None:
+        self._subscribers: set[asyncio.Queue] = set()
+        self._handlers: list = []
+        self._listener_task: asyncio.Task | None = None
+
+    @property
+    def uses_postgres(self) -> bool:
+        return settings.event_bus_backend == "postgres"
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        self._subscribers.discard(q)
+
+    def add_handler(self, fn) -> None:
+        """Register a synchronous `fn(event)` called for every delivered event."""
+        self._handlers.append(fn)
+
+    def publish_local(self, event: dict) -> None:
+        for fn in self._handlers:
+            try:
+                fn(event)
+            except Exception:
+                logger.exception("event handler failed")
+        for q in self._subscribers:
+            if q.full():
+                # Slow consumer: drop its oldest event rather than block publishers.
+                q.get_nowait()
+            q.put_nowait(event)
+
+    async def publish(self, event: dict) -> None:
+        if not self.uses_postgres:
+            self.publish_local(event)
+            return
+
+        # Delivered back to this process by the listener, like every other one.
+        async with ingest_engine.connect() as conn:
+            await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": CHANNEL, "payload": json.dumps(event, default=str)})
+            await conn.commit()
+
+    async def start(self) -> None:
+        if self.uses_postgres and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            self._listener_task = None
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            self.publish_local(json.loads(payload))
+        except ValueError:
+            logger.warning("dropping malformed event payload on %s", channel)
+
+    async def _listen_forever(self) -> None:
+        import asyncpg
+
+        dsn = make_url(settings.database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                await conn.add_listener(CHANNEL, self._on_notify)
+                while not conn.is_closed():
+                    await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("event bus listener failed; reconnecting")
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(2)
+
+
+bus = EventBus()
+
+
+async def publish_safely(event: dict) -> None:
+    """Publish without letting a bus failure affect the caller (ingest, alerts)."""
+    try:
+        await bus.publish(event)
+    except Exception:
+        logger.exception("failed to publish %s event", event.get("type"))
@@ -0,0 +1,252 @@
+"""Streaming export of snapshot data (CSV, Arrow IPC stream, Parquet).
+
+Rows are pulled through a server-side cursor in fixed-size batches and
+encoded batch by batch, so memory stays bounded by `batch_size` no matter
+how large the export is. Arrow and Parquet need `pyarrow` (optional).
+
+Snapshot queries don't join `endpoints` (which may live in another database
+than a snapshot shard); hostnames are looked up once and filled in per row.
+With shards, they are exported one after another, so rows are ordered by
+(endpoint_id, timestamp) within each shard and every host's rows stay together.
+Days already moved to cold storage (app.services.archive) come first, read
+from Parquet in the same (endpoint_id, timestamp) order.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import select, DateTime, Float, String, Integer, BigInteger
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import shards
+from app.db.session import read_sessionmaker
+from app.models.endpoint import Endpoint
+from app.models.snapshot import Snapshot, DiskPhysical, DiskVolume, NetworkInterface, LoggedInUser
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+DEFAULT_BATCH_SIZE = 5000
+
+_BASE_COLUMNS = (Snapshot.endpoint_id, Endpoint.hostname, Snapshot.timestamp_utc)
+
+# dataset -> (child table or None, columns after the base columns)
+DATASETS = {
+    "snapshots": (None, (
+        Snapshot.interval_seconds, Snapshot.cpu_utilization_pct, Snapshot.cpu_idle_pct,
+        Snapshot.mem_total_bytes, Snapshot.mem_used_bytes, Snapshot.mem_free_bytes, Snapshot.mem_used_pct, Snapshot.users_count,
+    )),
+    "disk_physical": (DiskPhysical, (
+        DiskPhysical.instance, DiskPhysical.reads_per_sec, DiskPhysical.writes_per_sec, DiskPhysical.avg_queue_length,
+        DiskPhysical.read_latency_ms, DiskPhysical.write_latency_ms, DiskPhysical.utilization_pct,
+    )),
+    "disk_volumes": (DiskVolume, (
+        DiskVolume.mount, DiskVolume.filesystem, DiskVolume.total_bytes, DiskVolume.free_bytes, DiskVolume.free_pct,
+    )),
+    "network_interfaces": (NetworkInterface, (
+        NetworkInterface.name, NetworkInterface.bytes_total_per_sec, NetworkInterface.bits_total_per_sec, NetworkInterface.utilization_pct,
+        NetworkInterface.packets_in_errors, NetworkInterface.packets_out_errors,
+    )),
+    "logged_in_users": (LoggedInUser, (
+        LoggedInUser.username, LoggedInUser.session_type,
+    )),
+}
+
+
+class ExportError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def check_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise ExportError(f"unknown format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    if fmt in ("arrow", "parquet"):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError as e:
+            raise ExportError(f"format '{fmt}' requires pyarrow to be installed") from e
+
+
+def dataset_columns(dataset: str) -> tuple:
+    if dataset not in DATASETS:
+        raise ExportError(f"unknown dataset '{dataset}' (expected one of {', '.join(DATASETS)})")
+    return _BASE_COLUMNS + DATASETS[dataset][1]
+
+
+def query_columns(dataset: str) -> tuple:
+    """`dataset_columns(dataset)` minus `hostname`: what `build_query` selects (and the archive stores)."""
+    dataset_columns(dataset)
+    return (Snapshot.endpoint_id, Snapshot.timestamp_utc) + DATASETS[dataset][1]
+
+
+def build_query(dataset: str, endpoint_ids: list[int] | None, start: datetime, end: datetime):
+    """Rows of `query_columns(dataset)`; hostnames are added by `with_hostnames`."""
+    child = DATASETS[dataset][0]
+
+    stmt = select(*query_columns(dataset)).select_from(Snapshot)
+    if child is not None:
+        stmt = stmt.join(child, child.snapshot_id == Snapshot.id)
+    stmt = stmt.where(Snapshot.timestamp_utc >= start, Snapshot.timestamp_utc < end)
+    if endpoint_ids:
+        stmt = stmt.where(Snapshot.endpoint_id.in_(endpoint_ids))
+    return stmt.order_by(Snapshot.endpoint_id, Snapshot.timestamp_utc)
+
+
+async def iter_row_batches(db: AsyncSession, stmt, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[list[tuple]]:
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for batch in result.partitions(batch_size):
+        yield [tuple(r) for r in batch]
+
+
+async def hostnames(db: AsyncSession, endpoint_ids: list[int] | None) -> dict[int, str]:
+    stmt = select(Endpoint.id, Endpoint.hostname)
+    if endpoint_ids:
+        stmt = stmt.where(Endpoint.id.in_(endpoint_ids))
+    return dict((await db.execute(stmt)).all())
+
+
+async def with_hostnames(batches: AsyncIterator[list[tuple]], names: dict[int, str]) -> AsyncIterator[list[tuple]]:
+    """(endpoint_id, ts, ...) rows -> (endpoint_id, hostname, ts, ...), skipping unknown endpoints."""
+    async for rows in batches:
+        yield [(r[0], names[r[0]], *r[1:]) for r in rows if r[0] in names]
+
+
+def _column_names(columns) -> list[str]:
+    return [c.key for c in columns]
+
+
+def arrow_schema(columns):
+    import pyarrow as pa
+
+    fields = []
+    for c in columns:
+        t = c.type
+        if isinstance(t, DateTime):
+            at = pa.timestamp("us", tz="UTC")
+        elif isinstance(t, Float):
+            at = pa.float64()
+        elif isinstance(t, (Integer, BigInteger)):
+            at = pa.int64()
+        elif isinstance(t, String):
+            at = pa.string()
+        else:
+            raise ExportError(f"no Arrow type for column {c.key}")
+        fields.append(pa.field(c.key, at))
+    return pa.schema(fields)
+
+
+def rows_to_record_batch(schema, rows: list[tuple]):
+    import pyarrow as pa
+
+    cols = list(zip(*rows)) if rows else [[] for _ in schema]
+    return pa.RecordBatch.from_arrays([pa.array(col, type=f.type) for col, f in zip(cols, schema)], schema=schema)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that buffers bytes until drained."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+async def encode(fmt: str, columns, batches: AsyncIterator[list[tuple]]) -> AsyncIterator[bytes]:
+    """Encode row batches as `fmt`, yielding output chunks as they are produced."""
+    if fmt == "csv":
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(_column_names(columns))
+        async for rows in batches:
+            w.writerows(rows)
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue().encode("utf-8")
+        return
+
+    check_format(fmt)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    sink = _ChunkSink()
+    out = pa.PythonFile(sink, mode="w")
+    if fmt == "arrow":
+        writer = pa.ipc.new_stream(out, schema)
+    else:
+        writer = pq.ParquetWriter(out, schema, compression="zstd")
+    try:
+        async for rows in batches:
+            writer.write_batch(rows_to_record_batch(schema, rows))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+async def stream_export(
+    dataset: str,
+    fmt: str,
+    endpoint_ids: list[int] | None,
+    start: datetime,
+    end: datetime,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> AsyncIterator[bytes]:
+    """Encoded export bytes. Uses its own (replica if usable) session so it can outlive a request's dependencies."""
+    from app.services.archive import archived_until, iter_archived_batches
+
+    check_format(fmt)
+    columns = dataset_columns(dataset)
+    boundary = archived_until()
+    stmt = build_query(dataset, endpoint_ids, max(start, boundary) if boundary else start, end)
+    async with (await read_sessionmaker())() as db:
+        names = await hostnames(db, endpoint_ids)
+
+        async def batches() -> AsyncIterator[list[tuple]]:
+            # Archived days first (read from Parquet), then the hot range from Postgres.
+            async for rows in iter_archived_batches(dataset, endpoint_ids, start, end, batch_size):
+                yield rows
+            if not shards.is_sharded():
+                async for rows in iter_row_batches(db, stmt, batch_size):
+                    yield rows
+                return
+            ids = endpoint_ids or list(names)
+            for shard in shards.SHARDS:
+                if not any(shards.shard_for(i) is shard for i in ids):
+                    continue
+                async with shard.ui() as sdb:
+                    async for rows in iter_row_batches(sdb, stmt, batch_size):
+                        yield rows
+
+        async for chunk in encode(fmt, columns, with_hostnames(batches(), names)):
+            yield chunk
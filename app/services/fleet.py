@@ -0,0 +1,232 @@
+"""Fleet-wide aggregates over a time range, computed in Postgres.
+
+Every query runs under `SET LOCAL statement_timeout` so a request either
+answers within the configured latency budget or fails fast with
+`FleetQueryTimeout`, instead of tying up a connection.
+
+With snapshot shards, each query runs on every shard concurrently and the
+partial results are merged here. Host counts and top-k are exact because
+an endpoint lives on exactly one shard. Percentiles are merged from each
+shard's QUANTILE_GRID, so they are approximate (within one grid step).
+"""
+
+from __future__ import annotations
+
+import bisect
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, func, text, distinct
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db import shards
+from app.models.endpoint import Endpoint
+from app.models.snapshot import Snapshot, DiskPhysical, NetworkInterface
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MAX_BUCKETS = 500
+PERCENTILES = (0.5, 0.95, 0.99)
+# Per-shard summary used to merge percentiles across shards
+QUANTILE_GRID = tuple(i / 100 for i in range(101))
+
+# metric name -> snapshot column
+SNAPSHOT_METRICS = {
+    "cpu": Snapshot.cpu_utilization_pct,
+    "mem": Snapshot.mem_used_pct,
+}
+
+TOP_K_METRICS = ("disk_latency", "nic_errors")
+
+
+class FleetQueryError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+class FleetQueryTimeout(FleetQueryError):
+    pass
+
+
+def pick_bucket_seconds(start: datetime, end: datetime, bucket_seconds: int | None) -> int:
+    span = max(int((end - start).total_seconds()), 1)
+    if bucket_seconds is None:
+        # ~120 points per chart, at least one minute per bucket.
+        bucket_seconds = max(60, span // 120)
+    if span // bucket_seconds > MAX_BUCKETS:
+        raise FleetQueryError(f"too many buckets; use bucket_seconds >= {span // MAX_BUCKETS + 1}")
+    return bucket_seconds
+
+
+def _bucket(bucket_seconds: int):
+    return func.date_bin(timedelta(seconds=bucket_seconds), Snapshot.timestamp_utc, EPOCH)
+
+
+def _snapshot_metric(metric: str):
+    if metric not in SNAPSHOT_METRICS:
+        raise FleetQueryError(f"unknown metric '{metric}' (expected one of {', '.join(SNAPSHOT_METRICS)})")
+    return SNAPSHOT_METRICS[metric]
+
+
+async def _execute(db: AsyncSession, stmt):
+    timeout_ms = int(settings.fleet_query_timeout_ms)
+    try:
+        await db.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+        return (await db.execute(stmt)).all()
+    except DBAPIError as e:
+        await db.rollback()
+        # 57014 = query_canceled
+        if getattr(e.orig, "sqlstate", None) == "57014" or "statement timeout" in str(e.orig):
+            raise FleetQueryTimeout(f"query exceeded the {timeout_ms} ms budget; narrow the range or host set") from e
+        raise
+    finally:
+        if db.in_transaction():
+            await db.commit()
+
+
+async def _gather(db: AsyncSession, stmt) -> list[list]:
+    """`stmt`'s rows from every shard, one list per shard."""
+    return await shards.scatter(db, lambda session: _execute(session, stmt))
+
+
+def _cdf(values: list[float], x: float) -> float:
+    # Fraction of a shard's sample <= x, interpolating between grid points.
+    if x < values[0]:
+        return 0.0
+    if x >= values[-1]:
+        return 1.0
+    j = bisect.bisect_right(values, x)
+    lo, hi = values[j - 1], values[j]
+    frac = (x - lo) / (hi - lo) if hi > lo else 1.0
+    return QUANTILE_GRID[j - 1] + frac * (QUANTILE_GRID[j] - QUANTILE_GRID[j - 1])
+
+
+def merge_quantiles(parts: list[tuple[int, list[float]]], probs: tuple[float, ...]) -> list[float | None]:
+    """Quantiles of the union of samples, each given as (count, values at QUANTILE_GRID)."""
+    parts = [(n, v) for n, v in parts if n and v]
+    if not parts:
+        return [None for _ in probs]
+    total = sum(n for n, _ in parts)
+    xs = sorted({x for _, v in parts for x in v})
+
+    def cdf(x: float) -> float:
+        return sum(n * _cdf(v, x) for n, v in parts) / total
+
+    out = []
+    for p in probs:
+        lo, hi = 0, len(xs) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cdf(xs[mid]) >= p:
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo == 0:
+            out.append(xs[0])
+            continue
+        f_lo, f_hi = cdf(xs[lo - 1]), cdf(xs[lo])
+        frac = (p - f_lo) / (f_hi - f_lo) if f_hi > f_lo else 1.0
+        out.append(xs[lo - 1] + frac * (xs[lo] - xs[lo - 1]))
+    return out
+
+
+async def percentiles(db: AsyncSession, metric: str, start: datetime, end: datetime, bucket_seconds: int | None = None) -> dict:
+    col = _snapshot_metric(metric)
+    bucket_seconds = pick_bucket_seconds(start, end, bucket_seconds)
+    bucket = _bucket(bucket_seconds).label("bucket")
+
+    grid = QUANTILE_GRID if shards.is_sharded() else PERCENTILES
+    stmt = (
+        select(
+            bucket,
+            func.percentile_cont(array(grid)).within_group(col).label("pcts"),
+            func.count(col).label("samples"),
+            func.count(distinct(Snapshot.endpoint_id)).label("hosts"),
+        )
+        .where(Snapshot.timestamp_utc >= start, Snapshot.timestamp_utc < end, col.is_not(None))
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    parts = await _gather(db, stmt)
+    if len(parts) == 1:
+        buckets = [(r.bucket, r.hosts, r.pcts or [None] * len(PERCENTILES)) for r in parts[0]]
+    else:
+        by_bucket: dict[datetime, list] = {}
+        for rows in parts:
+            for r in rows:
+                by_bucket.setdefault(r.bucket, []).append(r)
+        buckets = [
+            (b, sum(r.hosts for r in rs), merge_quantiles([(r.samples, r.pcts) for r in rs], PERCENTILES))
+            for b, rs in sorted(by_bucket.items())
+        ]
+    return {
+        "metric": metric,
+        "bucket_seconds": bucket_seconds,
+        "labels": [b.isoformat() for b, _, _ in buckets],
+        "hosts": [hosts for _, hosts, _ in buckets],
+        "series": [
+            {"name": f"p{int(p * 100)}", "data": [pcts[i] for _, _, pcts in buckets]}
+            for i, p in enumerate(PERCENTILES)
+        ],
+    }
+
+
+async def over_threshold(db: AsyncSession, metric: str, threshold: float, start: datetime, end: datetime, bucket_seconds: int | None = None) -> dict:
+    col = _snapshot_metric(metric)
+    bucket_seconds = pick_bucket_seconds(start, end, bucket_seconds)
+    bucket = _bucket(bucket_seconds).label("bucket")
+
+    stmt = (
+        select(bucket, func.count(distinct(Snapshot.endpoint_id)).label("hosts"))
+        .where(Snapshot.timestamp_utc >= start, Snapshot.timestamp_utc < end, col > threshold)
+        .group_by(bucket)
+        .order_by(bucket)
+    )
+    hosts: dict[datetime, int] = {}
+    for rows in await _gather(db, stmt):
+        for r in rows:
+            hosts[r.bucket] = hosts.get(r.bucket, 0) + r.hosts
+    labels = sorted(hosts)
+    return {
+        "metric": metric,
+        "threshold": threshold,
+        "bucket_seconds": bucket_seconds,
+        "labels": [b.isoformat() for b in labels],
+        "series": [{"name": f"hosts with {metric} > {threshold}", "data": [hosts[b] for b in labels]}],
+    }
+
+
+def merge_top_k(parts: list[list], k: int) -> list:
+    """Top `k` of per-shard top-k rows (each with `.value`), highest first."""
+    rows = [r for part in parts for r in part]
+    # Postgres sorts NULLs first in DESC order; keep that.
+    return sorted(rows, key=lambda r: (r.value is None, r.value or 0), reverse=True)[:k]
+
+
+async def top_k(db: AsyncSession, metric: str, start: datetime, end: datetime, k: int = 10) -> dict:
+    if metric == "disk_latency":
+        value = func.avg((DiskPhysical.read_latency_ms + DiskPhysical.write_latency_ms) / 2.0)
+        child = DiskPhysical
+    elif metric == "nic_errors":
+        value = func.sum(NetworkInterface.packets_in_errors + NetworkInterface.packets_out_errors)
+        child = NetworkInterface
+    else:
+        raise FleetQueryError(f"unknown metric '{metric}' (expected one of {', '.join(TOP_K_METRICS)})")
+
+    # Each shard's top k, then the top k of those; hostnames come from the main DB.
+    stmt = (
+        select(Snapshot.endpoint_id, value.label("value"))
+        .join(child, child.snapshot_id == Snapshot.id)
+        .where(Snapshot.timestamp_utc >= start, Snapshot.timestamp_utc < end)
+        .group_by(Snapshot.endpoint_id)
+        .order_by(value.desc())
+        .limit(k)
+    )
+    rows = merge_top_k(await _gather(db, stmt), k)
+    names = dict((await db.execute(select(Endpoint.id, Endpoint.hostname).where(Endpoint.id.in_([r.endpoint_id for r in rows])))).all()) if rows else {}
+    return {
+        "metric": metric,
+        "k": k,
+        "hosts": [{"endpoint_id": r.endpoint_id, "hostname": names.get(r.endpoint_id), "value": float(r.value) if r.value is not None else None} for r in rows if r.endpoint_id in names],
+    }
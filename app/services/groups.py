@@ -0,0 +1,159 @@
+"""Endpoint groups (tags) and their incrementally maintained rollups.
+
+Every ingest upserts one `group_rollups` row per group the endpoint belongs
+to, so group charts read at most one row per bucket instead of aggregating
+raw snapshots for every member host on each request.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, delete, func, literal, Float, Integer, DateTime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.endpoint import Endpoint
+from app.models.group import EndpointGroup, EndpointGroupMember, GroupRollup
+
+ROLLUP_BUCKET_SECONDS = 60
+
+_TAG_RE = re.compile(r"^[a-z0-9][a-z0-9_.:-]{0,63}$")
+
+
+class GroupError(Exception):
+    def __init__(self, message: str):
+        super().__init__(message)
+
+
+def parse_tags(text: str) -> list[str]:
+    """'SQL-Servers, site-a' -> ['site-a', 'sql-servers']"""
+    tags = set()
+    for raw in re.split(r"[,\s]+", text or ""):
+        tag = raw.strip().lower()
+        if not tag:
+            continue
+        if not _TAG_RE.match(tag):
+            raise GroupError(f"invalid group name '{raw}' (letters, digits, _ . : - only; max 64)")
+        tags.add(tag)
+    return sorted(tags)
+
+
+def bucket_start(ts: datetime) -> datetime:
+    epoch = int(ts.timestamp())
+    return datetime.fromtimestamp(epoch - epoch % ROLLUP_BUCKET_SECONDS, timezone.utc)
+
+
+def member_filter(group_id: int):
+    """WHERE clause restricting an Endpoint query to one group."""
+    return Endpoint.id.in_(select(EndpointGroupMember.endpoint_id).where(EndpointGroupMember.group_id == group_id))
+
+
+async def list_groups(db: AsyncSession) -> list[EndpointGroup]:
+    return list((await db.execute(select(EndpointGroup).order_by(EndpointGroup.name.asc()))).scalars().all())
+
+
+async def get_group_by_name(db: AsyncSession, name: str) -> EndpointGroup | None:
+    return (await db.execute(select(EndpointGroup).where(EndpointGroup.name == name.lower()))).scalars().first()
+
+
+async def group_names_by_endpoint(db: AsyncSession, endpoint_ids: list[int]) -> dict[int, list[str]]:
+    if not endpoint_ids:
+        return {}
+    rows = await db.execute(
+        select(EndpointGroupMember.endpoint_id, EndpointGroup.name)
+        .join(EndpointGroup, EndpointGroup.id == EndpointGroupMember.group_id)
+        .where(EndpointGroupMember.endpoint_id.in_(endpoint_ids))
+        .order_by(EndpointGroup.name.asc())
+    )
+    out: dict[int, list[str]] = {}
+    for endpoint_id, name in rows:
+        out.setdefault(endpoint_id, []).append(name)
+    return out
+
+
+async def set_endpoint_groups(db: AsyncSession, endpoint_id: int, names: list[str]) -> None:
+    """Replace an endpoint's group memberships, creating groups as needed. Caller commits."""
+    group_ids: list[int] = []
+    if names:
+        await db.execute(pg_insert(EndpointGroup).values([{"name": n, "created_at": datetime.now(timezone.utc)} for n in names]).on_conflict_do_nothing(index_elements=["name"]))
+        group_ids = list((await db.execute(select(EndpointGroup.id).where(EndpointGroup.name.in_(names)))).scalars().all())
+
+    await db.execute(delete(EndpointGroupMember).where(EndpointGroupMember.endpoint_id == endpoint_id, EndpointGroupMember.group_id.not_in(group_ids)))
+    if group_ids:
+        await db.execute(
+            pg_insert(EndpointGroupMember).values([{"group_id": gid, "endpoint_id": endpoint_id} for gid in group_ids]).on_conflict_do_nothing()
+        )
+
+
+async def record_group_rollups(
+    db: AsyncSession,
+    endpoint_id: int,
+    ts: datetime,
+    interval_seconds: int,
+    cpu_pct: float | None,
+    nic_bps: float,
+    vol_free_min_pct: float | None,
+) -> None:
+    """Fold one snapshot into the current bucket of every group the endpoint is in.
+
+    A single INSERT ... SELECT over the endpoint's memberships, so ungrouped
+    endpoints pay one indexed lookup and no extra round trip. Rows are
+    touched in group_id order to keep concurrent ingests from deadlocking.
+    """
+    values = select(
+        EndpointGroupMember.group_id,
+        literal(bucket_start(ts), DateTime(timezone=True)),
+        literal(1, Integer),
+        literal(0 if cpu_pct is None else 1, Integer),
+        literal(cpu_pct or 0.0, Float),
+        literal(cpu_pct, Float),
+        literal(nic_bps * interval_seconds, Float),
+        literal(vol_free_min_pct, Float),
+    ).where(EndpointGroupMember.endpoint_id == endpoint_id).order_by(EndpointGroupMember.group_id)
+
+    stmt = pg_insert(GroupRollup).from_select(
+        ["group_id", "bucket_start", "samples", "cpu_samples", "cpu_sum", "cpu_max", "nic_bits", "vol_free_min_pct"],
+        values,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["group_id", "bucket_start"],
+        set_={
+            "samples": GroupRollup.samples + stmt.excluded.samples,
+            "cpu_samples": GroupRollup.cpu_samples + stmt.excluded.cpu_samples,
+            "cpu_sum": GroupRollup.cpu_sum + stmt.excluded.cpu_sum,
+            # greatest/least ignore NULLs
+            "cpu_max": func.greatest(GroupRollup.cpu_max, stmt.excluded.cpu_max),
+            "nic_bits": GroupRollup.nic_bits + stmt.excluded.nic_bits,
+            "vol_free_min_pct": func.least(GroupRollup.vol_free_min_pct, stmt.excluded.vol_free_min_pct),
+        },
+    )
+    await db.execute(stmt)
+
+
+GROUP_METRICS = ("cpu", "nic_bps", "vol_free")
+
+
+async def group_timeseries(db: AsyncSession, group_id: int, metric: str, since_hours: int = 24) -> dict:
+    if metric not in GROUP_METRICS:
+        raise GroupError(f"unknown metric '{metric}' (expected one of {', '.join(GROUP_METRICS)})")
+
+    since = bucket_start(datetime.now(timezone.utc) - timedelta(hours=since_hours))
+    rows = (await db.execute(
+        select(GroupRollup.bucket_start, GroupRollup.cpu_samples, GroupRollup.cpu_sum, GroupRollup.cpu_max, GroupRollup.nic_bits, GroupRollup.vol_free_min_pct)
+        .where(GroupRollup.group_id == group_id, GroupRollup.bucket_start >= since)
+        .order_by(GroupRollup.bucket_start.asc())
+    )).all()
+
+    labels = [r.bucket_start.isoformat() for r in rows]
+    if metric == "cpu":
+        series = [
+            {"name": "Avg CPU %", "data": [r.cpu_sum / r.cpu_samples if r.cpu_samples else None for r in rows]},
+            {"name": "Max CPU %", "data": [r.cpu_max for r in rows]},
+        ]
+    elif metric == "nic_bps":
+        series = [{"name": "Total NIC bps", "data": [r.nic_bits / ROLLUP_BUCKET_SECONDS for r in rows]}]
+    else:
+        series = [{"name": "Min volume free %", "data": [r.vol_free_min_pct for r in rows]}]
+    return {"labels": labels, "series": series}
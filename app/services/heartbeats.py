@@ -0,0 +1,198 @@
+"""Deadline-ordered missed-heartbeat detection.
+
+Each tracked endpoint has a deadline `last_seen + grace`, kept in a min-heap.
+Snapshot events from the bus push a new deadline (O(log n)); the tracker
+sleeps until the earliest one and only then looks at that endpoint, so a
+missed heartbeat is detected at its deadline rather than on the next
+scheduler tick, and no tick scans the whole fleet.
+
+The interval is the larger of what the agent reported and what its last
+directives allowed (`directed_interval_seconds`), so a host told to slow
+down isn't alerted on for obeying.
+
+Superseded heap entries are skipped lazily: an entry is live only if its
+deadline still matches `_due[endpoint_id]`. Before alerting, the endpoint is
+re-read from the DB, so a worker that missed some events (e.g. the in-memory
+bus with several workers) only pays a re-check, never a false alert.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.core.metrics import HEARTBEAT_TRACKED
+from app.db.session import AsyncSessionLocal
+from app.models.endpoint import Endpoint
+from app.services.alerts import fire_heartbeat_alert
+from app.services.events import bus
+from app.services.settings_store import get_global_config
+
+logger = logging.getLogger(__name__)
+
+# How often grace settings are re-read even if no deadline is due.
+CONFIG_REFRESH_SECONDS = 60
+
+
+def _effective_interval(reported: int, directed: int | None) -> int:
+    return max(int(reported), int(directed or 0))
+
+
+class HeartbeatTracker:
+    def __init__(self) -> None:
+        self._heap: list[tuple[float, int]] = []
+        self._due: dict[int, float] = {}
+        # endpoint id -> (last_seen epoch seconds, interval seconds)
+        self._seen: dict[int, tuple[float, int]] = {}
+        self._grace: tuple[float, int] = (3.0, 120)
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _grace_for(self, interval_seconds: int) -> float:
+        mult, min_grace = self._grace
+        return max(min_grace, mult * interval_seconds)
+
+    def _schedule(self, endpoint_id: int, deadline: float) -> None:
+        self._due[endpoint_id] = deadline
+        if not self._heap or deadline < self._heap[0][0]:
+            self._wake.set()
+        heapq.heappush(self._heap, (deadline, endpoint_id))
+        if len(self._heap) > 4 * len(self._due) + 1024:
+            self._heap = [(d, eid) for eid, d in self._due.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> list[int]:
+        """Endpoints whose live deadline is <= now, earliest first; superseded entries are dropped."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, endpoint_id = heapq.heappop(self._heap)
+            if self._due.get(endpoint_id) == deadline:
+                del self._due[endpoint_id]
+                due.append(endpoint_id)
+        return due
+
+    def forget(self, endpoint_id: int) -> None:
+        self._due.pop(endpoint_id, None)
+        self._seen.pop(endpoint_id, None)
+
+    def touch(self, endpoint_id: int, last_seen: float, interval_seconds: int) -> None:
+        prev = self._seen.get(endpoint_id)
+        if prev and prev[0] > last_seen:
+            return
+        self._seen[endpoint_id] = (last_seen, interval_seconds)
+        self._schedule(endpoint_id, last_seen + self._grace_for(interval_seconds))
+
+    def on_event(self, event: dict) -> None:
+        if event.get("type") != "snapshot" or not event.get("interval_seconds"):
+            return
+        last_seen = datetime.fromisoformat(event["last_seen"]).timestamp()
+        self.touch(int(event["endpoint_id"]), last_seen, _effective_interval(event["interval_seconds"], event.get("directed_interval_seconds")))
+
+    def _set_grace(self, mult: float, min_grace: int) -> None:
+        if (mult, min_grace) == self._grace:
+            return
+        self._grace = (mult, min_grace)
+        self._due = {eid: ls + self._grace_for(iv) for eid, (ls, iv) in self._seen.items()}
+        self._heap = [(d, eid) for eid, d in self._due.items()]
+        heapq.heapify(self._heap)
+
+    async def _rebuild(self) -> None:
+        async with AsyncSessionLocal() as db:
+            cfg = await get_global_config(db)
+            rows = (await db.execute(
+                select(Endpoint.id, Endpoint.last_seen, Endpoint.last_interval_seconds, Endpoint.directed_interval_seconds)
+                .where(Endpoint.is_active.is_(True), Endpoint.last_seen.is_not(None), Endpoint.last_interval_seconds.is_not(None))
+            )).all()
+        self._grace = (cfg.alerts.heartbeat_grace_multiplier, cfg.alerts.heartbeat_min_grace_seconds)
+        self._seen = {r.id: (r.last_seen.timestamp(), _effective_interval(r.last_interval_seconds, r.directed_interval_seconds)) for r in rows}
+        self._due = {eid: ls + self._grace_for(iv) for eid, (ls, iv) in self._seen.items()}
+        self._heap = [(d, eid) for eid, d in self._due.items()]
+        heapq.heapify(self._heap)
+
+    async def _check(self, endpoint_id: int) -> None:
+        async with AsyncSessionLocal() as db:
+            cfg = await get_global_config(db)
+            row = (await db.execute(
+                select(Endpoint.id, Endpoint.hostname, Endpoint.machine_id, Endpoint.last_seen, Endpoint.last_interval_seconds, Endpoint.directed_interval_seconds, Endpoint.is_active)
+                .where(Endpoint.id == endpoint_id)
+            )).first()
+            if row is None or not row.is_active or not row.last_seen or not row.last_interval_seconds:
+                self.forget(endpoint_id)
+                return
+
+            last_seen = row.last_seen.timestamp()
+            interval = _effective_interval(row.last_interval_seconds, row.directed_interval_seconds)
+            grace = self._grace_for(interval)
+            if last_seen + grace > time.time():
+                # Fresher than we knew (ingested by another worker).
+                self.touch(endpoint_id, last_seen, interval)
+                return
+
+            if cfg.alerts.enabled:
+                await fire_heartbeat_alert(db, cfg, row, grace)
+        # Still down: look again once the dedup window has passed.
+        self._schedule(endpoint_id, time.time() + cfg.alerts.dedup_minutes * 60)
+
+    async def _load(self) -> None:
+        # The DB may not be up yet (startup no longer waits for it): retry
+        # rather than let the task die and leave this worker without detection.
+        delay = 1.0
+        while True:
+            try:
+                await self._rebuild()
+                return
+            except Exception:
+                logger.warning("heartbeat tracker could not load endpoints, retrying in %.0fs", delay, exc_info=delay == 1.0)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, CONFIG_REFRESH_SECONDS)
+
+    async def _run(self) -> None:
+        await self._load()
+        next_refresh = time.monotonic() + CONFIG_REFRESH_SECONDS
+        while True:
+            for endpoint_id in self._pop_due(time.time()):
+                try:
+                    await self._check(endpoint_id)
+                except Exception:
+                    logger.exception("heartbeat check failed for endpoint %s", endpoint_id)
+                    self._schedule(endpoint_id, time.time() + CONFIG_REFRESH_SECONDS)
+
+            if time.monotonic() >= next_refresh:
+                next_refresh = time.monotonic() + CONFIG_REFRESH_SECONDS
+                try:
+                    async with AsyncSessionLocal() as db:
+                        cfg = await get_global_config(db)
+                    self._set_grace(cfg.alerts.heartbeat_grace_multiplier, cfg.alerts.heartbeat_min_grace_seconds)
+                except Exception:
+                    logger.exception("failed to refresh heartbeat settings")
+
+            timeout = CONFIG_REFRESH_SECONDS
+            if self._heap:
+                timeout = min(timeout, max(self._heap[0][0] - time.time(), 0.0))
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        if self._task is None:
+            bus.add_handler(self.on_event)
+            HEARTBEAT_TRACKED.set_function(self.__len__)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+tracker = HeartbeatTracker()
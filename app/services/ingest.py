@@ -1,112 +1,327 @@
 from __future__ import annotations
 
-from datetime import datetime
+import hashlib
+import time
+from datetime import datetime, timezone
 from dateutil import parser as dtparser
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, update, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 
+from app.core.metrics import INGEST_STAGE_SECONDS, INGEST_DUPLICATES, CACHE_REQUESTS
+from app.core.security import verify_token_async
+from app.db import shards
 from app.models.endpoint import Endpoint
+from app.models.sighting import EndpointUserSighting
 from app.models.snapshot import Snapshot, DiskPhysical, DiskVolume, NetworkInterface, LoggedInUser
-from app.services.validation import validate_snapshot
+from app.models.volume import EndpointVolume
+from app.services.archive import is_archived
+from app.services.events import publish_safely
+from app.services.groups import record_group_rollups
+from app.services.validation import ValidationError, validate_snapshot
+
+
+# sha256(token) -> (endpoint id, token_hash it verified against). Lets repeat
+# requests skip PBKDF2 entirely; rotating a token changes token_hash, which
+# invalidates the entry. Only successfully verified tokens are stored.
+_TOKEN_CACHE: dict[bytes, tuple[int, str]] = {}
+
+
+def cached_endpoint_id(token: str) -> int | None:
+    """Endpoint id for a token this process already verified, without touching the DB."""
+    cached = _TOKEN_CACHE.get(hashlib.sha256(token.encode("utf-8")).digest())
+    return cached[0] if cached else None
 
 
 async def get_endpoint_by_token(db: AsyncSession, token: str) -> Endpoint | None:
-    # Token hashes are bcrypt; need to scan active endpoints and verify.
+    key = hashlib.sha256(token.encode("utf-8")).digest()
+    cached = _TOKEN_CACHE.get(key)
+    if cached:
+        ep = await db.get(Endpoint, cached[0])
+        if ep is not None and ep.is_active and ep.token_hash == cached[1]:
+            CACHE_REQUESTS.inc(1, "token", "hit")
+            return ep
+        _TOKEN_CACHE.pop(key, None)
+    CACHE_REQUESTS.inc(1, "token", "miss")
+
+    # Token hashes are salted PBKDF2; need to scan active endpoints and verify.
     # Given modest fleet sizes, this is ok; later we can add a separate HMAC key index.
-    q = await db.execute(select(Endpoint).where(Endpoint.is_active.is_(True)))
-    endpoints = q.scalars().all()
-    from app.core.security import verify_token
+    # Only (id, hash) pairs are fetched; the matching endpoint is loaded by primary key.
+    candidates = (await db.execute(select(Endpoint.id, Endpoint.token_hash).where(Endpoint.is_active.is_(True)))).all()
 
-    for ep in endpoints:
-        if verify_token(token, ep.token_hash):
-            return ep
+    for endpoint_id, token_hash in candidates:
+        if await verify_token_async(token, token_hash):
+            _TOKEN_CACHE[key] = (endpoint_id, token_hash)
+            return await db.get(Endpoint, endpoint_id)
     return None
 
 
-async def ingest_snapshot(db: AsyncSession, endpoint: Endpoint, payload: dict) -> int:
-    validate_snapshot(payload)
+async def _record_user_sightings(db: AsyncSession, endpoint_id: int, usernames: set[str], ts: datetime) -> None:
+    # Keeps global_search's username index to one row per (username, endpoint).
+    if not usernames:
+        return
+    stmt = pg_insert(EndpointUserSighting).values(
+        [{"username": name, "endpoint_id": endpoint_id, "first_seen": ts, "last_seen": ts} for name in sorted(usernames)]
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_endpoint_user_sightings_username_endpoint",
+        set_={
+            "first_seen": func.least(EndpointUserSighting.first_seen, stmt.excluded.first_seen),
+            "last_seen": func.greatest(EndpointUserSighting.last_seen, stmt.excluded.last_seen),
+        },
+    )
+    await db.execute(stmt)
+
+
+async def _sync_endpoint_volumes(db: AsyncSession, endpoint_id: int, volumes: list[dict], ts: datetime) -> None:
+    # Current-state rows; an older (replayed) report never overwrites a newer one.
+    if volumes:
+        stmt = pg_insert(EndpointVolume).values([
+            {
+                "endpoint_id": endpoint_id,
+                "mount": v["mount"],
+                "filesystem": v.get("filesystem"),
+                "total_bytes": int(v["total_bytes"]),
+                "free_bytes": int(v["free_bytes"]),
+                "free_pct": float(v["free_pct"]),
+                "updated_at": ts,
+            }
+            for v in {v["mount"]: v for v in volumes}.values()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_endpoint_volumes_endpoint_mount",
+            set_={c: stmt.excluded[c] for c in ("filesystem", "total_bytes", "free_bytes", "free_pct", "updated_at")},
+            where=EndpointVolume.updated_at <= stmt.excluded.updated_at,
+        )
+        await db.execute(stmt)
+    # Volumes missing from this report are gone (unmounted/removed).
+    await db.execute(
+        delete(EndpointVolume).where(EndpointVolume.endpoint_id == endpoint_id, EndpointVolume.updated_at < ts, EndpointVolume.mount.not_in([v["mount"] for v in volumes]))
+    )
+
+
+async def _carried_volumes(db: AsyncSession, endpoint_id: int) -> list[dict]:
+    # The endpoint's current volumes, as the report that marked them unchanged would have sent them.
+    rows = await db.execute(
+        select(EndpointVolume.mount, EndpointVolume.filesystem, EndpointVolume.total_bytes, EndpointVolume.free_bytes, EndpointVolume.free_pct)
+        .where(EndpointVolume.endpoint_id == endpoint_id)
+        .order_by(EndpointVolume.mount)
+    )
+    return [dict(r._mapping) for r in rows]
+
+
+async def _carry_forward_users(db: AsyncSession, endpoint_id: int, ts: datetime) -> None:
+    # Users present in the last report all share the endpoint's newest last_seen.
+    newest = select(func.max(EndpointUserSighting.last_seen)).where(EndpointUserSighting.endpoint_id == endpoint_id).scalar_subquery()
+    await db.execute(
+        update(EndpointUserSighting)
+        .where(EndpointUserSighting.endpoint_id == endpoint_id, EndpointUserSighting.last_seen == newest, EndpointUserSighting.last_seen < ts)
+        .values(last_seen=ts)
+    )
+
+
+async def ingest_snapshot(db: AsyncSession, endpoint: Endpoint, payload: dict) -> tuple[int, bool]:
+    """Store one snapshot. Returns (snapshot_id, created).
+
+    Snapshots are unique per (endpoint, timestamp_utc): a retried upload is a
+    no-op that returns the id of the row stored the first time, with created=False.
+    With snapshot shards the id comes from the endpoint's shard, so it is only
+    unique together with the endpoint id.
+    """
+    snap_id, created, _ = await _store_snapshot(db, endpoint, payload, None)
+    return snap_id, created
+
+
+async def replay_snapshot(db: AsyncSession, endpoint: Endpoint, payload: dict, received_at: datetime) -> bool:
+    """Store a snapshot that was spooled at `received_at`. Returns True if it is now the endpoint's newest.
+
+    Replayed segments arrive in no particular order and after newer live
+    reports, so the endpoint's last_seen/last_* only move forward when this is
+    the newest stored snapshot, last_seen is when the report was received
+    rather than now, and no live "snapshot" event is published.
+    """
+    _, created, latest = await _store_snapshot(db, endpoint, payload, received_at)
+    return created and latest
+
+
+async def _newest_timestamp(sdb: AsyncSession, endpoint_id: int) -> datetime | None:
+    return await sdb.scalar(select(func.max(Snapshot.timestamp_utc)).where(Snapshot.endpoint_id == endpoint_id))
+
 
+def _advance_endpoint(endpoint: Endpoint, payload: dict, seen_at: datetime, interval_seconds: int, cpu_pct, mem_pct) -> None:
+    # Never moves last_seen backwards (a replayed report can be older than a live one).
+    if endpoint.last_seen is None or seen_at > endpoint.last_seen:
+        endpoint.last_seen = seen_at
+    endpoint.last_interval_seconds = interval_seconds
+    endpoint.last_cpu_pct = cpu_pct
+    endpoint.last_mem_pct = mem_pct
+    endpoint.hostname = payload["host"]["hostname"]
+    endpoint.machine_id = payload["host"]["machine_id"]
+
+
+async def _store_snapshot(db: AsyncSession, endpoint: Endpoint, payload: dict, received_at: datetime | None) -> tuple[int, bool, bool]:
+    """(snapshot_id, created, latest); `received_at` is set for spool replay."""
+    with INGEST_STAGE_SECONDS.time("validate"):
+        validate_snapshot(payload)
+
+    insert_started = time.perf_counter()
     ts = dtparser.isoparse(payload["timestamp_utc"])
     interval_seconds = int(payload["interval_seconds"])
+    if is_archived(ts):
+        # That day is (being) moved to Parquet; a late row would be invisible there.
+        raise ValidationError("timestamp_utc falls on a day already moved to cold storage")
 
     cpu = payload.get("cpu")
     mem = payload.get("memory")
     users = payload.get("users")
 
-    snap = Snapshot(
-        endpoint_id=endpoint.id,
-        schema_version=str(payload.get("schema_version")),
-        timestamp_utc=ts,
-        interval_seconds=interval_seconds,
-        cpu_utilization_pct=cpu.get("utilization_pct") if cpu else None,
-        cpu_idle_pct=cpu.get("idle_pct") if cpu else None,
-        mem_total_bytes=mem.get("total_bytes") if mem else None,
-        mem_used_bytes=mem.get("used_bytes") if mem else None,
-        mem_free_bytes=mem.get("free_bytes") if mem else None,
-        mem_used_pct=mem.get("used_pct") if mem else None,
-        users_count=users.get("count") if users else None,
-        raw_payload=payload,
-    )
+    # Schema 1.1: sections the agent marked unchanged since its last report.
+    unchanged = set(payload.get("unchanged") or ())
+    if "users" in unchanged:
+        if endpoint.last_users_count is None:
+            raise ValidationError("'users' marked unchanged but no previous users report is stored; send the full section")
+        users_count = endpoint.last_users_count
+    else:
+        users_count = users.get("count") if users else None
 
-    db.add(snap)
-    await db.flush()  # assigns snap.id
-
-    disk = payload.get("disk") or {}
-    for p in disk.get("physical", []) or []:
-        db.add(
-            DiskPhysical(
-                snapshot_id=snap.id,
-                instance=p["instance"],
-                reads_per_sec=float(p["reads_per_sec"]),
-                writes_per_sec=float(p["writes_per_sec"]),
-                avg_queue_length=float(p["avg_queue_length"]),
-                read_latency_ms=float(p["read_latency_ms"]),
-                write_latency_ms=float(p["write_latency_ms"]),
-                utilization_pct=float(p["utilization_pct"]),
+    cpu_pct = cpu.get("utilization_pct") if cpu else None
+    mem_pct = mem.get("used_pct") if mem else None
+
+    # Snapshot rows go to the endpoint's shard (the same session when unsharded).
+    # The shard commits first: if the main DB then fails, the agent's retry is
+    # acknowledged as a duplicate and only this sample's rollup is lost, rather
+    # than being counted twice.
+    async with shards.writer(endpoint.id, db) as sdb:
+        snap_id = await sdb.scalar(
+            pg_insert(Snapshot)
+            .values(
+                endpoint_id=endpoint.id,
+                schema_version=str(payload.get("schema_version")),
+                timestamp_utc=ts,
+                interval_seconds=interval_seconds,
+                cpu_utilization_pct=cpu_pct,
+                cpu_idle_pct=cpu.get("idle_pct") if cpu else None,
+                mem_total_bytes=mem.get("total_bytes") if mem else None,
+                mem_used_bytes=mem.get("used_bytes") if mem else None,
+                mem_free_bytes=mem.get("free_bytes") if mem else None,
+                mem_used_pct=mem_pct,
+                users_count=users_count,
+                raw_payload=payload,
+                created_at=datetime.now(timezone.utc),
             )
+            .on_conflict_do_nothing(constraint="uq_snapshots_endpoint_ts")
+            .returning(Snapshot.id)
         )
+        if snap_id is None:
+            # Agent retry of a snapshot we already have: nothing else to write.
+            INGEST_DUPLICATES.inc()
+            snap_id = await sdb.scalar(select(Snapshot.id).where(Snapshot.endpoint_id == endpoint.id, Snapshot.timestamp_utc == ts))
+            await db.commit()
+            INGEST_STAGE_SECONDS.observe(time.perf_counter() - insert_started, "insert")
+            return snap_id, False, False
 
-    for v in disk.get("volumes", []) or []:
-        db.add(
-            DiskVolume(
-                snapshot_id=snap.id,
-                mount=v["mount"],
-                filesystem=v.get("filesystem"),
-                total_bytes=int(v["total_bytes"]),
-                free_bytes=int(v["free_bytes"]),
-                free_pct=float(v["free_pct"]),
+        disk = payload.get("disk") or {}
+        for p in disk.get("physical", []) or []:
+            sdb.add(
+                DiskPhysical(
+                    snapshot_id=snap_id,
+                    instance=p["instance"],
+                    reads_per_sec=float(p["reads_per_sec"]),
+                    writes_per_sec=float(p["writes_per_sec"]),
+                    avg_queue_length=float(p["avg_queue_length"]),
+                    read_latency_ms=float(p["read_latency_ms"]),
+                    write_latency_ms=float(p["write_latency_ms"]),
+                    utilization_pct=float(p["utilization_pct"]),
+                )
             )
-        )
 
-    net = payload.get("network") or {}
-    for iface in net.get("interfaces", []) or []:
-        db.add(
-            NetworkInterface(
-                snapshot_id=snap.id,
-                name=iface["name"],
-                bytes_total_per_sec=float(iface["bytes_total_per_sec"]),
-                bits_total_per_sec=float(iface["bits_total_per_sec"]),
-                utilization_pct=iface.get("utilization_pct"),
-                packets_in_errors=int(iface["packets_in_errors"]),
-                packets_out_errors=int(iface["packets_out_errors"]),
+        vol_free_min = None
+        volumes = reported_volumes = disk.get("volumes")
+        if volumes is None and "volumes" in unchanged:
+            # Store the carried-forward state as this snapshot's rows too, so
+            # per-volume history and exports stay dense for delta agents.
+            volumes = await _carried_volumes(db, endpoint.id)
+        for v in volumes or []:
+            free_pct = float(v["free_pct"])
+            vol_free_min = free_pct if vol_free_min is None else min(vol_free_min, free_pct)
+            sdb.add(
+                DiskVolume(
+                    snapshot_id=snap_id,
+                    mount=v["mount"],
+                    filesystem=v.get("filesystem"),
+                    total_bytes=int(v["total_bytes"]),
+                    free_bytes=int(v["free_bytes"]),
+                    free_pct=free_pct,
+                )
             )
-        )
 
-    if users:
-        for u in users.get("logged_in", []) or []:
-            db.add(
+        net = payload.get("network") or {}
+        nic_bps = 0.0
+        for iface in net.get("interfaces", []) or []:
+            nic_bps += float(iface["bits_total_per_sec"])
+            sdb.add(
+                NetworkInterface(
+                    snapshot_id=snap_id,
+                    name=iface["name"],
+                    bytes_total_per_sec=float(iface["bytes_total_per_sec"]),
+                    bits_total_per_sec=float(iface["bits_total_per_sec"]),
+                    utilization_pct=iface.get("utilization_pct"),
+                    packets_in_errors=int(iface["packets_in_errors"]),
+                    packets_out_errors=int(iface["packets_out_errors"]),
+                )
+            )
+
+        logged_in = (users.get("logged_in", []) or []) if users else []
+        for u in logged_in:
+            sdb.add(
                 LoggedInUser(
-                    snapshot_id=snap.id,
+                    snapshot_id=snap_id,
                     username=u["username"],
                     session_type=u.get("session_type"),
                 )
             )
 
-    endpoint.last_seen = datetime.now(ts.tzinfo)
-    endpoint.last_interval_seconds = interval_seconds
-    endpoint.hostname = payload["host"]["hostname"]
-    endpoint.machine_id = payload["host"]["machine_id"]
+        # Live reports are the newest by definition; a replayed one may not be.
+        latest = received_at is None or await _newest_timestamp(sdb, endpoint.id) == ts
+
+        if sdb is not db:
+            with INGEST_STAGE_SECONDS.time("shard_commit"):
+                await sdb.commit()
+
+    if reported_volumes is not None:
+        await _sync_endpoint_volumes(db, endpoint.id, reported_volumes, ts)
+
+    if users:
+        await _record_user_sightings(db, endpoint.id, {u["username"] for u in logged_in}, ts)
+        if latest:
+            endpoint.last_users_count = users_count
+    elif "users" in unchanged and users_count:
+        await _carry_forward_users(db, endpoint.id, ts)
+
+    await record_group_rollups(db, endpoint.id, ts, interval_seconds, cpu_pct, nic_bps, vol_free_min)
+
+    if latest:
+        _advance_endpoint(endpoint, payload, received_at or datetime.now(ts.tzinfo), interval_seconds, cpu_pct, mem_pct)
+
+    INGEST_STAGE_SECONDS.observe(time.perf_counter() - insert_started, "insert")
+
+    with INGEST_STAGE_SECONDS.time("commit"):
+        await db.commit()
+
+    if received_at is not None:
+        return snap_id, True, latest
 
-    await db.commit()
-    return snap.id
+    await publish_safely({
+        "type": "snapshot",
+        "endpoint_id": endpoint.id,
+        "hostname": endpoint.hostname,
+        "snapshot_id": snap_id,
+        "ts": ts.isoformat(),
+        "last_seen": endpoint.last_seen.isoformat(),
+        "interval_seconds": interval_seconds,
+        "directed_interval_seconds": endpoint.directed_interval_seconds,
+        "cpu": cpu_pct,
+        "mem": mem_pct,
+    })
+    return snap_id, True, True
@@ -0,0 +1,78 @@
+"""Token-bucket admission control for ingest.
+
+Buckets live in process memory, so limits apply per worker: with N workers
+the effective global rate is N x INGEST_GLOBAL_RATE_PER_SEC. Per-endpoint
+buckets refill at a multiple of the endpoint's declared interval, with a
+floor so an agent configured for `interval_seconds: 1` can't flood us.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+
+from app.core.config import settings
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Consume one token. Returns 0 on success, else seconds until one is available."""
+        self._refill()
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+
+def retry_after_header(wait_seconds: float) -> dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(wait_seconds)))}
+
+
+class IngestLimiter:
+    def __init__(self) -> None:
+        self._global: TokenBucket | None = None
+        self._endpoints: dict[int, TokenBucket] = {}
+
+    def check_global(self) -> float:
+        rate = settings.ingest_global_rate_per_sec
+        if not settings.ingest_rate_limit_enabled or rate <= 0:
+            return 0.0
+        if self._global is None or self._global.rate != rate:
+            self._global = TokenBucket(rate, max(settings.ingest_global_burst, 1))
+        return self._global.take()
+
+    def global_headroom(self) -> float:
+        """Fraction of the global burst currently available (1.0 when unlimited)."""
+        if self._global is None or not settings.ingest_rate_limit_enabled:
+            return 1.0
+        self._global._refill()
+        return self._global.tokens / self._global.burst
+
+    def check_endpoint(self, endpoint_id: int, interval_seconds: int | None) -> float:
+        if not settings.ingest_rate_limit_enabled:
+            return 0.0
+        interval = max(interval_seconds or settings.ingest_min_interval_seconds, settings.ingest_min_interval_seconds)
+        rate = settings.ingest_endpoint_rate_multiplier / interval
+        bucket = self._endpoints.get(endpoint_id)
+        if bucket is None:
+            bucket = self._endpoints[endpoint_id] = TokenBucket(rate, max(settings.ingest_endpoint_burst, 1))
+        elif bucket.rate != rate:
+            # Agent changed its interval; keep the current fill level.
+            bucket.rate = rate
+        return bucket.take()
+
+
+limiter = IngestLimiter()
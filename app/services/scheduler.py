@@ -1,11 +1,40 @@
 from __future__ import annotations
 
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlalchemy import text
 
 from app.core.config import settings
+from app.db.session import engine
 from app.services.alerts import check_alerts_once
+from app.services.archive import archive_once
 
-SCHEDULER: AsyncIOScheduler | None = None
+SCHEDULER = None
+
+# Arbitrary, app-wide keys for pg_try_advisory_lock.
+ALERTS_LOCK_KEY = 72_410_001
+ARCHIVE_LOCK_KEY = 72_410_002
+
+
+async def run_locked(key: int, job) -> None:
+    # Every worker process runs a scheduler; only the one holding the advisory
+    # lock does the tick, so jobs don't run (and alerts aren't sent) once per worker.
+    async with engine.connect() as conn:
+        got = await conn.scalar(text("SELECT pg_try_advisory_lock(:k)"), {"k": key})
+        await conn.commit()
+        if not got:
+            return
+        try:
+            await job()
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
+            await conn.commit()
+
+
+async def _run_alerts() -> None:
+    await run_locked(ALERTS_LOCK_KEY, check_alerts_once)
+
+
+async def _run_archive() -> None:
+    await run_locked(ARCHIVE_LOCK_KEY, archive_once)
 
 
 def start_scheduler(app) -> None:
@@ -16,7 +45,12 @@ def start_scheduler(app) -> None:
     if SCHEDULER:
         return
 
+    # Imported here: workers with SCHEDULER_ENABLED=false never load APScheduler.
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(check_alerts_once, "interval", seconds=settings.scheduler_interval_seconds, id="alerts")
+    scheduler.add_job(_run_alerts, "interval", seconds=settings.scheduler_interval_seconds, id="alerts")
+    if settings.archive_enabled:
+        scheduler.add_job(_run_archive, "interval", minutes=settings.archive_interval_minutes, id="archive")
     scheduler.start()
     SCHEDULER = scheduler
@@ -0,0 +1,143 @@
+"""Typed, cached global settings (the "global" row of the settings table).
+
+Hot paths (dashboard, alert ticks) call `get_global_config`, which serves a
+validated `GlobalConfig` from memory. The row carries a version counter that
+`save_global_config` bumps; other processes pick the change up from the
+event bus (immediately with EVENT_BUS_BACKEND=postgres) or, failing that,
+by re-reading the version at most every GLOBAL_SETTINGS_POLL_SECONDS.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import CACHE_REQUESTS
+from app.models.setting import Setting
+from app.services.events import bus, publish_safely
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_KEY = "global"
+
+
+class EmailNotify(BaseModel):
+    enabled: bool = False
+    to: list[str] = Field(default_factory=list)
+
+
+class WebhookNotify(BaseModel):
+    enabled: bool = False
+    url: str | None = None
+
+
+class DiscordNotify(BaseModel):
+    enabled: bool = False
+    webhook_url: str | None = None
+
+
+class NotifyConfig(BaseModel):
+    email: EmailNotify = Field(default_factory=EmailNotify)
+    webhook: WebhookNotify = Field(default_factory=WebhookNotify)
+    discord: DiscordNotify = Field(default_factory=DiscordNotify)
+
+
+class AlertsConfig(BaseModel):
+    enabled: bool = True
+    dedup_minutes: int = Field(15, ge=0)
+    low_disk_free_pct_threshold: float = Field(10.0, ge=0, le=100)
+    heartbeat_grace_multiplier: int = Field(3, ge=1)
+    heartbeat_min_grace_seconds: int = Field(120, ge=0)
+    notify: NotifyConfig = Field(default_factory=NotifyConfig)
+
+
+class GlobalConfig(BaseModel):
+    # Unknown top-level sections are kept so admins can stage settings early.
+    model_config = ConfigDict(extra="allow", frozen=True)
+
+    alerts: AlertsConfig = Field(default_factory=AlertsConfig)
+
+
+class _Cache:
+    config: GlobalConfig | None = None
+    version: int = -1
+    checked_at: float = 0.0
+    stale: bool = True
+
+
+_cache = _Cache()
+
+
+def _on_event(event: dict) -> None:
+    if event.get("type") == "settings" and event.get("version") != _cache.version:
+        _cache.stale = True
+
+
+bus.add_handler(_on_event)
+
+
+async def _load(db: AsyncSession) -> None:
+    row = (await db.execute(select(Setting).where(Setting.key == GLOBAL_KEY))).scalars().first()
+    try:
+        _cache.config = GlobalConfig.model_validate(row.value or {}) if row else GlobalConfig()
+    except ValidationError:
+        # A row saved before validation existed (or edited by hand) must not
+        # break every dashboard render and alert tick: run on defaults until
+        # an admin saves valid settings.
+        logger.exception("stored global settings (version %s) are invalid; using defaults", row.version)
+        _cache.config = GlobalConfig()
+    _cache.version = row.version if row else 0
+    _cache.stale = False
+
+
+async def get_global_config(db: AsyncSession) -> GlobalConfig:
+    now = time.monotonic()
+    poll = settings.global_settings_poll_seconds
+    if _cache.config is not None and not _cache.stale and (poll <= 0 or now - _cache.checked_at < poll):
+        CACHE_REQUESTS.inc(1, "settings", "hit")
+        return _cache.config
+
+    if _cache.config is not None and not _cache.stale:
+        # Cheap check before reloading the whole document.
+        version = (await db.execute(select(Setting.version).where(Setting.key == GLOBAL_KEY))).scalar()
+        _cache.checked_at = now
+        if (version or 0) == _cache.version:
+            CACHE_REQUESTS.inc(1, "settings", "hit")
+            return _cache.config
+
+    CACHE_REQUESTS.inc(1, "settings", "miss")
+    await _load(db)
+    _cache.checked_at = now
+    return _cache.config
+
+
+async def get_raw_global_settings(db: AsyncSession) -> dict:
+    """The stored JSON document as entered by the admin (for the settings editor)."""
+    row = (await db.execute(select(Setting).where(Setting.key == GLOBAL_KEY))).scalars().first()
+    return row.value if row else {}
+
+
+async def save_global_config(db: AsyncSession, value: dict) -> GlobalConfig:
+    """Validate and store `value`; raises pydantic.ValidationError if invalid."""
+    config = GlobalConfig.model_validate(value)
+
+    row = (await db.execute(select(Setting).where(Setting.key == GLOBAL_KEY).with_for_update())).scalars().first()
+    if not row:
+        row = Setting(key=GLOBAL_KEY, value=value, version=1)
+        db.add(row)
+    else:
+        row.value = value
+        row.version = (row.version or 0) + 1
+    await db.commit()
+
+    _cache.config = config
+    _cache.version = row.version
+    _cache.checked_at = time.monotonic()
+    _cache.stale = False
+    await publish_safely({"type": "settings", "version": row.version})
+    return config
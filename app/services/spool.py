@@ -0,0 +1,266 @@
+"""Durable local spool for ingest while Postgres is unavailable.
+
+When a validated snapshot can't be written because the database is down or
+the pool times out, it is appended to a local segment file and the agent
+gets a 202 instead of an error. Appends are group-committed: every append
+within SPOOL_FSYNC_INTERVAL_MS shares one write + fsync, and nobody is
+acknowledged before their bytes are on disk.
+
+Segments are `<ns>-<pid>-<seq>.open` while a worker writes them (holding an
+flock) and `.jsonl` once sealed. Each worker runs a replayer that, once the
+DB answers again, claims sealed segments with an flock and feeds them back
+through `replay_snapshot`. Ingest is idempotent per (endpoint, timestamp),
+so a segment interrupted halfway can be replayed again safely. Replay
+stores history without reviving the endpoint: last_seen and the other
+current-state fields only move forward to a replayed report if it is the
+newest one stored, and no live events are published. `.open`
+segments whose writer died (flock free) are sealed and replayed too.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import text, exc as sa_exc
+
+from app.core.config import settings
+from app.core.metrics import SPOOL_RECORDS, SPOOL_BACKLOG_BYTES
+from app.db.session import IngestSessionLocal, ingest_engine
+from app.models.endpoint import Endpoint
+from app.services.directives import record_directed_interval, spooled_wait_seconds
+from app.services.ingest import replay_snapshot
+
+logger = logging.getLogger(__name__)
+
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".jsonl"
+
+
+def is_db_unavailable(exc: BaseException) -> bool:
+    """True for connection/timeout failures worth spooling (not bad data)."""
+    if isinstance(exc, (OSError, asyncio.TimeoutError, sa_exc.TimeoutError, sa_exc.OperationalError, sa_exc.InterfaceError)):
+        return True
+    return isinstance(exc, sa_exc.DBAPIError) and exc.connection_invalidated
+
+
+def _read_all(fd: int) -> bytes:
+    chunks = []
+    while chunk := os.read(fd, 1 << 20):
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _try_lock(path: Path) -> int | None:
+    """Open `path` and take a non-blocking exclusive flock; None if busy or gone."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except FileNotFoundError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    if os.fstat(fd).st_nlink == 0:
+        # Replayed and unlinked by someone else while we waited.
+        os.close(fd)
+        return None
+    return fd
+
+
+class Spool:
+    def __init__(self, directory: str) -> None:
+        self.dir = Path(directory)
+        self._path: Path | None = None
+        self._fd: int | None = None
+        self._size = 0
+        self._seq = 0
+        self._pending: list[bytes] = []
+        self._waiters: list[asyncio.Future] = []
+        self._flush_task: asyncio.Task | None = None
+        self._io_lock = asyncio.Lock()
+        self._replayer: asyncio.Task | None = None
+
+    # -- writing -------------------------------------------------------------
+
+    async def append(self, endpoint_id: int, payload: dict) -> None:
+        """Durably store one snapshot; returns once it has been fsynced."""
+        record = {"endpoint_id": endpoint_id, "received_at": datetime.now(timezone.utc).isoformat(), "payload": payload}
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.append((json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8"))
+        self._waiters.append(fut)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_soon())
+        await fut
+        SPOOL_RECORDS.inc(1, "spooled")
+
+    async def _flush_soon(self) -> None:
+        await asyncio.sleep(settings.spool_fsync_interval_ms / 1000.0)
+        lines, waiters = self._pending, self._waiters
+        self._pending, self._waiters = [], []
+        self._flush_task = None
+        try:
+            async with self._io_lock:
+                await asyncio.to_thread(self._write, b"".join(lines))
+        except Exception as e:
+            for w in waiters:
+                if not w.done():
+                    w.set_exception(e)
+            return
+        for w in waiters:
+            if not w.done():
+                w.set_result(None)
+
+    def _open_segment(self) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._seq += 1
+        path = self.dir / f"{time.time_ns():020d}-{os.getpid()}-{self._seq}{OPEN_SUFFIX}"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        self._path, self._fd, self._size = path, fd, 0
+
+    def _write(self, data: bytes) -> None:
+        if self._fd is None:
+            self._open_segment()
+        view = memoryview(data)
+        while view:
+            view = view[os.write(self._fd, view):]
+        os.fsync(self._fd)
+        self._size += len(data)
+        if self._size >= settings.spool_segment_max_bytes:
+            self._seal()
+
+    def _seal(self) -> None:
+        if self._fd is None:
+            return
+        os.rename(self._path, self._path.with_suffix(SEALED_SUFFIX))
+        os.close(self._fd)
+        self._path, self._fd, self._size = None, None, 0
+        dir_fd = os.open(self.dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    async def seal(self) -> None:
+        async with self._io_lock:
+            await asyncio.to_thread(self._seal)
+
+    def backlog_bytes(self) -> int:
+        total = 0
+        for p in list(self.dir.glob(f"*{OPEN_SUFFIX}")) + list(self.dir.glob(f"*{SEALED_SUFFIX}")):
+            try:
+                total += p.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    # -- replay --------------------------------------------------------------
+
+    def _seal_orphans(self) -> None:
+        for p in self.dir.glob(f"*{OPEN_SUFFIX}"):
+            if p == self._path:
+                continue
+            fd = _try_lock(p)
+            if fd is None:
+                continue  # its writer is alive
+            try:
+                os.rename(p, p.with_suffix(SEALED_SUFFIX))
+            except FileNotFoundError:
+                pass
+            finally:
+                os.close(fd)
+
+    async def _db_reachable(self) -> bool:
+        try:
+            async with ingest_engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            if is_db_unavailable(e):
+                return False
+            raise
+
+    async def replay_once(self) -> None:
+        if not self.dir.exists() or not await self._db_reachable():
+            return
+        if self._size:
+            await self.seal()
+        await asyncio.to_thread(self._seal_orphans)
+        for path in sorted(self.dir.glob(f"*{SEALED_SUFFIX}")):
+            if not await self._replay_segment(path):
+                return  # DB went away again
+
+    async def _replay_segment(self, path: Path) -> bool:
+        fd = await asyncio.to_thread(_try_lock, path)
+        if fd is None:
+            return True  # another worker has it
+        try:
+            lines = (await asyncio.to_thread(_read_all, fd)).splitlines()
+            batch_size = max(settings.spool_replay_batch, 1)
+            for i in range(0, len(lines), batch_size):
+                async with IngestSessionLocal() as db:
+                    for raw in lines[i:i + batch_size]:
+                        try:
+                            record = json.loads(raw)
+                        except ValueError:
+                            # Torn final line from a crash mid-write; it was never acknowledged.
+                            SPOOL_RECORDS.inc(1, "dropped")
+                            continue
+                        try:
+                            endpoint = await db.get(Endpoint, record["endpoint_id"])
+                            if endpoint is None:
+                                SPOOL_RECORDS.inc(1, "dropped")
+                                continue
+                            received_at = datetime.fromisoformat(record["received_at"])
+                            if await replay_snapshot(db, endpoint, record["payload"], received_at):
+                                # No newer report since: the agent's last directive is still the spool back-off.
+                                await record_directed_interval(db, endpoint, spooled_wait_seconds())
+                        except Exception as e:
+                            await db.rollback()
+                            if is_db_unavailable(e):
+                                return False
+                            logger.warning("dropping spooled snapshot for endpoint %s: %s", record.get("endpoint_id"), e)
+                            SPOOL_RECORDS.inc(1, "dropped")
+                            continue
+                        SPOOL_RECORDS.inc(1, "replayed")
+            os.unlink(path)
+            return True
+        finally:
+            os.close(fd)
+
+    async def _replay_forever(self) -> None:
+        while True:
+            try:
+                await self.replay_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("spool replay failed")
+            await asyncio.sleep(settings.spool_replay_interval_seconds)
+
+    # -- lifecycle -----------------------------------------------------------
+
+    async def start(self) -> None:
+        if settings.spool_enabled and self._replayer is None:
+            SPOOL_BACKLOG_BYTES.set_function(self.backlog_bytes)
+            self._replayer = asyncio.create_task(self._replay_forever())
+
+    async def stop(self) -> None:
+        if self._replayer is not None:
+            self._replayer.cancel()
+            self._replayer = None
+        if self._flush_task is not None:
+            await self._flush_task
+        # Hand the current segment to whichever worker replays next.
+        await self.seal()
+
+
+spool = Spool(settings.spool_dir)
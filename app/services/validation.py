@@ -1,13 +1,27 @@
 import json
+from functools import cache
 from pathlib import Path
-from jsonschema import Draft202012Validator
 
-SCHEMA_PATH = Path(__file__).resolve().parents[1] / "schemas" / "metricsagent-1.0.schema.json"
+SCHEMA_DIR = Path(__file__).resolve().parents[1] / "schemas"
+# schema_version -> schema file; other versions are rejected
+SCHEMA_FILES = {"1.0": "metricsagent-1.0.schema.json", "1.1": "metricsagent-1.1.schema.json"}
+DEFAULT_VERSION = "1.0"
 
-with SCHEMA_PATH.open("r", encoding="utf-8") as f:
-    _SCHEMA = json.load(f)
 
-VALIDATOR = Draft202012Validator(_SCHEMA)
+@cache
+def _validator(version: str):
+    # jsonschema is imported and the schema compiled on first use (or by warm()),
+    # so importing the app doesn't pay for it.
+    from jsonschema import Draft202012Validator
+
+    with (SCHEMA_DIR / SCHEMA_FILES[version]).open("r", encoding="utf-8") as f:
+        return Draft202012Validator(json.load(f))
+
+
+def warm() -> None:
+    """Compile every schema now rather than on the first ingest."""
+    for version in SCHEMA_FILES:
+        _validator(version)
 
 
 class ValidationError(Exception):
@@ -16,9 +30,17 @@ class ValidationError(Exception):
 
 
 def validate_snapshot(payload: dict) -> None:
-    errors = sorted(VALIDATOR.iter_errors(payload), key=lambda e: e.path)
+    version = payload.get("schema_version")
+    if isinstance(version, str) and version not in SCHEMA_FILES:
+        raise ValidationError(f"unsupported schema_version '{version}' (supported: {', '.join(SCHEMA_FILES)})")
+    # Missing or non-string versions get the 1.0 schema's own error for the field.
+    validator = _validator(version if isinstance(version, str) else DEFAULT_VERSION)
+    errors = sorted(validator.iter_errors(payload), key=lambda e: e.path)
     if errors:
         # Surface the first error for concise API responses.
         e = errors[0]
         loc = "/".join(str(p) for p in e.path)
+        if e.validator == "not":
+            # 1.1 sections listed in "unchanged" must be omitted; default message dumps the whole payload.
+            raise ValidationError(f"schema validation failed at '{loc}': {e.validator_value.get('required')} must be omitted when listed in 'unchanged'")
         raise ValidationError(f"schema validation failed at '{loc}': {e.message}")
@@ -0,0 +1,101 @@
+"""Drive POST /api/v1/ingest at a target request rate.
+
+    python -m benchmarks.ingest_load --url http://localhost:8000 --tokens tokens.json --rate 200 --duration 60
+
+Requests are scheduled open-loop (fixed arrival rate, not "send the next one
+when the last returns"), so server slowdowns show up as latency instead of
+being hidden by a slower send rate.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.common import emit, latency_summary
+from benchmarks.payloads import make_snapshot
+
+
+async def run(args) -> dict:
+    with open(args.tokens, encoding="utf-8") as f:
+        tokens = json.load(f)
+    hosts = list(tokens.items())
+    if not hosts:
+        raise SystemExit("tokens file is empty")
+
+    rng = random.Random(args.seed)
+    latencies: list[float] = []
+    statuses: Counter[str] = Counter()
+    sem = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+
+        async def one(i: int) -> None:
+            hostname, token = hosts[i % len(hosts)]
+            payload = make_snapshot(
+                hostname, f"bench-machine-{hostname.rsplit('-', 1)[-1]}", datetime.now(timezone.utc),
+                disks=args.disks, volumes=args.volumes, nics=args.nics, users=args.users, rng=rng,
+            )
+            async with sem:
+                started = time.perf_counter()
+                try:
+                    r = await client.post("/api/v1/ingest", json=payload, headers={"X-API-Key": token})
+                    statuses[str(r.status_code)] += 1
+                except httpx.HTTPError as e:
+                    statuses[type(e).__name__] += 1
+                    return
+                finally:
+                    latencies.append(time.perf_counter() - started)
+
+        total = int(args.rate * args.duration)
+        tasks = []
+        t0 = time.perf_counter()
+        for i in range(total):
+            delay = t0 + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(i)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - t0
+
+    ok = statuses.get("200", 0)
+    return {
+        "requests": total,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "ok_rps": round(ok / elapsed, 2) if elapsed else None,
+        "statuses": dict(statuses),
+        "latency": latency_summary(latencies),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--tokens", required=True, help="JSON {hostname: token} written by benchmarks.seed")
+    ap.add_argument("--rate", type=float, default=50.0, help="target requests per second")
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds")
+    ap.add_argument("--concurrency", type=int, default=100, help="max in-flight requests")
+    ap.add_argument("--timeout", type=float, default=30.0)
+    ap.add_argument("--disks", type=int, default=2)
+    ap.add_argument("--volumes", type=int, default=2)
+    ap.add_argument("--nics", type=int, default=2)
+    ap.add_argument("--users", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    results = asyncio.run(run(args))
+    emit("ingest_load", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
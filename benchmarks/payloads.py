@@ -0,0 +1,87 @@
+"""Synthetic MetricsAgent snapshots that follow metricsagent-1.0.schema.json."""
+
+from __future__ import annotations
+
+import random
+from datetime import datetime, timezone
+
+
+def make_snapshot(
+    hostname: str,
+    machine_id: str,
+    ts: datetime | None = None,
+    *,
+    interval_seconds: int = 30,
+    disks: int = 2,
+    volumes: int = 2,
+    nics: int = 2,
+    users: int = 1,
+    rng: random.Random | None = None,
+) -> dict:
+    rng = rng or random
+    ts = ts or datetime.now(timezone.utc)
+
+    cpu = round(rng.uniform(0, 100), 2)
+    mem_total = 16 * 1024**3
+    mem_used = int(mem_total * rng.uniform(0.2, 0.95))
+
+    vols = []
+    for i in range(volumes):
+        total = 256 * 1024**3
+        free = int(total * rng.uniform(0.02, 0.9))
+        vols.append({
+            "mount": f"{chr(ord('C') + i)}:",
+            "filesystem": "NTFS",
+            "total_bytes": total,
+            "free_bytes": free,
+            "free_pct": round(free * 100.0 / total, 2),
+        })
+
+    ifaces = []
+    for i in range(nics):
+        bytes_ps = round(rng.uniform(0, 1.25e8), 1)
+        ifaces.append({
+            "name": f"Ethernet {i}",
+            "bytes_total_per_sec": bytes_ps,
+            "bits_total_per_sec": bytes_ps * 8,
+            "utilization_pct": round(rng.uniform(0, 100), 2),
+            "packets_in_errors": rng.choice((0, 0, 0, 1)),
+            "packets_out_errors": 0,
+        })
+
+    logged_in = [{"username": f"user{rng.randint(0, 999)}", "session_type": "console"} for _ in range(users)]
+
+    return {
+        "schema_version": "1.0",
+        "timestamp_utc": ts.isoformat().replace("+00:00", "Z"),
+        "interval_seconds": interval_seconds,
+        "host": {
+            "hostname": hostname,
+            "machine_id": machine_id,
+            "os": {"platform": "windows", "version": "10.0", "build": "20348"},
+        },
+        "cpu": {"utilization_pct": cpu, "idle_pct": round(100 - cpu, 2)},
+        "memory": {
+            "total_bytes": mem_total,
+            "used_bytes": mem_used,
+            "free_bytes": mem_total - mem_used,
+            "used_pct": round(mem_used * 100.0 / mem_total, 2),
+        },
+        "disk": {
+            "physical": [
+                {
+                    "instance": f"{i} {chr(ord('C') + i)}:",
+                    "reads_per_sec": round(rng.uniform(0, 500), 2),
+                    "writes_per_sec": round(rng.uniform(0, 500), 2),
+                    "avg_queue_length": round(rng.uniform(0, 4), 3),
+                    "read_latency_ms": round(rng.uniform(0, 30), 2),
+                    "write_latency_ms": round(rng.uniform(0, 30), 2),
+                    "utilization_pct": round(rng.uniform(0, 100), 2),
+                }
+                for i in range(disks)
+            ],
+            "volumes": vols,
+        },
+        "network": {"interfaces": ifaces},
+        "users": {"logged_in": logged_in, "count": len(logged_in)},
+    }
@@ -0,0 +1,91 @@
+"""Benchmark the read paths on a seeded database.
+
+    python -m benchmarks.queries --url http://localhost:8000 --email admin@example.com --password 'admin123!'
+
+Measures the `dashboard` page and `host_timeseries` JSON over HTTP (so
+template rendering is included), and `check_alerts_once` in-process against
+the configured DATABASE_URL. Notifications are disabled for the run.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+from sqlalchemy import select
+
+from app.db.session import AsyncSessionLocal
+from app.models.endpoint import Endpoint
+from benchmarks.common import emit, latency_summary
+
+METRICS = ("cpu", "mem", "disk_queue", "disk_read_lat", "vol_free", "nic_bps", "nic_err")
+
+
+async def _timed(n: int, fn) -> list[float]:
+    out = []
+    for _ in range(n):
+        started = time.perf_counter()
+        await fn()
+        out.append(time.perf_counter() - started)
+    return out
+
+
+async def run(args) -> dict:
+    results: dict = {}
+
+    async with AsyncSessionLocal() as db:
+        endpoint_ids = (await db.execute(select(Endpoint.id).where(Endpoint.is_active.is_(True)))).scalars().all()
+    results["endpoints"] = len(endpoint_ids)
+    rng = random.Random(args.seed)
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=120.0) as client:
+        r = await client.post("/login", data={"email": args.email, "password": args.password})
+        if r.status_code != 302:
+            raise SystemExit(f"login failed: HTTP {r.status_code}")
+
+        async def dashboard():
+            (await client.get("/dashboard")).raise_for_status()
+
+        results["dashboard"] = latency_summary(await _timed(args.iterations, dashboard))
+
+        results["host_timeseries"] = {}
+        for metric in METRICS:
+            async def timeseries(metric=metric):
+                eid = rng.choice(endpoint_ids)
+                (await client.get(f"/api/ui/host/{eid}/timeseries", params={"metric": metric})).raise_for_status()
+
+            results["host_timeseries"][metric] = latency_summary(await _timed(args.iterations, timeseries))
+
+    if not args.skip_alerts:
+        from app.services import alerts
+
+        async def _no_notify(*_a, **_kw):
+            return None
+
+        alerts._send_notifications = _no_notify
+        results["check_alerts_once"] = latency_summary(await _timed(args.iterations, alerts.check_alerts_once))
+
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--email", required=True)
+    ap.add_argument("--password", required=True)
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--skip-alerts", action="store_true")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    params = {k: v for k, v in vars(args).items() if k != "password"}
+    results = asyncio.run(run(args))
+    emit("queries", params, results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Seed a database with synthetic endpoints and snapshot history.
+
+    python -m benchmarks.seed --hosts 1000 --days 1 --interval 300 --tokens-out tokens.json
+
+Every snapshot goes through `ingest_snapshot`, so everything ingest keeps
+up to date is filled in as it would be in production: shard placement, the
+endpoint's latest CPU/mem, user sightings, current volumes and group
+rollups. Endpoints are spread round-robin over `--groups` groups so the
+group pages have data. Hosts are ingested `--concurrency` at a time, each
+in time order; use `benchmarks.ingest_load` to measure the HTTP ingest path.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import insert
+
+from app.core.security import generate_token, hash_token
+from app.db.session import IngestSessionLocal, engine
+from app.models.endpoint import Endpoint
+from app.models.group import EndpointGroup, EndpointGroupMember
+from app.services.ingest import ingest_snapshot
+from benchmarks.payloads import make_snapshot
+
+
+async def _ingest_host(args, endpoint_id: int, row: dict, now: datetime, samples: int, rng: random.Random) -> int:
+    async with IngestSessionLocal() as db:
+        endpoint = await db.get(Endpoint, endpoint_id)
+        for n in range(samples):
+            ts = now - timedelta(seconds=args.interval * (samples - n))
+            payload = make_snapshot(
+                row["hostname"], row["machine_id"], ts,
+                interval_seconds=args.interval, disks=args.disks, volumes=args.volumes, nics=args.nics, users=args.users, rng=rng,
+            )
+            await ingest_snapshot(db, endpoint, payload)
+    return samples
+
+
+async def seed(args) -> dict:
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    samples = int(args.days * 86400 // args.interval)
+
+    # Only the first --ingest-endpoints get their own token (PBKDF2 is slow on
+    # purpose); the rest share the hash of a throwaway token.
+    shared_hash = hash_token(generate_token(32))
+    tokens = {}
+    endpoint_rows = []
+    for i in range(args.hosts):
+        token_hash = shared_hash
+        if i < args.ingest_endpoints:
+            tok = generate_token(32)
+            token_hash = hash_token(tok)
+            tokens[f"bench-{i:05d}"] = tok
+        endpoint_rows.append({
+            "hostname": f"bench-{i:05d}",
+            "machine_id": f"bench-machine-{i:05d}",
+            "token_hash": token_hash,
+            "is_active": True,
+            "created_at": now,
+        })
+
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        ids = (await conn.execute(insert(Endpoint.__table__).returning(Endpoint.__table__.c.id, sort_by_parameter_order=True), endpoint_rows)).scalars().all()
+        if args.groups and ids:
+            group_ids = (await conn.execute(
+                insert(EndpointGroup.__table__).returning(EndpointGroup.__table__.c.id, sort_by_parameter_order=True),
+                [{"name": f"bench-g{g:03d}", "created_at": now} for g in range(args.groups)],
+            )).scalars().all()
+            await conn.execute(
+                insert(EndpointGroupMember.__table__),
+                [{"group_id": group_ids[i % len(group_ids)], "endpoint_id": eid} for i, eid in enumerate(ids)],
+            )
+
+    # Each host gets its own RNG so the data doesn't depend on task scheduling.
+    hosts = [(eid, row, random.Random(rng.random())) for eid, row in zip(ids, endpoint_rows)]
+    snapshots_written = 0
+
+    async def worker() -> None:
+        nonlocal snapshots_written
+        while hosts:
+            eid, row, host_rng = hosts.pop()
+            snapshots_written += await _ingest_host(args, eid, row, now, samples, host_rng)
+
+    await asyncio.gather(*(worker() for _ in range(max(args.concurrency, 1))))
+
+    if args.tokens_out:
+        with open(args.tokens_out, "w", encoding="utf-8") as f:
+            json.dump(tokens, f, indent=2)
+
+    return {
+        "endpoints": len(ids),
+        "snapshots": snapshots_written,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--hosts", type=int, default=1000)
+    ap.add_argument("--days", type=float, default=1.0)
+    ap.add_argument("--interval", type=int, default=300, help="seconds between seeded snapshots")
+    ap.add_argument("--disks", type=int, default=2)
+    ap.add_argument("--volumes", type=int, default=2)
+    ap.add_argument("--nics", type=int, default=2)
+    ap.add_argument("--users", type=int, default=1)
+    ap.add_argument("--groups", type=int, default=10, help="groups the endpoints are spread over (0 for none)")
+    ap.add_argument("--concurrency", type=int, default=8, help="hosts ingested in parallel")
+    ap.add_argument("--ingest-endpoints", type=int, default=10, help="endpoints that get a usable token")
+    ap.add_argument("--tokens-out", default=None, help="write {hostname: token} for ingest_load")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    from benchmarks.common import emit
+
+    results = asyncio.run(seed(args))
+    emit("seed", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Measure cold start: how long a fresh worker takes to import, listen and pass /readyz.
+
+    python -m benchmarks.startup --runs 5 --out startup.json
+
+Each run starts `uvicorn app.main:app` in a new process on a free port
+(against the configured DATABASE_URL) and polls /readyz every 10 ms:
+
+- `import`: `import app.main` in a fresh interpreter
+- `listening`: process start until /readyz answers at all (503 while warming)
+- `ready`: process start until /readyz returns 200 (pools, caches and schemas warm)
+
+With --migrate, `python -m app.cli.migrate` is timed too; on a database
+already at head that is the skip path every container start takes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import emit, latency_summary
+
+ROOT = Path(__file__).resolve().parents[1]
+POLL_SECONDS = 0.01
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _time_command(argv: list[str]) -> float:
+    started = time.perf_counter()
+    subprocess.run(argv, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - started
+
+
+def _time_server(timeout: float) -> tuple[float, float]:
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}/readyz"
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    listening = None
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                if proc.poll() is not None:
+                    raise SystemExit(f"server exited with {proc.returncode}")
+                try:
+                    status = client.get(url).status_code
+                except httpx.TransportError:
+                    status = None
+                now = time.perf_counter() - started
+                if status is not None and listening is None:
+                    listening = now
+                if status == 200:
+                    return listening, now
+                time.sleep(POLL_SECONDS)
+        raise SystemExit(f"/readyz did not pass within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run(args) -> dict:
+    timings: dict[str, list[float]] = {"import": [], "listening": [], "ready": []}
+    if args.migrate:
+        timings["migrate"] = []
+
+    for _ in range(args.runs):
+        timings["import"].append(_time_command([sys.executable, "-c", "import app.main"]))
+        if args.migrate:
+            timings["migrate"].append(_time_command([sys.executable, "-m", "app.cli.migrate"]))
+        listening, ready = _time_server(args.timeout)
+        timings["listening"].append(listening)
+        timings["ready"].append(ready)
+
+    return {phase: latency_summary(values) for phase, values in timings.items()}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--migrate", action="store_true", help="also time python -m app.cli.migrate")
+    ap.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for /readyz per run")
+    ap.add_argument("--out", default=None)
+    args = ap.parse_args()
+
+    results = run(args)
+    emit("startup", vars(args), results, args.out)
+
+
+if __name__ == "__main__":
+    main()
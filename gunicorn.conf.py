@@ -0,0 +1,44 @@
+"""Gunicorn settings for the production (multi-worker) mode.
+
+Each worker is a separate process with its own scheduler and DB pools, so the
+per-worker pool sizes in Settings multiply by the worker count. Keep
+`workers * (pool_size + max_overflow)` (UI + ingest) under Postgres'
+`max_connections`, or put PgBouncer in front and set DB_PGBOUNCER_MODE=true.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The app is async and mostly waits on Postgres; one worker per core is enough
+# to use every core without oversubscribing the DB pools.
+def _cpu_count() -> int:
+    # Respect CPU affinity / container cpusets where the platform exposes it.
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return multiprocessing.cpu_count()
+
+
+workers = int(os.getenv("WEB_CONCURRENCY") or _cpu_count())
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers occasionally to bound memory growth.
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # The in-memory event bus only reaches its own process; other workers
+    # would miss live updates, heartbeat deadlines and directive pushes.
+    from app.core.config import settings
+
+    if workers > 1 and settings.event_bus_backend != "postgres":
+        server.log.warning("EVENT_BUS_BACKEND=%s with %d workers: events only reach the worker that published them; use EVENT_BUS_BACKEND=postgres", settings.event_bus_backend, workers)
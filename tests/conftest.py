@@ -0,0 +1,16 @@
+"""Settings are read when `app` is first imported, so point them at the test databases here.
+
+Unit tests need no database. The Postgres tests run only when
+TEST_DATABASE_URL is set (plus TEST_SHARD_DATABASE_URLS for the sharded
+ones); they migrate and then TRUNCATE those databases, so use scratch ones.
+"""
+
+from __future__ import annotations
+
+import os
+import tempfile
+
+if os.environ.get("TEST_DATABASE_URL"):
+    os.environ["DATABASE_URL"] = os.environ["TEST_DATABASE_URL"]
+    os.environ["SHARD_DATABASE_URLS"] = os.environ.get("TEST_SHARD_DATABASE_URLS", "")
+    os.environ.setdefault("ARCHIVE_DIR", tempfile.mkdtemp(prefix="metrics-archive-"))
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.services import archive
+
+
+@pytest.fixture
+def archive_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "archive_dir", str(tmp_path))
+    return tmp_path
+
+
+def test_ingest_is_refused_while_a_day_is_being_archived(archive_dir):
+    day = (datetime.now(timezone.utc) - timedelta(days=settings.hot_retention_days + 5)).date()
+    ts = archive._day_start(day) + timedelta(hours=12)
+    assert not archive.is_archived(ts)
+
+    archive._staging_dir(day).mkdir()
+    assert archive.is_archived(ts)
+    assert not archive.is_archived(ts + timedelta(days=1))
+    assert archive.archived_days() == []
+
+
+def test_archived_timestamps_come_from_the_parquet_copy(archive_dir):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+
+    day = date(2026, 1, 31)
+    stamps = [archive._day_start(day) + timedelta(minutes=5 * i) for i in range(3)]
+    directory = archive._day_dir(day) / "snapshots"
+    directory.mkdir(parents=True)
+    for endpoint_id in (3, 12):
+        table = pa.table({"endpoint_id": [endpoint_id] * 3, "timestamp_utc": pa.array(stamps, pa.timestamp("us", tz="UTC"))})
+        pq.write_table(table, directory / f"endpoint={endpoint_id}.parquet")
+
+    assert archive._archived_timestamps(day) == {3: stamps, 12: stamps}
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.services import directives
+from app.services.directives import _clamp, _is_quiet, directed_wait_seconds, directives_for, record_directed_interval, spooled_wait_seconds
+from app.services.heartbeats import _effective_interval
+
+
+@pytest.fixture(autouse=True)
+def agent_settings(monkeypatch):
+    for name, value in {
+        "agent_directives_enabled": True,
+        "agent_interval_seconds": 30,
+        "agent_interval_min_seconds": 10,
+        "agent_interval_max_seconds": 300,
+        "agent_quiet_pct": 20.0,
+        "agent_quiet_delta_pct": 5.0,
+        "agent_quiet_multiplier": 4.0,
+        "agent_alert_boost_minutes": 15,
+        "ingest_min_interval_seconds": 5,
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(directives, "under_pressure", lambda: False)
+    monkeypatch.setattr(directives, "_boosted", {})
+
+
+def _endpoint(cpu=50.0, mem=50.0, endpoint_id=1):
+    return SimpleNamespace(id=endpoint_id, last_cpu_pct=cpu, last_mem_pct=mem, directed_interval_seconds=None)
+
+
+def test_clamp_respects_both_floors_and_the_ceiling(monkeypatch):
+    assert _clamp(1) == 10
+    assert _clamp(42.7) == 42
+    assert _clamp(10_000) == 300
+    monkeypatch.setattr(settings, "ingest_min_interval_seconds", 15)
+    assert _clamp(1) == 15
+
+
+@pytest.mark.parametrize("cpu, mem, prev_cpu, prev_mem, quiet", [
+    (5.0, 10.0, 6.0, 12.0, True),
+    (20.0, 20.0, 20.0, 20.0, True),    # at the threshold still counts
+    (25.0, 10.0, 24.0, 10.0, False),   # cpu too high
+    (5.0, 10.0, 15.0, 10.0, False),    # cpu moved too much
+    (5.0, 10.0, 5.0, 2.0, False),      # mem moved too much
+    (5.0, 10.0, None, 10.0, False),    # no previous report
+    (None, 10.0, 5.0, 10.0, False),
+])
+def test_is_quiet(cpu, mem, prev_cpu, prev_mem, quiet):
+    assert _is_quiet(cpu, mem, prev_cpu, prev_mem) is quiet
+
+
+def test_normal_quiet_and_alert_intervals():
+    assert directives_for(_endpoint(50, 50), 50, 50)["interval_seconds"] == 30
+    quiet = directives_for(_endpoint(5, 10), 6, 11)
+    assert (quiet["reason"], quiet["interval_seconds"]) == ("quiet", 120)
+
+    directives._on_event({"type": "alert", "endpoint_id": 1})
+    boosted = directives_for(_endpoint(5, 10), 6, 11)
+    assert (boosted["reason"], boosted["interval_seconds"]) == ("alert", 10)
+    assert directives_for(_endpoint(5, 10, endpoint_id=2), 6, 11)["reason"] == "quiet"
+
+
+def test_alert_boost_expires():
+    directives._on_event({"type": "alert", "endpoint_id": 1})
+    directives._boosted[1] -= 16 * 60
+    assert directives_for(_endpoint(), 50, 50)["reason"] == "normal"
+    assert 1 not in directives._boosted
+
+
+def test_pressure_doubles_the_interval_and_drops_optional_sections(monkeypatch):
+    monkeypatch.setattr(directives, "under_pressure", lambda: True)
+    d = directives_for(_endpoint(5, 10), 6, 11)
+    assert (d["reason"], d["interval_seconds"]) == ("pressure", 240)
+    assert d["enable"] == {"cpu": True, "memory": True, "disk": True, "network": True, "users": False}
+    assert directives_for(_endpoint(), 50, 50)["enable"]["users"] is False
+
+
+def test_spooled_response_and_its_recorded_wait():
+    d = directives_for(None, spooled=True)
+    assert (d["reason"], d["interval_seconds"], d["backoff_seconds"]) == ("db_unavailable", 300, 30)
+    assert d["enable"]["users"] is False
+    assert directed_wait_seconds(d) == spooled_wait_seconds() == 330
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "agent_directives_enabled", False)
+    assert directives_for(_endpoint(), 50, 50) is None
+    assert directed_wait_seconds(None) is None
+    assert spooled_wait_seconds() is None
+
+
+def test_directed_interval_is_written_only_on_change():
+    commits = []
+
+    class _Db:
+        async def commit(self):
+            commits.append(1)
+
+    endpoint = _endpoint()
+    asyncio.run(record_directed_interval(_Db(), endpoint, 330))
+    asyncio.run(record_directed_interval(_Db(), endpoint, 330))
+    assert endpoint.directed_interval_seconds == 330
+    assert len(commits) == 1
+
+
+def test_heartbeat_interval_is_the_longer_of_reported_and_directed():
+    assert _effective_interval(30, None) == 30
+    assert _effective_interval(30, 330) == 330
+    assert _effective_interval(300, 40) == 300
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import Session
+
+import app.db.session  # noqa: F401  (installs the guard)
+from app.core.config import settings
+from app.db.guards import FullEntityLoadError
+from app.models.endpoint import Endpoint
+from app.models.snapshot import DiskVolume, Snapshot
+
+
+class _Executed(Exception):
+    """Raised by a listener behind the guard: the statement got past it."""
+
+
+def _stop(state):
+    raise _Executed()
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(settings, "entity_load_guard", "raise")
+    event.listen(Session, "do_orm_execute", _stop)
+    try:
+        with Session(create_engine("sqlite://")) as s:
+            yield s
+    finally:
+        event.remove(Session, "do_orm_execute", _stop)
+
+
+@pytest.mark.parametrize("stmt", [
+    select(Snapshot),
+    select(Snapshot).where(Snapshot.endpoint_id == 1).limit(10),
+    select(Snapshot.id, DiskVolume).join(DiskVolume, DiskVolume.snapshot_id == Snapshot.id),
+])
+def test_full_entity_select_is_rejected(session, stmt):
+    with pytest.raises(FullEntityLoadError):
+        session.execute(stmt)
+
+
+def test_session_get_is_rejected(session):
+    with pytest.raises(FullEntityLoadError):
+        session.get(Snapshot, 1)
+
+
+@pytest.mark.parametrize("stmt", [
+    select(Snapshot.timestamp_utc, Snapshot.cpu_utilization_pct).where(Snapshot.endpoint_id == 1),
+    select(DiskVolume.mount, DiskVolume.free_pct),
+    select(Endpoint),
+    select(Snapshot).execution_options(allow_full_entity=True),
+])
+def test_projections_and_opt_outs_pass(session, stmt):
+    with pytest.raises(_Executed):
+        session.execute(stmt)
+
+
+def test_warn_mode_logs_and_runs(session, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "entity_load_guard", "warn")
+    with caplog.at_level(logging.WARNING, logger="app.db.guards"), pytest.raises(_Executed):
+        session.execute(select(Snapshot))
+    assert "full-entity load of Snapshot" in caplog.text
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import random
+from types import SimpleNamespace
+
+from app.services.fleet import QUANTILE_GRID, merge_quantiles, merge_top_k
+
+
+def _percentile_cont(values: list[float], p: float) -> float:
+    # What Postgres' percentile_cont computes.
+    values = sorted(values)
+    pos = p * (len(values) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (pos - lo) * (values[hi] - values[lo])
+
+
+def _summary(values: list[float]) -> tuple[int, list[float]]:
+    return len(values), [_percentile_cont(values, q) for q in QUANTILE_GRID]
+
+
+def test_merge_quantiles_single_part_is_exact():
+    values = [random.Random(1).uniform(0, 100) for _ in range(500)]
+    merged = merge_quantiles([_summary(values)], (0.5, 0.95, 0.99))
+    for got, p in zip(merged, (0.5, 0.95, 0.99)):
+        assert abs(got - _percentile_cont(values, p)) < 1e-9
+
+
+def test_merge_quantiles_within_one_grid_step():
+    rng = random.Random(42)
+    # Shards of different sizes and distributions, as real fleets split unevenly.
+    shards = [
+        [rng.uniform(0, 30) for _ in range(300)],
+        [rng.gauss(60, 10) for _ in range(1200)],
+        [rng.expovariate(0.05) for _ in range(50)],
+    ]
+    union = [v for s in shards for v in s]
+    probs = (0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+    merged = merge_quantiles([_summary(s) for s in shards], probs)
+    step = QUANTILE_GRID[1]
+    for got, p in zip(merged, probs):
+        assert _percentile_cont(union, max(p - step, 0)) <= got <= _percentile_cont(union, min(p + step, 1)), p
+
+
+def test_merge_quantiles_skips_empty_parts():
+    values = [float(i) for i in range(101)]
+    assert merge_quantiles([(0, None), _summary(values), (0, [])], (0.5,)) == [50.0]
+    assert merge_quantiles([(0, None)], (0.5, 0.99)) == [None, None]
+
+
+def _row(endpoint_id: int, value: float | None):
+    return SimpleNamespace(endpoint_id=endpoint_id, value=value)
+
+
+def test_merge_top_k_across_shards():
+    parts = [
+        [_row(2, 90.0), _row(4, 10.0)],
+        [_row(1, 50.0), _row(3, 40.0), _row(5, 5.0)],
+        [],
+    ]
+    assert [r.endpoint_id for r in merge_top_k(parts, 3)] == [2, 1, 3]
+    assert [r.endpoint_id for r in merge_top_k(parts, 10)] == [2, 1, 3, 4, 5]
+
+
+def test_merge_top_k_puts_nulls_first_like_postgres():
+    parts = [[_row(1, 5.0)], [_row(2, None), _row(3, 0.0)]]
+    assert [r.endpoint_id for r in merge_top_k(parts, 3)] == [2, 1, 3]
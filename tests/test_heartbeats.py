@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from app.services import heartbeats
+from app.services.heartbeats import HeartbeatTracker
+
+
+@pytest.fixture
+def tracker():
+    t = HeartbeatTracker()
+    t._grace = (3.0, 120)
+    return t
+
+
+def test_due_endpoints_come_out_in_deadline_order(tracker):
+    tracker.touch(1, 1000.0, 60)   # grace max(120, 180) -> 1180
+    tracker.touch(2, 1000.0, 30)   # grace 120 -> 1120
+    tracker.touch(3, 1000.0, 600)  # grace 1800 -> 2800
+    assert tracker._pop_due(1100.0) == []
+    assert tracker._pop_due(1200.0) == [2, 1]
+    assert len(tracker) == 1
+    assert tracker._pop_due(3000.0) == [3]
+    assert len(tracker) == 0
+
+
+def test_newer_report_supersedes_the_old_heap_entry(tracker):
+    tracker.touch(1, 1000.0, 30)
+    tracker.touch(1, 1100.0, 30)
+    assert len(tracker._heap) == 2  # the stale entry stays until popped
+    assert tracker._pop_due(1120.0) == []
+    assert tracker._heap == [(1220.0, 1)]
+    assert tracker._pop_due(1220.0) == [1]
+
+
+def test_older_report_is_ignored(tracker):
+    tracker.touch(1, 1100.0, 30)
+    tracker.touch(1, 1000.0, 30)
+    assert tracker._due == {1: 1220.0}
+
+
+def test_forgotten_endpoint_is_skipped(tracker):
+    tracker.touch(1, 1000.0, 30)
+    tracker.touch(2, 1000.0, 60)
+    tracker.forget(1)
+    assert tracker._pop_due(5000.0) == [2]
+
+
+def test_earlier_deadline_wakes_the_loop(tracker):
+    tracker.touch(1, 1000.0, 600)
+    tracker._wake.clear()
+    tracker.touch(2, 1000.0, 600)  # same deadline: no need to wake
+    assert not tracker._wake.is_set()
+    tracker.touch(3, 1000.0, 30)
+    assert tracker._wake.is_set()
+
+
+def test_grace_change_reschedules_every_endpoint(tracker):
+    tracker.touch(1, 1000.0, 30)
+    tracker.touch(2, 1000.0, 100)
+    tracker._set_grace(2.0, 300)
+    assert tracker._due == {1: 1300.0, 2: 1300.0}
+    assert sorted(tracker._heap) == [(1300.0, 1), (1300.0, 2)]
+    assert tracker._pop_due(1200.0) == []
+    tracker._set_grace(10.0, 60)
+    assert tracker._due == {1: 1300.0, 2: 2000.0}
+
+
+def test_heap_is_compacted_when_mostly_stale(tracker):
+    for n in range(1100):
+        tracker.touch(1, 1000.0 + n, 30)
+    assert len(tracker._heap) < 1100
+    assert tracker._pop_due(10_000.0) == [1]
+
+
+def test_on_event_uses_the_directed_interval(tracker):
+    event = {"type": "snapshot", "endpoint_id": 7, "last_seen": "2026-10-19T12:00:00+00:00", "interval_seconds": 30, "directed_interval_seconds": 330}
+    tracker.on_event(event)
+    last_seen = tracker._seen[7][0]
+    assert tracker._due[7] == last_seen + 3.0 * 330
+    tracker.on_event({"type": "alert", "endpoint_id": 8})
+    assert 8 not in tracker._due
+
+
+def test_initial_load_retries_with_backoff(tracker, monkeypatch):
+    attempts, sleeps = [], []
+
+    async def rebuild():
+        attempts.append(1)
+        if len(attempts) < 4:
+            raise OSError("db not up")
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(tracker, "_rebuild", rebuild)
+    monkeypatch.setattr(heartbeats.asyncio, "sleep", sleep)
+    monkeypatch.setattr(heartbeats, "CONFIG_REFRESH_SECONDS", 3)
+    asyncio.run(tracker._load())
+    assert len(attempts) == 4
+    assert sleeps == [1.0, 2.0, 3]
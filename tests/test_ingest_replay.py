@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.dml import Insert
+
+from benchmarks.payloads import make_snapshot
+from app.models.endpoint import Endpoint
+from app.services import ingest
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class _FakeSession:
+    """Just enough AsyncSession for ingest_snapshot on an unsharded DB: remembers stored timestamps."""
+
+    def __init__(self):
+        self.stored: dict[datetime, int] = {}
+
+    async def scalar(self, stmt):
+        if isinstance(stmt, Insert):
+            ts = stmt.compile(dialect=postgresql.dialect()).params["timestamp_utc"]
+            if ts in self.stored:
+                return None
+            self.stored[ts] = len(self.stored) + 1
+            return self.stored[ts]
+        return None
+
+    async def execute(self, stmt):
+        return None
+
+    def add(self, obj):
+        pass
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def events(monkeypatch):
+    published = []
+
+    async def publish(event):
+        published.append(event)
+
+    async def no_rollups(*args, **kwargs):
+        pass
+
+    async def newest(sdb, endpoint_id):
+        return max(sdb.stored) if sdb.stored else None
+
+    monkeypatch.setattr(ingest, "publish_safely", publish)
+    monkeypatch.setattr(ingest, "record_group_rollups", no_rollups)
+    monkeypatch.setattr(ingest, "_newest_timestamp", newest)
+    return published
+
+
+def _report(minutes_ago: int, cpu_seed: int) -> dict:
+    return make_snapshot("host1", "machine-1", NOW - timedelta(minutes=minutes_ago), rng=random.Random(cpu_seed))
+
+
+def _endpoint() -> Endpoint:
+    return Endpoint(id=1, hostname="host1", machine_id="machine-1", token_hash="-")
+
+
+def test_replay_of_older_records_leaves_the_live_state_alone(events):
+    db, endpoint = _FakeSession(), _endpoint()
+    live = _report(1, 1)
+    asyncio.run(ingest.ingest_snapshot(db, endpoint, live))
+    seen, cpu = endpoint.last_seen, endpoint.last_cpu_pct
+    assert len(events) == 1
+
+    # Backlog spooled during an outage, replayed out of order after the agent came back.
+    for minutes_ago in (20, 40, 30):
+        latest = asyncio.run(ingest.replay_snapshot(db, endpoint, _report(minutes_ago, minutes_ago), NOW - timedelta(minutes=minutes_ago)))
+        assert latest is False
+
+    assert endpoint.last_seen == seen
+    assert endpoint.last_cpu_pct == cpu == live["cpu"]["utilization_pct"]
+    assert len(events) == 1
+    assert len(db.stored) == 4
+
+
+def test_replay_does_not_revive_a_host_that_went_quiet(events):
+    db, endpoint = _FakeSession(), _endpoint()
+    # The host's last reports were spooled, then it died; replay runs much later.
+    reports = {minutes_ago: _report(minutes_ago, minutes_ago) for minutes_ago in (50, 45, 40)}
+    results = {m: asyncio.run(ingest.replay_snapshot(db, endpoint, reports[m], NOW - timedelta(minutes=m) + timedelta(seconds=1))) for m in (45, 40, 50)}
+
+    assert results == {45: True, 40: True, 50: False}
+    # last_seen is when the newest report was received, not when it was replayed.
+    assert endpoint.last_seen == NOW - timedelta(minutes=40) + timedelta(seconds=1)
+    assert endpoint.last_cpu_pct == reports[40]["cpu"]["utilization_pct"]
+    assert events == []
+
+
+def test_replayed_duplicate_is_not_latest(events):
+    db, endpoint = _FakeSession(), _endpoint()
+    report = _report(5, 5)
+    assert asyncio.run(ingest.replay_snapshot(db, endpoint, report, NOW - timedelta(minutes=5)))
+    assert not asyncio.run(ingest.replay_snapshot(db, endpoint, report, NOW - timedelta(minutes=5)))
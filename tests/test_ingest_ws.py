@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import api
+from app.api.api import WS_MESSAGE_TOO_BIG, WS_UNAUTHORIZED, _decode_frame, _nack, _push_directives, _shed
+from app.core.config import settings
+
+
+@pytest.fixture(autouse=True)
+def ws_settings(monkeypatch):
+    monkeypatch.setattr(settings, "ingest_ws_enabled", True)
+    monkeypatch.setattr(settings, "ingest_ws_auth_timeout_seconds", 1)
+    monkeypatch.setattr(settings, "ingest_ws_max_message_bytes", 1024)
+    monkeypatch.setattr(settings, "agent_directives_enabled", False)
+    monkeypatch.setattr(api, "_streams", {})
+
+
+def _client(monkeypatch, ingest_frame=None, token="good"):
+    """A bare app around the ingest router; no database is touched."""
+    async def authenticate(db, presented):
+        if presented != token:
+            raise HTTPException(status_code=401, detail="Invalid API token")
+        return SimpleNamespace(id=7), 7
+
+    async def accept(presented, payload):
+        return {"snapshot_id": 1, "created": True}
+
+    monkeypatch.setattr(api, "_authenticate", authenticate)
+    monkeypatch.setattr(api, "_ingest_frame", ingest_frame or accept)
+    app = FastAPI()
+    app.include_router(api.router)
+    return TestClient(app)
+
+
+def _frame(message_id, snapshot=None) -> str:
+    return json.dumps({"id": message_id, "snapshot": snapshot if snapshot is not None else {"hostname": "h"}})
+
+
+@pytest.mark.parametrize("raw", [_frame("a1"), _frame("a1").encode()])
+def test_decode_frame_returns_id_and_snapshot(raw):
+    assert _decode_frame(raw) == ("a1", {"hostname": "h"})
+
+
+def test_decode_frame_without_an_id():
+    assert _decode_frame('{"snapshot": {}}') == (None, {})
+
+
+@pytest.mark.parametrize("raw", ["{not json", "[]", '"snapshot"', '{"id": 1}', '{"id": 1, "snapshot": [1]}'])
+def test_decode_frame_rejects_malformed_frames(raw):
+    with pytest.raises(HTTPException) as exc:
+        _decode_frame(raw)
+    assert exc.value.status_code == 400
+
+
+def test_nack_carries_retry_after_when_shed():
+    assert _nack("a1", _shed("global", 2.2)) == {
+        "type": "nack", "id": "a1", "status": 429, "error": _shed("global", 2.2).detail, "retry_after": 3,
+    }
+
+
+def test_nack_without_retry_after():
+    reply = _nack(None, HTTPException(status_code=400, detail="Invalid JSON"))
+    assert reply == {"type": "nack", "id": None, "status": 400, "error": "Invalid JSON"}
+
+
+def test_push_directives_reaches_only_the_alerting_endpoints_streams(monkeypatch):
+    monkeypatch.setattr(api, "alert_directives", lambda: {"interval_seconds": 10})
+    mine, full, other = asyncio.Queue(maxsize=1), asyncio.Queue(maxsize=1), asyncio.Queue(maxsize=1)
+    full.put_nowait({"type": "ack"})
+    api._streams.update({7: {mine, full}, 8: {other}})
+
+    _push_directives({"type": "alert", "endpoint_id": 7})
+    _push_directives({"type": "snapshot", "endpoint_id": 8})
+
+    assert mine.get_nowait() == {"type": "directives", "directives": {"interval_seconds": 10}}
+    assert full.get_nowait() == {"type": "ack"}
+    assert other.empty()
+
+
+def test_push_directives_is_silent_when_directives_are_off(monkeypatch):
+    monkeypatch.setattr(api, "alert_directives", lambda: None)
+    outbox = asyncio.Queue()
+    api._streams[7] = {outbox}
+    _push_directives({"type": "alert", "endpoint_id": 7})
+    assert outbox.empty()
+
+
+def test_stream_acks_frames_by_id_after_an_auth_frame(monkeypatch):
+    with _client(monkeypatch).websocket_connect("/v1/ingest/ws") as ws:
+        ws.send_json({"type": "auth", "token": "good"})
+        assert ws.receive_json() == {"type": "hello", "endpoint_id": 7}
+        ws.send_text(_frame("a1"))
+        ws.send_text("{not json")
+        assert ws.receive_json() == {"type": "ack", "id": "a1", "snapshot_id": 1, "created": True}
+        assert ws.receive_json() == {"type": "nack", "id": None, "status": 400, "error": "Invalid JSON"}
+
+
+def test_stream_nacks_a_shed_frame_by_id(monkeypatch):
+    async def shed(token, payload):
+        raise _shed("global", 1.0)
+
+    client = _client(monkeypatch, ingest_frame=shed)
+    with client.websocket_connect("/v1/ingest/ws", headers={"Authorization": "Bearer good"}) as ws:
+        ws.receive_json()
+        ws.send_text(_frame(42))
+        reply = ws.receive_json()
+    assert (reply["type"], reply["id"], reply["status"], reply["retry_after"]) == ("nack", 42, 429, 1)
+
+
+def test_stream_closes_after_nacking_a_revoked_token(monkeypatch):
+    async def revoked(token, payload):
+        raise HTTPException(status_code=401, detail="Invalid API token")
+
+    client = _client(monkeypatch, ingest_frame=revoked)
+    with client.websocket_connect("/v1/ingest/ws", headers={"Authorization": "Bearer good"}) as ws:
+        ws.receive_json()
+        ws.send_text(_frame("a1"))
+        assert ws.receive_json()["status"] == 401
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == WS_UNAUTHORIZED
+    assert api._streams == {}
+
+
+@pytest.mark.parametrize("first", [{"type": "auth"}, {"type": "auth", "token": "bad"}])
+def test_stream_refuses_a_missing_or_bad_token(monkeypatch, first):
+    with _client(monkeypatch).websocket_connect("/v1/ingest/ws") as ws:
+        ws.send_json(first)
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == WS_UNAUTHORIZED
+
+
+def test_stream_closes_on_an_oversized_message(monkeypatch):
+    with _client(monkeypatch).websocket_connect("/v1/ingest/ws", headers={"Authorization": "Bearer good"}) as ws:
+        ws.receive_json()
+        ws.send_text(_frame("big", {"pad": "x" * 2048}))
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == WS_MESSAGE_TOO_BIG
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.api.pagination import decode_cursor, encode_cursor
+
+
+def _raw(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_round_trip():
+    seen = datetime(2026, 10, 19, 12, 30, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor("host-a", 12), str, int) == ["host-a", 12]
+    assert decode_cursor(encode_cursor(seen.isoformat(), 7), datetime, int) == [seen, 7]
+    assert decode_cursor(encode_cursor(-1.0, 3), float, int) == [-1.0, 3]
+    # json.dumps writes 50.0 as 50.0, but an int-valued float key may come back as an int.
+    assert decode_cursor(_raw([50, 3]), float, int) == [50.0, 3]
+    assert decode_cursor(None, str, int) is None
+    assert decode_cursor("", str, int) is None
+
+
+@pytest.mark.parametrize("cursor, types", [
+    (_raw(["x", "y"]), (str, int)),
+    (_raw([1, 2]), (str, int)),
+    (_raw(["host", True]), (str, int)),
+    (_raw(["host"]), (str, int)),
+    (_raw({"a": 1}), (str, int)),
+    (_raw(["high", 1]), (float, int)),
+    (_raw(["yesterday", 1]), (datetime, int)),
+    (_raw(["2026-10-19T12:30:00", 1]), (datetime, int)),
+    ("not base64!", (str, int)),
+    (base64.urlsafe_b64encode(b"{not json").decode(), (str, int)),
+])
+def test_malformed_cursor_is_a_400(cursor, types):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor, *types)
+    assert exc.value.status_code == 400
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import pytest
+
+from app.core.config import settings
+from app.services import ratelimit
+from app.services.ratelimit import IngestLimiter, TokenBucket, retry_after_header
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = _Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", c)
+    return c
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(settings, "ingest_rate_limit_enabled", True)
+    monkeypatch.setattr(settings, "ingest_global_rate_per_sec", 10.0)
+    monkeypatch.setattr(settings, "ingest_global_burst", 5)
+    monkeypatch.setattr(settings, "ingest_endpoint_rate_multiplier", 2.0)
+    monkeypatch.setattr(settings, "ingest_endpoint_burst", 2)
+    monkeypatch.setattr(settings, "ingest_min_interval_seconds", 10)
+
+
+def test_bucket_spends_burst_then_reports_wait(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+
+
+def test_bucket_refills_at_rate_up_to_burst(clock):
+    bucket = TokenBucket(rate=2.0, burst=3)
+    for _ in range(3):
+        bucket.take()
+    clock.now += 0.25
+    assert bucket.take() == pytest.approx(0.25)  # half a token so far
+    clock.now += 0.25
+    assert bucket.take() == 0.0
+    clock.now += 60  # capped at the burst, not 120 tokens
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() > 0
+
+
+def test_retry_after_is_at_least_one_whole_second():
+    assert retry_after_header(0.01) == {"Retry-After": "1"}
+    assert retry_after_header(2.2) == {"Retry-After": "3"}
+
+
+def test_global_headroom_tracks_the_bucket(clock, limits):
+    limiter = IngestLimiter()
+    assert limiter.global_headroom() == 1.0  # nothing taken yet
+    for _ in range(4):
+        assert limiter.check_global() == 0.0
+    assert limiter.global_headroom() == pytest.approx(1 / 5)
+    clock.now += 0.2
+    assert limiter.global_headroom() == pytest.approx(3 / 5)
+    clock.now += 10
+    assert limiter.global_headroom() == 1.0
+
+
+def test_global_limit_off(clock, limits, monkeypatch):
+    limiter = IngestLimiter()
+    monkeypatch.setattr(settings, "ingest_global_rate_per_sec", 0)
+    assert all(limiter.check_global() == 0.0 for _ in range(100))
+    monkeypatch.setattr(settings, "ingest_rate_limit_enabled", False)
+    assert limiter.global_headroom() == 1.0
+    assert limiter.check_endpoint(1, 30) == 0.0
+
+
+def test_endpoint_rate_follows_interval_with_a_floor(clock, limits):
+    limiter = IngestLimiter()
+    # 30s interval x2 multiplier: one report per 15s after the burst of 2.
+    assert [limiter.check_endpoint(1, 30) for _ in range(2)] == [0.0, 0.0]
+    assert limiter.check_endpoint(1, 30) == pytest.approx(15.0)
+    # interval_seconds: 1 is floored at INGEST_MIN_INTERVAL_SECONDS (10s -> 5s per token).
+    assert [limiter.check_endpoint(2, 1) for _ in range(2)] == [0.0, 0.0]
+    assert limiter.check_endpoint(2, 1) == pytest.approx(5.0)
+    # Unknown interval uses the floor too; endpoints don't share buckets.
+    assert limiter.check_endpoint(3, None) == 0.0
+
+
+def test_endpoint_interval_change_keeps_fill_level(clock, limits):
+    limiter = IngestLimiter()
+    limiter.check_endpoint(1, 30)
+    limiter.check_endpoint(1, 30)
+    # Agent switches to 60s: the empty bucket now refills at 1/30 per second.
+    assert limiter.check_endpoint(1, 60) == pytest.approx(30.0)
+    clock.now += 30
+    assert limiter.check_endpoint(1, 60) == 0.0
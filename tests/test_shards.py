@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from app.db import shards
+
+
+def test_shard_for_routes_by_endpoint_id_modulo(monkeypatch):
+    fake = [shards.Shard(i, None, None) for i in range(3)]
+    monkeypatch.setattr(shards, "SHARDS", fake)
+    assert [shards.shard_for(i).index for i in range(7)] == [0, 1, 2, 0, 1, 2, 0]
+    # The same endpoint always lands on the same shard.
+    assert shards.shard_for(1000) is shards.shard_for(1000)
+
+
+def test_single_shard_takes_everything(monkeypatch):
+    monkeypatch.setattr(shards, "SHARDS", [shards.Shard(0, None, None)])
+    assert {shards.shard_for(i).index for i in range(50)} == {0}
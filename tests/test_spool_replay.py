@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+from app.services import spool
+
+NOW = datetime.now(timezone.utc)
+
+
+class _FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, endpoint_id):
+        return f"endpoint{endpoint_id}"
+
+    async def rollback(self):
+        pass
+
+
+def test_spooled_back_off_is_recorded_only_for_the_newest_report(tmp_path, monkeypatch):
+    # Endpoint 1 has reported live since the outage; endpoint 2 has not.
+    latest = {1: False, 2: True}
+    replayed, directed = [], []
+
+    async def replay_snapshot(db, endpoint, payload, received_at):
+        replayed.append((endpoint, received_at))
+        return latest[payload["id"]]
+
+    async def record_directed_interval(db, endpoint, seconds):
+        directed.append((endpoint, seconds))
+
+    monkeypatch.setattr(spool, "IngestSessionLocal", _FakeSession)
+    monkeypatch.setattr(spool, "replay_snapshot", replay_snapshot)
+    monkeypatch.setattr(spool, "record_directed_interval", record_directed_interval)
+
+    segment = tmp_path / f"1-1-1{spool.SEALED_SUFFIX}"
+    received = {1: NOW - timedelta(minutes=10), 2: NOW - timedelta(minutes=9)}
+    segment.write_text("".join(
+        json.dumps({"endpoint_id": eid, "received_at": received[eid].isoformat(), "payload": {"id": eid}}) + "\n"
+        for eid in (1, 2)
+    ))
+
+    assert asyncio.run(spool.Spool(str(tmp_path))._replay_segment(segment))
+    assert replayed == [("endpoint1", received[1]), ("endpoint2", received[2])]
+    assert directed == [("endpoint2", spool.spooled_wait_seconds())]
+    assert not segment.exists()